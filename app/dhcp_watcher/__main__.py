@@ -0,0 +1,8 @@
+import os
+import sys
+# modules of this package import each other as top level modules, like the watcher scripts do
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from watcher_daemon import main
+
+if __name__ == '__main__':
+    main()
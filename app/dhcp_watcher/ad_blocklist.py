@@ -0,0 +1,290 @@
+import os
+import re
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import logging
+import tempfile
+import subprocess
+import urllib.error
+import urllib.request
+from lease_source_watcher import stat_signature
+from snapshot_writer import SnapshotWriter
+from unbound_remote_control import UnboundControlError, default_control
+
+DEFAULT_SOURCE = 'https://raw.githubusercontent.com/StevenBlack/hosts/master/hosts'
+DEFAULT_OUTPUT = '/etc/unbound/unbound.conf.d/ads.conf'
+DEFAULT_ZONE_TYPE = 'inform_redirect'
+DEFAULT_CACHE_DIR = '/var/cache/ad_blocklist'
+DEFAULT_RESTART_COMMAND = '/scripts/restart-unbound.sh'
+FETCH_TIMEOUT = 60  # seconds
+
+# hosts file entries pointing to one of these addresses are blocked names
+BLOCK_ADDRESSES = frozenset(['0.0.0.0', '127.0.0.1', '::', '::1'])
+# names every hosts file carries for the loopback itself
+IGNORED_NAMES = frozenset([
+    'localhost', 'localhost.localdomain', 'local', 'broadcasthost', '0.0.0.0',
+    'ip6-localhost', 'ip6-loopback', 'ip6-localnet', 'ip6-mcastprefix',
+    'ip6-allnodes', 'ip6-allrouters', 'ip6-allhosts',
+])
+_LABEL_RE = re.compile(r'^(?!-)[a-z0-9_-]{1,63}(?<!-)$')
+_LOCAL_ZONE_RE = re.compile(r'^\s*local-zone:\s*"([^"]+)"\s+(\S+)')
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def normalize_domain(name):
+    """Lowercase, strip the root dot and validate a domain name, return None when it is not usable."""
+    name = name.strip().rstrip('.').lower()
+    if not name or name in IGNORED_NAMES or len(name) > 253:
+        return None
+    if not name.isascii():
+        try:
+            name = name.encode('idna').decode('ascii')
+        except UnicodeError:
+            return None
+    labels = name.split('.')
+    if len(labels) < 2 or not all(_LABEL_RE.match(label) for label in labels):
+        return None
+    return name
+
+
+def iter_source_domains(lines):
+    """Yield the normalized names of a hosts file or a plain domain list, line by line."""
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.split('#', 1)[0]
+        parts = line.split()
+        if not parts:
+            continue
+        if len(parts) > 1:
+            # hosts format: address followed by one or more names
+            if parts[0] not in BLOCK_ADDRESSES:
+                continue
+            names = parts[1:]
+        else:
+            names = parts
+        for name in names:
+            domain = normalize_domain(name)
+            if domain is not None:
+                yield domain
+
+
+def collapse_domains(domains):
+    """Dedupe domains and drop the ones already covered by a blocked parent zone.
+
+    Names are keyed on their reversed labels ("com.example.ads."), sorting those keys visits
+    the names in reversed-label trie order so a parent zone always directly precedes its
+    subdomains and a single prefix check per name is enough.
+    """
+    keys = sorted({'.'.join(reversed(domain.split('.'))) + '.' for domain in domains})
+    result = []
+    covering = None
+    for key in keys:
+        if covering is not None and key.startswith(covering):
+            continue
+        covering = key
+        result.append('.'.join(reversed(key[:-1].split('.'))))
+    return result
+
+
+def render_blocklist(domains, zone_type=DEFAULT_ZONE_TYPE):
+    """Render blocked domains as unbound server: config."""
+    lines = ['server:\n']
+    for domain in domains:
+        lines.append(f'local-zone: "{domain}" {zone_type}\n')
+        lines.append(f'local-data: "{domain} A 0.0.0.0"\n')
+    return ''.join(lines)
+
+
+def read_applied_blocklist(path):
+    """Blocked domains of a previously written blocklist, as {domain: zone_type}."""
+    applied = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                match = _LOCAL_ZONE_RE.match(line)
+                if match:
+                    applied[match.group(1)] = match.group(2)
+    except FileNotFoundError:
+        pass
+    return applied
+
+
+def diff_blocklist(applied, domains, zone_type=DEFAULT_ZONE_TYPE):
+    """Compare the applied blocklist with the new domains.
+
+    :return: (added, removed) domains, a changed zone type counts as both
+    """
+    added = [domain for domain in domains if applied.get(domain) != zone_type]
+    wanted = set(domains)
+    removed = [domain for domain, applied_type in applied.items() if domain not in wanted or applied_type != zone_type]
+    return added, removed
+
+
+def push_blocklist_diff(added, removed, zone_type=DEFAULT_ZONE_TYPE, control=None):
+    """Apply a blocklist diff to the running unbound, return False when it has to be restarted instead."""
+    control = control or default_control()
+    try:
+        results = []
+        if removed:
+            # removing the zone removes its local-data as well
+            results.append(control.local_zones_remove(removed))
+        if added:
+            results.append(control.local_zones(f"{domain} {zone_type}" for domain in added))
+            results.append(control.local_datas(f"{domain} A 0.0.0.0" for domain in added))
+    except UnboundControlError as e:
+        logger.warning(f"Unable to push blocklist changes: {e}")
+        return False
+    for result in results:
+        for error in result.errors:
+            logger.warning(f"{result.command}: {error}")
+    return all(result.ok for result in results)
+
+
+class SourceCache:
+    """On-disk copies of the blocklist sources, refreshed with conditional requests.
+
+    Every url is stored as <key>.data next to a <key>.json holding its ETag and
+    Last-Modified validators, local files only get their stat signature recorded.
+    Validators are kept in memory until commit() so a failed run fetches again.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._pending = {}
+
+    def _paths(self, location):
+        key = hashlib.sha256(location.encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f'{key}.data'), os.path.join(self.cache_dir, f'{key}.json')
+
+    def _load_meta(self, meta_path):
+        try:
+            with open(meta_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def fetch(self, location):
+        """Bring the cached copy of a source up to date.
+
+        :return: (path to read, changed since the last commit)
+        """
+        data_path, meta_path = self._paths(location)
+        meta = self._load_meta(meta_path)
+        if not re.match(r'^https?://', location):
+            signature = list(stat_signature(location) or [])
+            if not signature:
+                raise FileNotFoundError(f"No such file: {location}")
+            self._pending[meta_path] = {'location': location, 'signature': signature}
+            return location, meta.get('signature') != signature
+
+        has_copy = os.path.exists(data_path)
+        request = urllib.request.Request(location)
+        if has_copy and meta.get('etag'):
+            request.add_header('If-None-Match', meta['etag'])
+        if has_copy and meta.get('last_modified'):
+            request.add_header('If-Modified-Since', meta['last_modified'])
+        try:
+            with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+                self._store(response, data_path)
+                self._pending[meta_path] = {'location': location, 'etag': response.headers.get('ETag'),
+                                            'last_modified': response.headers.get('Last-Modified')}
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and has_copy:
+                logger.info(f"{location} not modified")
+                return data_path, False
+            return self._fallback(location, data_path, has_copy, e)
+        except OSError as e:
+            return self._fallback(location, data_path, has_copy, e)
+        return data_path, True
+
+    def _fallback(self, location, data_path, has_copy, error):
+        if not has_copy:
+            raise error
+        logger.warning(f"Unable to fetch {location}, using the cached copy: {error}")
+        return data_path, False
+
+    def _store(self, response, data_path):
+        """Stream a response body into the cache, replacing the old copy only once complete."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.download-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(response, f)
+            os.replace(tmp_path, data_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def commit(self):
+        """Persist the validators of all sources fetched since the last commit."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for meta_path, meta in self._pending.items():
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+        self._pending.clear()
+
+
+def compile_blocklist(sources):
+    """Read all source files and return the minimal sorted list of domains to block."""
+    domains = set()
+    for location in sources:
+        with open(location, 'rb') as lines:
+            before = len(domains)
+            domains.update(iter_source_domains(lines))
+            logger.info(f"Read {len(domains) - before} new domains from {location}")
+    collapsed = collapse_domains(domains)
+    logger.info(f"Compiled {len(collapsed)} entries from {len(domains)} domains")
+    return collapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', help='hosts file or domain list, file or url, can be repeated', action='append')
+    parser.add_argument('--output', help='unbound config file to write', default=DEFAULT_OUTPUT)
+    parser.add_argument('--cache-dir', help='directory keeping the downloaded sources', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--force', help='compile even when no source changed', default=False, action='store_true')
+    parser.add_argument('--zone-type', help='local-zone type of blocked domains', default=DEFAULT_ZONE_TYPE)
+    parser.add_argument('--restart-command', help='command restarting unbound when changes can not be pushed live',
+                        default=DEFAULT_RESTART_COMMAND)
+    parser.add_argument('--no-hot-reload', help='always restart unbound instead of pushing changes',
+                        dest='hot_reload', default=True, action='store_false')
+    parser.add_argument('--log-level', help='set the logging level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'])
+    inputargs = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, inputargs.log_level), format='%(asctime)s - %(levelname)s - %(message)s')
+    cache = SourceCache(inputargs.cache_dir)
+    try:
+        fetched = [cache.fetch(location) for location in inputargs.source or [DEFAULT_SOURCE]]
+        if not inputargs.force and os.path.exists(inputargs.output) and not any(changed for _, changed in fetched):
+            logger.info("Blocklist sources unchanged")
+            return 0
+        domains = compile_blocklist([path for path, _ in fetched])
+    except OSError as e:
+        logger.error(f"Unable to compile blocklist: {e}")
+        return 1
+    applied = read_applied_blocklist(inputargs.output)
+    added, removed = diff_blocklist(applied, domains, inputargs.zone_type)
+    logger.info(f"Blocklist changes: {len(added)} added, {len(removed)} removed")
+
+    # the file is what unbound loads on its next start, write it before touching the running instance
+    writer = SnapshotWriter(inputargs.output)
+    writer.update(render_blocklist(domains, inputargs.zone_type))
+    if writer.has_pending and not writer.flush(force=True):
+        return 1
+    cache.commit()
+    if not added and not removed:
+        return 0
+    if inputargs.hot_reload and push_blocklist_diff(added, removed, inputargs.zone_type):
+        return 0
+    logger.info(f"Falling back to a full reload: {inputargs.restart_command}")
+    return subprocess.run(inputargs.restart_command, shell=True).returncode
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+DEFAULT_MAX_ADDRESSES = 4  # AAAA records per owner, 0 for no limit
+DEFAULT_HOLD_TIME = 60  # seconds a new address of an already resolving host is held back
+
+EUI64_MARKER = 0xfffe
+
+
+def is_eui64(record):
+    """Stable SLAAC address derived from the MAC (ff:fe in the middle of the interface id)."""
+    return record.rrtype == 'AAAA' and (record.key >> 24) & 0xffff == EUI64_MARKER
+
+
+class AddressPolicy:
+    """Select the AAAA records of an owner to publish.
+
+    Hosts with privacy extensions (RFC 4941) rotate temporary addresses, publishing each one
+    as it shows up makes the RRset flap. A host without published AAAA records gets its
+    addresses right away. Further addresses are held back until they lived hold_time seconds,
+    so short-lived ones are never published and the others are released in one batch.
+    EUI-64 and long-lived addresses are preferred when the RRset is capped at max_addresses.
+    A records are always published.
+    """
+
+    def __init__(self, max_addresses=DEFAULT_MAX_ADDRESSES, hold_time=DEFAULT_HOLD_TIME):
+        self.max_addresses = max_addresses
+        self.hold_time = hold_time
+
+    def select(self, records, published, now):
+        """
+        :param records: LeaseRecords of one owner
+        :param published: rr lines of the owner currently published
+        :param now: current time
+        :return: (records to publish, time the selection may change or None)
+        """
+        selected = [record for record in records if record.rrtype != 'AAAA']
+        candidates = [record for record in records if record.rrtype == 'AAAA']
+        if not candidates:
+            return selected, None
+        release = None
+        eligible = []
+        for record in candidates:
+            due = record.first_seen + self.hold_time
+            if due <= now or record.rr in published or is_eui64(record):
+                eligible.append(record)
+            elif release is None or due < release:
+                release = due
+        if not eligible:
+            # no AAAA record resolves yet, do not keep a new host waiting
+            eligible = candidates
+            release = None
+        # stable first, then the longest living
+        eligible.sort(key=lambda record: (not is_eui64(record), record.first_seen, record.key))
+        if self.max_addresses:
+            eligible = eligible[:self.max_addresses]
+        return selected + eligible, release
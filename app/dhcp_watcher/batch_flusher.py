@@ -0,0 +1,69 @@
+import time
+
+DEFAULT_DEBOUNCE = 0.25  # seconds without further changes before a batch is sent
+DEFAULT_MAX_DELAY = 2  # seconds a batch may be held back during constant churn
+MAX_DELAY_FACTOR = 8  # debounce windows a batch may be held back when no max_delay is given
+DEFAULT_CHUNK_SIZE = 1000  # lines per control command
+
+
+def chunked(lines, size):
+    """Split a list of lines into lists of at most size lines, size 0 for one list."""
+    if size < 0:
+        raise ValueError(f"chunk size must not be negative, got {size}")
+    if not size or len(lines) <= size:
+        return [lines] if lines else []
+    return [lines[i:i + size] for i in range(0, len(lines), size)]
+
+
+class BatchFlusher:
+    """Decide when pending record changes are sent to unbound.
+
+    Changes are coalesced until no new change arrived for debounce seconds (at most
+    max_delay after the first one). The record store diffs against the published state when
+    the batch is collected, so a lease that comes and goes within the window nets to nothing.
+    Batches are split into chunks of chunk_size lines, unbound runs control commands on a
+    worker thread and a bounded command keeps that thread answering queries in between.
+    """
+
+    def __init__(self, debounce=DEFAULT_DEBOUNCE, max_delay=DEFAULT_MAX_DELAY, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.chunk_size = chunk_size
+        self._first_change = None
+        self._last_change = None
+
+    @property
+    def has_pending(self):
+        return self._first_change is not None
+
+    @property
+    def pending_since(self):
+        """time.monotonic() of the first change of the pending batch, None when idle."""
+        return self._first_change
+
+    def touch(self):
+        """Register a change to be sent with the next batch."""
+        now = time.monotonic()
+        if self._first_change is None:
+            self._first_change = now
+        self._last_change = now
+
+    def _due(self):
+        return min(self._last_change + self.debounce, self._first_change + self.max_delay)
+
+    def timeout(self, limit=None):
+        """Seconds until the pending batch is due, capped at limit (None when idle and no limit)."""
+        if self._first_change is None:
+            return limit
+        remaining = max(0, self._due() - time.monotonic())
+        return remaining if limit is None else min(remaining, limit)
+
+    def due(self):
+        """True when a batch is pending and its debounce window passed, the batch is then taken."""
+        if self._first_change is None or time.monotonic() < self._due():
+            return False
+        self._first_change = self._last_change = None
+        return True
+
+    def chunks(self, lines):
+        return chunked(lines, self.chunk_size)
@@ -0,0 +1,98 @@
+import os
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class DirectoryScanner:
+    """Incremental reader of a lease directory holding one file per interface (or a single file).
+
+    Files are only reparsed when their (inode, mtime_ns, size) changed. Every file keeps its own
+    contribution to the lease set so a changed or vanished file retracts exactly its leases.
+    """
+
+    def __init__(self, path, parse, suffix=None):
+        """
+        :param path: directory or single file
+        :param parse: called with the opened file, returns the list of leases it holds
+        :param suffix: only read directory entries ending with suffix
+        """
+        self.path = path
+        self.parse = parse
+        self.suffix = suffix
+        self._files = {}  # file path => (signature, {address: lease})
+        self.leases = {}  # address => lease, merged over all files
+
+    def _entries(self):
+        """Yield (file path, signature) of every lease file present."""
+        try:
+            if not os.path.isdir(self.path):
+                st = os.stat(self.path)
+                yield self.path, (st.st_ino, st.st_mtime_ns, st.st_size)
+                return
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if self.suffix and not entry.name.endswith(self.suffix):
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    yield entry.path, (entry.inode(), st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            logger.warning(f"Leases path not found: {self.path}")
+
+    def _read(self, file_path):
+        try:
+            with open(file_path, 'r') as f:
+                return {lease['address']: lease for lease in self.parse(f)}
+        except (OSError, ValueError, AttributeError, TypeError) as e:
+            # most likely caught while being rewritten, the next change retries it
+            logger.error(f"Failed to parse file {file_path}: {e}")
+            return None
+
+    def _lookup(self, address):
+        for _, leases in self._files.values():
+            lease = leases.get(address)
+            if lease is not None:
+                return lease
+        return None
+
+    def update(self):
+        """Rescan the directory, reparsing changed files only.
+
+        :return: (changed leases, removed addresses) since the previous call
+        """
+        affected = set()
+        present = set()
+        for file_path, signature in self._entries():
+            present.add(file_path)
+            cached = self._files.get(file_path)
+            if cached is not None and cached[0] == signature:
+                continue
+            leases = self._read(file_path)
+            if leases is None:
+                continue
+            logger.debug(f"Parsed {len(leases)} leases from {file_path}")
+            self._files[file_path] = (signature, leases)
+            affected.update(leases)
+            if cached is not None:
+                affected.update(cached[1])
+        for file_path in self._files.keys() - present:
+            logger.debug(f"Lease file vanished: {file_path}")
+            affected.update(self._files.pop(file_path)[1])
+
+        changed = []
+        removed = set()
+        for address in affected:
+            lease = self._lookup(address)
+            if lease is None:
+                if self.leases.pop(address, None) is not None:
+                    removed.add(address)
+            elif self.leases.get(address) != lease:
+                self.leases[address] = lease
+                changed.append(lease)
+        return changed, removed
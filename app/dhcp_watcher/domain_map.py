@@ -0,0 +1,140 @@
+import os
+import logging
+import ipaddress
+from bisect import bisect_right
+from configparser import ConfigParser, Error as ConfigParserError
+from record_store import IPV6_KEY_FLAG, address_key
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def _network_keys(network):
+    flag = IPV6_KEY_FLAG if network.version == 6 else 0
+    return int(network.network_address) | flag, int(network.broadcast_address) | flag
+
+
+def parse_domain_ranges(config):
+    """Read (first key, last key, domain) ranges from a ConfigParser file, in file order.
+
+    Every section maps either start / end addresses or a prefix (IPv4 or IPv6) to a domain:
+
+        [vlan10]
+        start = 192.168.10.100
+        end = 192.168.10.200
+        domain = iot.home
+
+        [vlan10-v6]
+        prefix = 2001:db8:10::/64
+        domain = iot.home
+    """
+    cnf = ConfigParser()
+    cnf.read(config)
+    ranges = []
+    for section in cnf.sections():
+        if not cnf.has_option(section, 'domain'):
+            continue
+        try:
+            if cnf.has_option(section, 'prefix'):
+                first, last = _network_keys(ipaddress.ip_network(cnf.get(section, 'prefix'), strict=False))
+            elif cnf.has_option(section, 'start') and cnf.has_option(section, 'end'):
+                start = ipaddress.ip_address(cnf.get(section, 'start'))
+                end = ipaddress.ip_address(cnf.get(section, 'end'))
+                if start.version != end.version or start > end:
+                    raise ValueError(f"{start} - {end} is not a range")
+                first, last = address_key(start), address_key(end)
+            else:
+                continue
+        except ValueError as e:
+            logger.warning(f"Ignoring section {section} of {config}: {e}")
+            continue
+        ranges.append((first, last, cnf.get(section, 'domain')))
+    return ranges
+
+
+def _paint(segments, first, last, domain):
+    """Lay a range over sorted, disjoint segments, the new range wins where they overlap."""
+    result = []
+    for start, end, current in segments:
+        if end < first or start > last:
+            result.append((start, end, current))
+            continue
+        if start < first:
+            result.append((start, first - 1, current))
+        if end > last:
+            result.append((last + 1, end, current))
+    result.append((first, last, domain))
+    result.sort()
+    return result
+
+
+class DomainMap:
+    """Address to domain mapping of per range domains, loaded from a ConfigParser file.
+
+    Ranges are flattened into sorted, disjoint intervals over the address keys of the record
+    store (IPv4 and IPv6 share one key space), a lookup is a bisect. When ranges overlap the
+    one further down the file wins, like the linear scan of the dhcpd watcher did.
+    refresh() reloads the file when it changed.
+    """
+
+    def __init__(self, config=None):
+        self.config = config
+        self._signature = None
+        self._starts = []
+        self._ends = []
+        self._domains = []
+        self.refresh()
+
+    def __len__(self):
+        return len(self._starts)
+
+    def _stat(self):
+        try:
+            st = os.stat(self.config)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def load(self, ranges):
+        segments = []
+        for first, last, domain in ranges:
+            segments = _paint(segments, first, last, domain)
+        self._starts = [start for start, _, _ in segments]
+        self._ends = [end for _, end, _ in segments]
+        self._domains = [domain for _, _, domain in segments]
+
+    def refresh(self):
+        """Reload the config file when it changed, return True when the mapping changed."""
+        if not self.config:
+            return False
+        signature = self._stat()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        previous = (self._starts, self._ends, self._domains)
+        try:
+            self.load(parse_domain_ranges(self.config) if signature is not None else [])
+        except ConfigParserError as e:
+            logger.error(f"Unable to read domain ranges from {self.config}: {e}")
+            return False
+        if (self._starts, self._ends, self._domains) == previous:
+            return False
+        logger.info(f"Loaded {len(self._starts)} domain ranges from {self.config}")
+        return True
+
+    def lookup(self, address, default=None):
+        """Domain of the range holding address, default when no range does."""
+        if not self._starts:
+            return default
+        key = address_key(address)
+        index = bisect_right(self._starts, key) - 1
+        if index >= 0 and key <= self._ends[index]:
+            return self._domains[index]
+        return default
+
+    def domains(self):
+        return set(self._domains)
+
+    def ranges(self):
+        """The flattened (first key, last key, domain) intervals."""
+        return list(zip(self._starts, self._ends, self._domains))
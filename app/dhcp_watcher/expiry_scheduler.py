@@ -0,0 +1,58 @@
+import heapq
+
+# rebuild the heap once stale entries outnumber live ones by this factor
+COMPACT_FACTOR = 2
+COMPACT_MIN_SIZE = 1024
+
+
+class ExpiryScheduler:
+    """Min-heap of lease end times with lazy invalidation.
+
+    Renewing or cancelling a lease does not touch the heap, the entry is only recorded as
+    current in a dict and outdated heap entries are dropped when they reach the top.
+    Scheduling and popping cost O(log n), peeking at the next expiry is O(1) amortized.
+    """
+
+    def __init__(self):
+        self._heap = []  # (expire, key)
+        self._current = {}  # key => expire
+
+    def __len__(self):
+        return len(self._current)
+
+    def schedule(self, key, expire):
+        """(Re)schedule the expiry of key, an expire of None cancels it."""
+        if expire is None:
+            self.cancel(key)
+            return
+        if self._current.get(key) == expire:
+            return
+        self._current[key] = expire
+        heapq.heappush(self._heap, (expire, key))
+        if len(self._heap) > COMPACT_MIN_SIZE and len(self._heap) > COMPACT_FACTOR * len(self._current):
+            self._heap = [(expire, key) for key, expire in self._current.items()]
+            heapq.heapify(self._heap)
+
+    def cancel(self, key):
+        self._current.pop(key, None)
+
+    def _drop_stale(self):
+        heap = self._heap
+        while heap and self._current.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def next_expiry(self):
+        """End time of the first lease to expire, None when nothing is scheduled."""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now):
+        """Remove and return the keys of all entries expiring at or before now."""
+        expired = []
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now:
+            _, key = heapq.heappop(self._heap)
+            del self._current[key]
+            expired.append(key)
+            self._drop_stale()
+        return expired
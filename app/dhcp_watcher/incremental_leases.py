@@ -0,0 +1,366 @@
+import os
+import re
+import csv
+import calendar
+import logging
+from collections import namedtuple
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# Kea memfile companions, loaded in the same order as Memfile_LeaseMgr::loadLeasesFromFiles()
+KEA_COMPLETED_SUFFIX = '.completed'
+KEA_PREVIOUS_SUFFIX = '.2'
+KEA_INPUT_SUFFIX = '.1'
+KEA_STATE_DEFAULT = '0'
+
+DHCPD_ACTIVE_STATE = 'active'
+_QUOTED_RE = re.compile(r'"(?:[^"\\]|\\.)*"')
+_OCTAL_ESCAPE_RE = re.compile(r'\\([0-7]{3}|.)')
+
+# One lease block of an ISC dhcpd.leases file, ends is epoch seconds (None for never)
+DhcpdLease = namedtuple('DhcpdLease', ('address', 'ends', 'hostname', 'binding_state', 'hwaddr'))
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class AppendOnlyReader:
+    """Consume a growing file line by line, remembering its identity and the last offset read.
+
+    check() tells whether the file grew, or was replaced or truncated (the caller should
+    resync from scratch), iter_lines() then yields the complete lines not consumed yet.
+    """
+    UNCHANGED = 'unchanged'
+    APPENDED = 'appended'
+    RESYNC = 'resync'
+
+    def __init__(self, path):
+        self.path = path
+        self.identity = None  # (st_dev, st_ino)
+        self.offset = 0
+        self.size = 0
+
+    def check(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self.identity is None:
+                return self.UNCHANGED
+            self.identity = None
+            self.offset = self.size = 0
+            return self.RESYNC
+        identity = (st.st_dev, st.st_ino)
+        if identity != self.identity or st.st_size < self.offset:
+            logger.debug(f"{self.path} replaced or truncated, resync")
+            self.identity = identity
+            self.offset = 0
+            self.size = st.st_size
+            return self.RESYNC
+        self.size = st.st_size
+        return self.APPENDED if st.st_size > self.offset else self.UNCHANGED
+
+    def iter_lines(self):
+        """Yield complete lines appended after the current offset, a trailing partial line is left for later."""
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(self.offset)
+            remainder = b''
+            while True:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                lines = (remainder + chunk).split(b'\n')
+                remainder = lines.pop()
+                for line in lines:
+                    self.offset += len(line) + 1
+                    yield line.decode(errors='replace')
+
+
+def _read_all_lines(path):
+    reader = AppendOnlyReader(path)
+    reader.check()
+    return reader.iter_lines()
+
+
+class KeaLeaseFile:
+    """Incremental view on a Kea memfile (dhcp4.leases) CSV lease log.
+
+    Kea appends a row for every lease change, the last row for an address wins; rows with a
+    non default state or a zero valid lifetime retract the lease. Only rows appended since the
+    previous update() are parsed, a full resync is done when the file is replaced or truncated
+    or when the LFC companions (.completed, .1, .2) change.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.leases = {}
+        self._reader = AppendOnlyReader(path)
+        self._columns = None
+        self._companions = None
+
+    def _companion_files(self):
+        completed = self.path + KEA_COMPLETED_SUFFIX
+        if os.path.isfile(completed):
+            return [completed]
+        return [f for f in (self.path + KEA_PREVIOUS_SUFFIX, self.path + KEA_INPUT_SUFFIX) if os.path.isfile(f)]
+
+    def _companion_signature(self):
+        signature = []
+        for suffix in (KEA_COMPLETED_SUFFIX, KEA_PREVIOUS_SUFFIX, KEA_INPUT_SUFFIX):
+            try:
+                st = os.stat(self.path + suffix)
+                signature.append((suffix, st.st_ino, st.st_size, st.st_mtime_ns))
+            except FileNotFoundError:
+                pass
+        return tuple(signature)
+
+    def _apply_rows(self, leases, lines):
+        """Apply CSV rows to leases (address => lease), return the addresses touched."""
+        touched = set()
+        columns = None
+        for row in csv.reader(lines):
+            if not row:
+                continue
+            if row[0] == 'address':
+                columns = {name: index for index, name in enumerate(row)}
+                continue
+            columns = columns or self._columns
+            if columns is None:
+                logger.warning(f"Missing CSV header in {self.path}, skipping row")
+                continue
+            try:
+                address = row[columns['address']]
+                state = row[columns['state']] if 'state' in columns else KEA_STATE_DEFAULT
+                touched.add(address)
+                if state != KEA_STATE_DEFAULT or row[columns['valid_lifetime']] == '0':
+                    leases.pop(address, None)
+                else:
+                    leases[address] = {
+                        'address': address,
+                        'hwaddr': row[columns['hwaddr']],
+                        'hostname': row[columns['hostname']],
+                        'expire': int(row[columns['expire']]),
+                    }
+            except (KeyError, IndexError, ValueError) as e:
+                logger.warning(f"Invalid lease row in {self.path}: {row} ({e})")
+        return touched, columns
+
+    def _resync(self):
+        leases = {}
+        for filename in self._companion_files():
+            self._apply_rows(leases, _read_all_lines(filename))
+        self._columns = None
+        self._reader.offset = 0
+        _, columns = self._apply_rows(leases, self._reader.iter_lines())
+        self._columns = columns
+        changed = [lease for address, lease in leases.items() if self.leases.get(address) != lease]
+        removed = set(self.leases) - set(leases)
+        self.leases = leases
+        logger.debug(f"Resynced {len(leases)} leases from {self.path}")
+        return changed, removed
+
+    def update(self):
+        """Consume new rows.
+
+        :return: (changed, removed) list of new or updated leases and set of retracted addresses
+        """
+        state = self._reader.check()
+        companions = self._companion_signature()
+        if state == AppendOnlyReader.RESYNC or companions != self._companions:
+            self._companions = companions
+            return self._resync()
+        if state == AppendOnlyReader.UNCHANGED:
+            return [], set()
+        touched, columns = self._apply_rows(self.leases, self._reader.iter_lines())
+        self._columns = self._columns or columns
+        changed = [self.leases[address] for address in touched if address in self.leases]
+        removed = {address for address in touched if address not in self.leases}
+        return changed, removed
+
+
+class DnsmasqLeaseFile:
+    """Change driven view on a dnsmasq lease file.
+
+    dnsmasq rewrites the whole file in place on every change, so rows can't be consumed by
+    offset; instead the file is only read when its (inode, mtime, size) changed and lines seen
+    before reuse their parsed lease.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.leases = {}
+        self._signature = None
+        self._parsed_lines = {}
+
+    @staticmethod
+    def parse_line(line):
+        parts = line.split()
+        if len(parts) < 4 or parts[0] == 'duid':
+            return None
+        try:
+            expires = int(parts[0])
+        except ValueError:
+            return None
+        return {
+            'expires': expires,
+            'mac': parts[1],
+            'address': parts[2],
+            # dnsmasq writes '*' when the client did not send a hostname
+            'hostname': parts[3] if parts[3] != '*' else '',
+            'client-id': parts[4] if len(parts) > 4 else None
+        }
+
+    def update(self):
+        """Re-read the file when it changed.
+
+        :return: (changed, removed) list of new or updated leases and set of vanished addresses
+        """
+        try:
+            st = os.stat(self.path)
+            signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            signature = None
+        if signature == self._signature:
+            return [], set()
+        self._signature = signature
+
+        leases = {}
+        parsed_lines = {}
+        for line in (_read_all_lines(self.path) if signature else ()):
+            lease = self._parsed_lines.get(line)
+            if lease is None:
+                lease = self.parse_line(line)
+                if lease is None:
+                    continue
+            parsed_lines[line] = lease
+            leases[lease['address']] = lease
+        self._parsed_lines = parsed_lines
+        changed = [lease for address, lease in leases.items() if self.leases.get(address) is not lease]
+        removed = set(self.leases) - set(leases)
+        self.leases = leases
+        return changed, removed
+
+
+def _dhcpd_time(value):
+    """Parse a dhcpd date ("4 2026/10/18 11:00:00" UTC, "epoch 1792321200" or "never")."""
+    parts = value.split()
+    if not parts or parts[0] == 'never':
+        return None
+    if parts[0] == 'epoch':
+        return int(parts[1])
+    year, month, day = parts[1].split('/')
+    hour, minute, second = parts[2].split(':')
+    return calendar.timegm((int(year), int(month), int(day), int(hour), int(minute), int(second)))
+
+
+def _dhcpd_string(value):
+    """Unquote a dhcpd string, dhcpd escapes non printable bytes as octal."""
+    if len(value) < 2 or value[0] != '"' or value[-1] != '"':
+        return value
+    return _OCTAL_ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 8)) if len(m.group(1)) == 3 else m.group(1), value[1:-1])
+
+
+class DhcpdLeaseFile:
+    """Incremental view on an ISC dhcpd.leases file.
+
+    dhcpd appends a lease block for every lease change, the last block of an address wins.
+    Only blocks appended since the previous update() are tokenised, the read offset is only
+    advanced past complete blocks so a block being written is picked up whole next time.
+    dhcpd periodically writes a fresh file and swaps it in (the old one becomes
+    dhcpd.leases~), the new inode triggers a full resync. Blocks other than lease (host,
+    failover, ia-na of dhcpd -6) are skipped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.leases = {}  # address => DhcpdLease of active leases
+        self._reader = AppendOnlyReader(path)
+
+    @staticmethod
+    def _depth_change(line):
+        unquoted = _QUOTED_RE.sub('', line) if '"' in line else line
+        return unquoted.count('{') - unquoted.count('}')
+
+    @staticmethod
+    def _parse_block(address, statements):
+        ends = hostname = binding_state = hwaddr = None
+        for statement in statements:
+            keyword, _, value = statement.partition(' ')
+            if keyword == 'ends':
+                ends = _dhcpd_time(value)
+            elif keyword == 'binding':
+                # "binding state active", "next binding state" starts with next
+                binding_state = value.partition(' ')[2]
+            elif keyword == 'client-hostname':
+                hostname = _dhcpd_string(value)
+            elif keyword == 'hardware':
+                hwaddr = value.partition(' ')[2]
+        return DhcpdLease(address, ends, hostname, binding_state, hwaddr)
+
+    def _apply_blocks(self, leases):
+        """Parse the complete blocks after the read offset into leases, return the addresses touched."""
+        touched = set()
+        committed = self._reader.offset
+        depth = 0
+        address = None
+        statements = []
+        for line in self._reader.iter_lines():
+            if '#' in line and '"' not in line:
+                # dhcpd comments the human readable form of epoch dates
+                line = line.partition('#')[0]
+            line = line.strip()
+            if depth == 0:
+                if line.startswith('lease ') and line.endswith('{'):
+                    address = line.split()[1]
+                    statements = []
+                    depth = 1
+                elif line:
+                    depth = max(0, self._depth_change(line))
+                if depth == 0:
+                    committed = self._reader.offset
+                continue
+            if address is not None and depth == 1 and line.endswith(';'):
+                statements.append(line[:-1])
+            depth += self._depth_change(line)
+            if depth > 0:
+                continue
+            if address is not None:
+                try:
+                    lease = self._parse_block(address, statements)
+                except (ValueError, IndexError) as e:
+                    logger.warning(f"Invalid lease block for {address} in {self.path}: {e}")
+                else:
+                    touched.add(address)
+                    if lease.binding_state in (None, DHCPD_ACTIVE_STATE):
+                        leases[address] = lease
+                    else:
+                        leases.pop(address, None)
+            address = None
+            committed = self._reader.offset
+        # an incomplete block at the end of the file is read again once it is complete
+        self._reader.offset = committed
+        return touched
+
+    def update(self):
+        """Consume new lease blocks.
+
+        :return: (changed, removed) list of new or updated DhcpdLeases and set of retracted addresses
+        """
+        state = self._reader.check()
+        if state == AppendOnlyReader.UNCHANGED:
+            return [], set()
+        if state == AppendOnlyReader.RESYNC:
+            leases = {}
+            self._apply_blocks(leases)
+            changed = [lease for address, lease in leases.items() if self.leases.get(address) != lease]
+            removed = set(self.leases) - set(leases)
+            self.leases = leases
+            logger.debug(f"Resynced {len(leases)} leases from {self.path}")
+            return changed, removed
+        touched = self._apply_blocks(self.leases)
+        changed = [self.leases[address] for address in touched if address in self.leases]
+        removed = {address for address in touched if address not in self.leases}
+        return changed, removed
@@ -0,0 +1,127 @@
+import json
+import socket
+import logging
+from lease_backends import SnapshotBackend
+from lease_source_watcher import IntervalWatcher
+
+DEFAULT_TIMEOUT = 10.0  # seconds
+PAGE_SIZE = 1000
+RECV_SIZE = 64 * 1024
+REFRESH_INTERVAL = 30  # seconds, full lease fetch without pushed events
+CONSISTENCY_INTERVAL = 300  # seconds, full lease fetch with pushed events
+
+# Kea control channel result codes
+RESULT_SUCCESS = 0
+RESULT_EMPTY = 3
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class KeaControlError(Exception):
+    pass
+
+
+class KeaControl:
+    """Client for the unix control socket of the Kea DHCPv4/DHCPv6 server.
+
+    Kea answers every command with one JSON document and closes the connection.
+    """
+
+    def __init__(self, socket_path, timeout=DEFAULT_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def command(self, command, arguments=None):
+        """Execute a command, return the response dict, results other than success and empty raise."""
+        request = {'command': command}
+        if arguments is not None:
+            request['arguments'] = arguments
+        chunks = []
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.socket_path)
+                sock.sendall(json.dumps(request).encode())
+                while True:
+                    data = sock.recv(RECV_SIZE)
+                    if not data:
+                        break
+                    chunks.append(data)
+        except OSError as e:
+            raise KeaControlError(f"{command} failed on {self.socket_path}: {e}") from e
+        try:
+            response = json.loads(b''.join(chunks))
+        except ValueError as e:
+            raise KeaControlError(f"{command}: invalid response from {self.socket_path}: {e}") from e
+        if isinstance(response, list):
+            # the control agent wraps responses of every server in a list
+            response = response[0] if response else {}
+        if response.get('result') not in (RESULT_SUCCESS, RESULT_EMPTY):
+            raise KeaControlError(f"{command}: {response.get('text', 'unknown error')}")
+        return response
+
+    def iter_leases(self, family=4, page_size=PAGE_SIZE):
+        """Yield all leases using lease4-get-page / lease6-get-page, one page in memory at a time."""
+        command = f'lease{family}-get-page'
+        start = 'start'
+        while True:
+            response = self.command(command, {'from': start, 'limit': page_size})
+            leases = response.get('arguments', {}).get('leases', [])
+            yield from leases
+            if response['result'] == RESULT_EMPTY or len(leases) < page_size:
+                return
+            start = leases[-1]['ip-address']
+
+
+def lease_from_kea(lease):
+    """Convert a lease of the control channel, None for declined, reclaimed and prefix leases."""
+    if lease.get('state', 0) != 0 or lease.get('type') == 'IA_PD':
+        return None
+    expire = None
+    if lease.get('valid-lft'):
+        expire = lease.get('cltt', 0) + lease['valid-lft']
+    return {'address': lease['ip-address'], 'hostname': lease.get('hostname', ''), 'expire': expire}
+
+
+class KeaControlBackend(SnapshotBackend):
+    """Kea leases fetched page by page over the control socket, independent of the lease database.
+
+    The full fetch runs at startup and then as a periodic check, incremental changes are pushed
+    by the run_script hook (lease_events.py) to the daemon's event socket.
+    """
+    name = 'kea'
+    event_driven = True
+    family = 4
+
+    def __init__(self, path, domain, config=None):
+        self.refresh_interval = REFRESH_INTERVAL
+        super().__init__(path, domain, config)
+        self.control = KeaControl(path)
+
+    def create_watcher(self):
+        return IntervalWatcher(self.refresh_interval)
+
+    def use_events(self, consistency_interval=CONSISTENCY_INTERVAL):
+        self.refresh_interval = consistency_interval
+        self.watcher = self.create_watcher()
+
+    def read(self):
+        leases = []
+        for lease in self.control.iter_leases(self.family):
+            lease = lease_from_kea(lease)
+            if lease is not None:
+                leases.append(lease)
+        return leases
+
+    def update(self):
+        try:
+            return super().update()
+        except KeaControlError as e:
+            logger.warning(f"Unable to fetch kea leases: {e}")
+            return [], set()
+
+
+class Kea6ControlBackend(KeaControlBackend):
+    name = 'kea6'
+    family = 6
@@ -0,0 +1,94 @@
+import logging
+from domain_map import DomainMap
+from lease_source_watcher import LeaseSourceWatcher
+from record_store import is_address
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def lease_problem(lease):
+    """Why a lease of update() or apply_events() cannot be stored, None when it can."""
+    if not is_address(lease['address']):
+        return f"invalid address {lease['address']!r}"
+    expire = lease['expire']
+    if expire is not None and (isinstance(expire, bool) or not isinstance(expire, (int, float))):
+        return f"invalid expire {expire!r}"
+    return None
+
+
+class LeaseBackend:
+    """A lease source feeding the shared record store of the watcher daemon.
+
+    update() returns (changed, removed): new or updated leases as dicts with 'address',
+    'hostname' and 'expire' (epoch seconds, None when the lease does not expire) and the set of
+    addresses retracted by the source since the previous call.
+
+    Backends with event_driven set also receive pushed lease events, their source is then
+    only polled as a consistency check.
+
+    config is an optional file of per range domains (see DomainMap), leases outside every
+    range are published in domain.
+    """
+    name = None
+    event_driven = False
+
+    def __init__(self, path, domain, config=None):
+        self.path = path
+        self.domain = domain
+        self.config = config
+        self.domain_map = DomainMap(config)
+        self.watcher = self.create_watcher()
+
+    def create_watcher(self):
+        return LeaseSourceWatcher(self.path)
+
+    def domain_for(self, address):
+        return self.domain_map.lookup(address, self.domain)
+
+    def domains(self):
+        """All domains the records of this backend can be published in."""
+        return {self.domain} | self.domain_map.domains()
+
+    def update(self):
+        raise NotImplementedError
+
+    def use_events(self, consistency_interval):
+        """Lease events are pushed, only check the source every consistency_interval seconds."""
+        self.watcher.close()
+        self.watcher = LeaseSourceWatcher(self.path, min_interval=consistency_interval,
+                                          max_interval=consistency_interval, use_inotify=False)
+
+    def apply_events(self, events):
+        """Translate pushed lease events into (changed, removed) like update()."""
+        changed = []
+        removed = set()
+        for event in events:
+            if event['action'] == 'del':
+                removed.add(event['address'])
+            else:
+                changed.append({'address': event['address'], 'hostname': event.get('hostname'),
+                                'expire': event.get('expire')})
+        return changed, removed
+
+    def close(self):
+        self.watcher.close()
+
+
+class SnapshotBackend(LeaseBackend):
+    """Backend for sources that can only be read as a whole, changes are derived from the previous read."""
+
+    def __init__(self, path, domain, config=None):
+        super().__init__(path, domain, config)
+        self.leases = {}
+
+    def read(self):
+        """Return all current leases of the source."""
+        raise NotImplementedError
+
+    def update(self):
+        leases = {lease['address']: lease for lease in self.read()}
+        changed = [lease for address, lease in leases.items() if self.leases.get(address) != lease]
+        removed = set(self.leases) - set(leases)
+        self.leases = leases
+        return changed, removed
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Lease events pushed by the DHCP server to the watcher over a unix datagram socket.
+
+Run as dnsmasq --dhcp-script or as the script of Kea's run_script hook, it forwards every
+lease change as one datagram. It only depends on the standard library so it can be copied
+next to a DHCP server running elsewhere.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import ipaddress
+
+DEFAULT_EVENT_SOCKET = '/run/dhcp_watcher.sock'
+SOCKET_MODE = 0o660
+MAX_DATAGRAM = 4096
+ACTIONS = ('add', 'old', 'del')
+# Kea run_script hook points => action, the committed hooks carry lists of leases
+KEA_HOOKS = {
+    'lease4_renew': 'old', 'lease4_recover': 'add', 'lease4_release': 'del', 'lease4_decline': 'del', 'lease4_expire': 'del',
+    'lease6_renew': 'old', 'lease6_rebind': 'old', 'lease6_recover': 'add', 'lease6_release': 'del',
+    'lease6_decline': 'del', 'lease6_expire': 'del',
+}
+KEA_COMMITTED_HOOKS = ('leases4_committed', 'leases6_committed')
+KEA_SOURCES = {'4': 'kea', '6': 'kea6'}  # address family => name of the kea control backend
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def encode_event(source, action, address, hostname=None, expire=None):
+    return json.dumps({'source': source, 'action': action, 'address': address,
+                       'hostname': hostname, 'expire': expire}).encode()
+
+
+def decode_event(data):
+    """Parse a datagram, return None when it is not a valid lease event."""
+    try:
+        event = json.loads(data)
+    except ValueError:
+        return None
+    if not isinstance(event, dict) or event.get('action') not in ACTIONS or not isinstance(event.get('address'), str):
+        return None
+    try:
+        ipaddress.ip_address(event['address'])
+    except ValueError:
+        return None
+    expire = event.get('expire')
+    if expire is not None and (not isinstance(expire, int) or isinstance(expire, bool)):
+        return None
+    if event.get('hostname') is not None and not isinstance(event['hostname'], str):
+        return None
+    return event
+
+
+def send_event(data, path=DEFAULT_EVENT_SOCKET):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+        sock.sendto(data, path)
+
+
+class LeaseEventListener:
+    """Non blocking receiver of lease events, to be multiplexed on fileno()."""
+
+    def __init__(self, path=DEFAULT_EVENT_SOCKET):
+        self.path = path
+        if os.path.exists(path):
+            os.unlink(path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(path)
+        os.chmod(path, SOCKET_MODE)
+        self._sock.setblocking(False)
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def receive(self):
+        """Return all events queued on the socket."""
+        events = []
+        while True:
+            try:
+                data = self._sock.recv(MAX_DATAGRAM)
+            except BlockingIOError:
+                return events
+            event = decode_event(data)
+            if event is None:
+                logger.warning(f"Ignoring invalid lease event: {data[:200]!r}")
+            else:
+                events.append(event)
+
+    def close(self):
+        self._sock.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def dnsmasq_expire(environ):
+    """Lease end time of a dnsmasq script call, None for an infinite lease."""
+    expires = environ.get('DNSMASQ_LEASE_EXPIRES')
+    if expires is not None:
+        return int(expires) or None
+    length = environ.get('DNSMASQ_LEASE_LENGTH')
+    if length is not None and int(length):
+        return int(time.time()) + int(length)
+    return None
+
+
+def dnsmasq_events(argv, environ):
+    """Events of a dnsmasq script call: <action> <mac> <address> [hostname]"""
+    if len(argv) < 3 or argv[0] not in ACTIONS:
+        # init, tftp, arp and friends carry no lease
+        return []
+    action, _, address = argv[:3]
+    hostname = argv[3] if len(argv) > 3 else None
+    return [encode_event('dnsmasq', action, address, hostname, dnsmasq_expire(environ))]
+
+
+def _kea_lease(family, action, environ, prefix):
+    valid_lifetime = int(environ.get(f'{prefix}_VALID_LIFETIME') or 0)
+    expire = int(environ.get(f'{prefix}_CLTT') or 0) + valid_lifetime if valid_lifetime else None
+    return encode_event(KEA_SOURCES[family], action, environ[f'{prefix}_ADDRESS'], environ.get(f'{prefix}_HOSTNAME') or None, expire)
+
+
+def kea_events(argv, environ):
+    """Events of a Kea run_script hook call, the hook point is the first argument."""
+    hook = argv[0] if argv else None
+    if hook in KEA_HOOKS:
+        family = hook[5]
+        return [_kea_lease(family, KEA_HOOKS[hook], environ, f'LEASE{family}')]
+    if hook in KEA_COMMITTED_HOOKS:
+        family = hook[6]
+        events = []
+        for index in range(int(environ.get(f'LEASES{family}_SIZE') or 0)):
+            events.append(_kea_lease(family, 'add', environ, f'LEASES{family}_AT{index}'))
+        for index in range(int(environ.get(f'DELETED_LEASES{family}_SIZE') or 0)):
+            events.append(_kea_lease(family, 'del', environ, f'DELETED_LEASES{family}_AT{index}'))
+        return events
+    return []
+
+
+def main(argv=None, environ=None):
+    """--dhcp-script (dnsmasq) / run_script (Kea) entry point, both call conventions are detected."""
+    argv = sys.argv[1:] if argv is None else argv
+    environ = os.environ if environ is None else environ
+    path = environ.get('DHCP_WATCHER_SOCKET', DEFAULT_EVENT_SOCKET)
+    try:
+        events = kea_events(argv, environ) if argv and argv[0].startswith('lease') else dnsmasq_events(argv, environ)
+        for data in events:
+            send_event(data, path)
+    except (OSError, ValueError, KeyError) as e:
+        # never fail the DHCP server, the watcher picks the change up on its next consistency check
+        print(f"Unable to forward lease event to {path}: {e}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
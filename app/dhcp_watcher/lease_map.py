@@ -0,0 +1,280 @@
+import os
+import mmap
+import time
+import struct
+import hashlib
+import logging
+import tempfile
+import ipaddress
+
+DEFAULT_LEASE_MAP = '/run/dhcp_watcher/leases.map'
+DEFAULT_TTL = 3600  # records without a TTL, like unbound's local-data
+MAGIC = b'DHWLMAP1'
+PAGE_SIZE = mmap.PAGESIZE
+MIN_CAPACITY = 64 * 1024
+MAX_READ_RETRIES = 100
+REOPEN_INTERVAL = 1.0  # seconds between checks whether the writer replaced the file
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+
+RRTYPES = {'A': 1, 'PTR': 12, 'AAAA': 28}
+RRTYPE_NAMES = {value: name for name, value in RRTYPES.items()}
+ZONE = 0  # pseudo type of the entries marking a zone served from the map
+
+# magic, sequence, active slot, then (offset, capacity, size) of both slots
+HEADER = struct.Struct('<8sQI4xQQQQQQ')
+SEQUENCE_OFFSET = 8
+TABLE_HEADER = struct.Struct('<II')  # buckets, entries
+BUCKET = struct.Struct('<QI')  # name hash, entry offset in the table (0 for an empty bucket)
+ENTRY = struct.Struct('<HHIH')  # name length, type, ttl, rdata count
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def _hash(name, rrtype):
+    return int.from_bytes(hashlib.blake2b(name + rrtype.to_bytes(2, 'little'), digest_size=8).digest(), 'little')
+
+
+def rrsets_of_records(records, default_ttl=DEFAULT_TTL):
+    """Group published (address, fqdn, rrtype, ttl) records into (name, rrtype, ttl, [rdata]) RRsets.
+
+    An owner with addresses of different TTLs gets the lowest one.
+    """
+    rrsets = {}
+    for address, fqdn, rrtype, ttl in records:
+        ttl = default_ttl if ttl is None else ttl
+        ptr_owner = ipaddress.ip_address(address).reverse_pointer
+        rrsets[(ptr_owner, 'PTR')] = [ttl, [fqdn]]
+        rrset = rrsets.setdefault((fqdn, rrtype), [ttl, []])
+        rrset[0] = min(rrset[0], ttl)
+        rrset[1].append(address)
+    return [(name, rrtype, ttl, rdata) for (name, rrtype), (ttl, rdata) in rrsets.items()]
+
+
+def build_table(rrsets, zones=()):
+    """Serialize RRsets and zones into an open addressing hash table (linear probing, load <= 0.5)."""
+    entries = [(name.lower().encode(), RRTYPES[rrtype], ttl, [item.encode() for item in rdata])
+               for name, rrtype, ttl, rdata in rrsets]
+    entries.extend((zone.lower().encode(), ZONE, 0, []) for zone in zones)
+    buckets = 8
+    while buckets < 2 * len(entries):
+        buckets *= 2
+    slots = [(0, 0)] * buckets
+    body = bytearray()
+    offset = TABLE_HEADER.size + buckets * BUCKET.size
+    for name, rrtype, ttl, rdata in entries:
+        h = _hash(name, rrtype)
+        index = h & (buckets - 1)
+        while slots[index][1]:
+            index = (index + 1) & (buckets - 1)
+        slots[index] = (h, offset + len(body))
+        body += ENTRY.pack(len(name), rrtype, ttl, len(rdata))
+        body += name
+        for item in rdata:
+            body.append(len(item))
+            body += item
+    table = bytearray(TABLE_HEADER.pack(buckets, len(entries)))
+    for slot in slots:
+        table += BUCKET.pack(*slot)
+    table += body
+    return bytes(table)
+
+
+def _lookup(table, base, name, rrtype, end=None):
+    """(ttl, [rdata]) of an entry of the table mapped from base to end, None when missing.
+
+    A table header or bucket pointing outside the table raises ValueError, probing stays in bounds.
+    """
+    end = len(table) if end is None else end
+    buckets, _ = TABLE_HEADER.unpack_from(table, base)
+    if not buckets or buckets & (buckets - 1) or base + TABLE_HEADER.size + buckets * BUCKET.size > end:
+        raise ValueError(f"Invalid table of {buckets} buckets")
+    h = _hash(name, rrtype)
+    index = h & (buckets - 1)
+    for _ in range(buckets):
+        bucket_hash, offset = BUCKET.unpack_from(table, base + TABLE_HEADER.size + index * BUCKET.size)
+        if not offset:
+            return None
+        if bucket_hash == h:
+            position = base + offset
+            if position + ENTRY.size > end:
+                raise ValueError(f"Invalid entry offset {offset}")
+            name_length, entry_type, ttl, count = ENTRY.unpack_from(table, position)
+            position += ENTRY.size
+            if entry_type == rrtype and table[position:position + name_length] == name:
+                position += name_length
+                rdata = []
+                for _ in range(count):
+                    length = table[position]
+                    rdata.append(table[position + 1:position + 1 + length].decode())
+                    position += 1 + length
+                return ttl, rdata
+        index = (index + 1) & (buckets - 1)
+    return None
+
+
+class LeaseMapWriter:
+    """Publish the lease table into a memory mapped, double-buffered hash file.
+
+    The file holds a header page and two table slots. A new table is written into the
+    inactive slot, then the active slot is switched between two increments of a sequence
+    counter (a seqlock): readers retry when the counter was odd or changed during a lookup.
+    A slot only grows, by appending a larger region to the file, so a mapped file never
+    shrinks under a reader.
+    """
+
+    def __init__(self, path=DEFAULT_LEASE_MAP):
+        self.path = path
+        if not self._is_valid():
+            self._create()
+        self._fd = os.open(path, os.O_RDWR)
+        self._mm = mmap.mmap(self._fd, 0)
+
+    def _is_valid(self):
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.read(HEADER.size)
+        except FileNotFoundError:
+            return False
+        return len(header) == HEADER.size and header.startswith(MAGIC)
+
+    def _create(self):
+        """Replace the file atomically with an empty map, readers of a previous file keep their mapping."""
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        empty = build_table([])
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.leases-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, 0, 0, PAGE_SIZE, len(empty), len(empty), 0, 0, 0).ljust(PAGE_SIZE, b'\0'))
+                f.write(empty)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def publish(self, rrsets, zones=()):
+        """Make the RRsets and zones the served state, in one switch for readers."""
+        table = build_table(rrsets, zones)
+        _, sequence, active, *slots = HEADER.unpack_from(self._mm, 0)
+        slots = [slots[0:3], slots[3:6]]
+        inactive = 1 - active
+        offset, capacity, _ = slots[inactive]
+        if len(table) > capacity:
+            capacity = max(MIN_CAPACITY, 1 << (len(table) - 1).bit_length())
+            offset = -(-len(self._mm) // PAGE_SIZE) * PAGE_SIZE
+            os.ftruncate(self._fd, offset + capacity)
+            self._mm.close()
+            self._mm = mmap.mmap(self._fd, 0)
+        self._mm[offset:offset + len(table)] = table
+        slots[inactive] = [offset, capacity, len(table)]
+        # the inactive slot is not read, its descriptor is updated outside the critical section
+        self._mm[:HEADER.size] = HEADER.pack(MAGIC, sequence, active, *slots[0], *slots[1])
+        self._mm[SEQUENCE_OFFSET:SEQUENCE_OFFSET + 8] = struct.pack('<Q', sequence + 1)
+        self._mm[:HEADER.size] = HEADER.pack(MAGIC, sequence + 1, inactive, *slots[0], *slots[1])
+        self._mm[SEQUENCE_OFFSET:SEQUENCE_OFFSET + 8] = struct.pack('<Q', sequence + 2)
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
+
+
+class LeaseMapReader:
+    """Answer lookups from a lease map file, the lookup code of the unbound module.
+
+    Lookups run without locks: the table of the active slot is read between two reads of the
+    sequence counter and retried when the writer switched slots meanwhile.
+    """
+
+    def __init__(self, path=DEFAULT_LEASE_MAP):
+        self.path = path
+        self._mm = None
+        self._inode = None
+        self._checked = 0
+
+    def _open(self):
+        now = time.monotonic()
+        if self._mm is not None and now - self._checked < REOPEN_INTERVAL:
+            return self._mm
+        self._checked = now
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._mm = None
+            return None
+        if self._mm is None or st.st_ino != self._inode or st.st_size > len(self._mm):
+            # the previous mapping is not closed, a lookup of another unbound thread may still use it
+            try:
+                with open(self.path, 'rb') as f:
+                    self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError) as e:
+                logger.error(f"Unable to map {self.path}: {e}")
+                return None
+            self._inode = st.st_ino
+        return self._mm
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def _read(self, operation):
+        """Run operation(mm, table base, table end) in a seqlock read section, None when the map is unusable.
+
+        Torn or corrupt reads are retried at most MAX_READ_RETRIES times, then the query falls through.
+        """
+        for _ in range(MAX_READ_RETRIES):
+            mm = self._open()
+            if mm is None:
+                return None
+            magic, sequence, active, *slots = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                return None
+            if sequence & 1 or active not in (0, 1):
+                continue
+            offset, _, size = slots[active * 3:active * 3 + 3]
+            if offset + size > len(mm):
+                self._checked = 0  # the writer grew the file, map it again
+                continue
+            try:
+                result = operation(mm, offset, offset + size)
+            except (struct.error, IndexError, ValueError):
+                result = None  # torn read, retried below
+            if struct.unpack_from('<Q', mm, SEQUENCE_OFFSET)[0] == sequence:
+                return result
+        logger.warning(f"No consistent read of {self.path} after {MAX_READ_RETRIES} attempts")
+        return None
+
+    def lookup(self, name, rrtype):
+        """(ttl, [rdata]) of an RRset, None when the map holds none."""
+        key = name.rstrip('.').lower().encode()
+        return self._read(lambda mm, base, end: _lookup(mm, base, key, RRTYPES[rrtype], end))
+
+    def answer(self, qname, qtype):
+        """Answer a query for a name in the zones of the map.
+
+        :param qname: query name, with or without the root dot
+        :param qtype: numeric query type
+        :return: (rcode, [rr line]), None when the name is outside the zones of the map
+        """
+        name = qname.rstrip('.').lower()
+        return self._read(lambda mm, base, end: self._answer(mm, base, end, name, qtype))
+
+    def _answer(self, mm, base, end, name, qtype):
+        labels = name.split('.')
+        zone = next((suffix for suffix in ('.'.join(labels[i:]) for i in range(len(labels)))
+                     if _lookup(mm, base, suffix.encode(), ZONE, end) is not None), None)
+        if zone is None:
+            return None
+        key = name.encode()
+        if qtype in RRTYPE_NAMES:
+            rrset = _lookup(mm, base, key, qtype, end)
+            if rrset is not None:
+                ttl, rdata = rrset
+                return RCODE_NOERROR, [f"{name}. {ttl} IN {RRTYPE_NAMES[qtype]} {item}{'.' if qtype == RRTYPES['PTR'] else ''}"
+                                       for item in rdata]
+        if name == zone or any(_lookup(mm, base, key, rrtype, end) is not None for rrtype in RRTYPE_NAMES):
+            return RCODE_NOERROR, []
+        return RCODE_NXDOMAIN, []
@@ -0,0 +1,253 @@
+import os
+import time
+import struct
+import select
+import ctypes
+import logging
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+DIRECTORY_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_MODIFY | IN_DELETE_SELF | IN_MOVE_SELF
+FILE_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+MIN_POLL_INTERVAL = 0.5  # seconds
+MAX_POLL_INTERVAL = 10  # seconds
+POLL_BACKOFF = 1.5
+SETTLE_TIME = 0.05  # seconds to let a writer finish after the first event
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def _load_inotify():
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+_libc = _load_inotify()
+
+
+def stat_signature(path):
+    """Cheap change signature of a file or of all entries in a directory."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isdir(path):
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    entries = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    est = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.name, est.st_ino, est.st_mtime_ns, est.st_size))
+    except OSError:
+        return None
+    entries.sort()
+    return (st.st_ino, st.st_mtime_ns, tuple(entries))
+
+
+class LeaseSourceWatcher:
+    """Wait for changes of a lease file or lease directory.
+
+    inotify watches the containing directory (dhcpd, Kea and systemd-networkd replace their
+    lease files by rename) and the file inode itself (in place writes on a bind mount).
+    A stat based poll runs next to it as fallback; its interval tightens to min_interval when
+    a change is seen and backs off towards max_interval while the source stays idle.
+    An inotify event is reported SETTLE_TIME later, so a writer can finish; the wait is part
+    of next_timeout() and never blocks the caller.
+    """
+
+    def __init__(self, path, min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL, use_inotify=True):
+        self.path = os.path.abspath(path)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self._fd = None
+        self._dir_wd = None
+        self._file_wd = None
+        self._signature = stat_signature(self.path)
+        self._next_poll = time.monotonic() + self.interval
+        self._settle_until = None  # time a pending inotify change is reported
+        if use_inotify and _libc is not None:
+            self._setup_inotify()
+
+    @property
+    def is_directory(self):
+        return os.path.isdir(self.path)
+
+    @property
+    def uses_inotify(self):
+        return self._fd is not None
+
+    def fileno(self):
+        return self._fd
+
+    def _add_watch(self, path, mask):
+        wd = _libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            logger.debug(f"inotify_add_watch {path} failed: {os.strerror(ctypes.get_errno())}")
+            return None
+        return wd
+
+    def _setup_inotify(self):
+        fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            logger.warning(f"inotify unavailable ({os.strerror(ctypes.get_errno())}), polling {self.path}")
+            return
+        self._fd = fd
+        watch_dir = self.path if self.is_directory else os.path.dirname(self.path)
+        self._dir_wd = self._add_watch(watch_dir, DIRECTORY_MASK)
+        self._arm_file_watch()
+        if self._dir_wd is None and self._file_wd is None:
+            logger.warning(f"unable to watch {self.path}, polling")
+            self.close()
+
+    def _arm_file_watch(self):
+        if not self.is_directory and os.path.exists(self.path):
+            # adding a watch for an inode already watched returns the same descriptor
+            self._file_wd = self._add_watch(self.path, FILE_MASK)
+
+    def _drain_events(self):
+        """Read pending inotify events, return True when one concerns the lease source."""
+        relevant = False
+        basename = os.fsencode(os.path.basename(self.path))
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    relevant = True
+                elif mask & IN_IGNORED:
+                    if wd == self._file_wd:
+                        self._file_wd = None
+                elif wd == self._dir_wd and not self.is_directory and name:
+                    # lease file itself, or a companion such as dhcpd.leases~ or kea's .1/.2 files
+                    relevant |= name.startswith(basename)
+                else:
+                    relevant = True
+        if relevant:
+            self._arm_file_watch()
+        return relevant
+
+    def _poll(self):
+        signature = stat_signature(self.path)
+        changed = signature != self._signature
+        self._signature = signature
+        return changed
+
+    def _changed(self):
+        """Register a change: tighten the poll interval and refresh the stat signature."""
+        self.interval = self.min_interval
+        self._signature = stat_signature(self.path)
+        self._next_poll = time.monotonic() + self.interval
+
+    def next_timeout(self):
+        """Seconds until the next stat poll or pending change is due."""
+        due = self._next_poll if self._settle_until is None else min(self._next_poll, self._settle_until)
+        return max(0, due - time.monotonic())
+
+    def check(self, readable=False):
+        """Non blocking change check, for callers multiplexing several watchers on fileno().
+
+        :param readable: the inotify descriptor has events pending
+        :return: True when a change was detected
+        """
+        if readable and self._fd is not None and self._drain_events() and self._settle_until is None:
+            self._settle_until = time.monotonic() + SETTLE_TIME
+        if self._settle_until is not None:
+            if time.monotonic() < self._settle_until:
+                return False
+            if self._fd is not None:
+                self._drain_events()
+            self._settle_until = None
+            self._changed()
+            return True
+        if time.monotonic() >= self._next_poll:
+            if self._poll():
+                self._changed()
+                return True
+            self.interval = min(self.interval * POLL_BACKOFF, self.max_interval)
+            self._next_poll = time.monotonic() + self.interval
+        return False
+
+    def wait(self, timeout=None):
+        """Block until the lease source changes or timeout (seconds) expires.
+
+        :return: True when a change was detected, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait_for = self.next_timeout()
+            if deadline is not None:
+                wait_for = min(wait_for, max(0, deadline - time.monotonic()))
+            readable = False
+            if self._fd is not None:
+                readable = bool(select.select([self._fd], [], [], wait_for)[0])
+            else:
+                time.sleep(wait_for)
+            if self.check(readable):
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._dir_wd = None
+            self._file_wd = None
+
+
+class IntervalWatcher:
+    """Watcher interface for sources without a file (e.g. a control socket), due every interval seconds."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next_check = time.monotonic() + interval
+
+    @property
+    def uses_inotify(self):
+        return False
+
+    def fileno(self):
+        return None
+
+    def next_timeout(self):
+        return max(0, self._next_check - time.monotonic())
+
+    def check(self, readable=False):
+        if time.monotonic() < self._next_check:
+            return False
+        self._next_check = time.monotonic() + self.interval
+        return True
+
+    def close(self):
+        pass
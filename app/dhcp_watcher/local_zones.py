@@ -0,0 +1,94 @@
+import re
+import ipaddress
+from record_store import key_address
+
+ZONE_TYPES = ('static', 'transparent')
+# RFC 1918 and ULA (fd00::/8) reverse zones, served from the lease map when no lease range is configured
+PRIVATE_REVERSE_ZONES = ('10.in-addr.arpa', *(f"{octet}.172.in-addr.arpa" for octet in range(16, 32)),
+                         '168.192.in-addr.arpa', 'd.f.ip6.arpa')
+_LOCAL_ZONE_RE = re.compile(r'^\s*local-zone:\s*"([^"]+?)\.?"\s+(\S+)')
+
+
+def reverse_zones(first, last):
+    """Reverse zone names covering the addresses first..last, on label (octet or nibble) boundaries.
+
+    A range not aligned on a label boundary is covered by the zones one level down, e.g.
+    172.16.0.0/12 gives 16.172.in-addr.arpa to 31.172.in-addr.arpa. Only private zones are
+    returned, public reverse zones are delegated to their owners.
+    """
+    bits, step = (32, 8) if first.version == 4 else (128, 4)
+    common = bits - (int(first) ^ int(last)).bit_length()
+    length = max(step, -(-common // step) * step)
+    shift = bits - length
+    network_class = ipaddress.IPv4Network if first.version == 4 else ipaddress.IPv6Network
+    labels = length // step + 2  # the address labels followed by in-addr.arpa / ip6.arpa
+    zones = []
+    for prefix in range(int(first) >> shift, (int(last) >> shift) + 1):
+        network = network_class((prefix << shift, length))
+        if network.is_private:
+            zones.append('.'.join(network.network_address.reverse_pointer.split('.')[-labels:]))
+    return zones
+
+
+def read_declared_zones(path):
+    """Local zones declared in a previously written target snapshot, as {zone: zone_type}."""
+    declared = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                match = _LOCAL_ZONE_RE.match(line)
+                if match:
+                    declared[match.group(1)] = match.group(2)
+    except FileNotFoundError:
+        pass
+    return declared
+
+
+class LocalZones:
+    """local-zone declarations of the lease domains and the private reverse zones of the lease ranges.
+
+    Names without a lease are answered by unbound itself (NXDOMAIN with static zones) instead
+    of being forwarded upstream. Reverse zones follow the private ranges of the domain config
+    only. With private_fallback (the lease map, which has to see the PTR queries of the leases)
+    the RFC 1918 and ULA zones are declared when no range is configured at all.
+    A zone_type of None declares nothing and removes the zones a previous run declared.
+    local_zones_remove drops the local-data of a zone too, callers re-send the records inside
+    removed zones.
+    """
+
+    def __init__(self, zone_type, declared=None, private_fallback=False):
+        self.zone_type = zone_type
+        self.private_fallback = private_fallback
+        self._declared = dict(declared or {})  # zone => zone type declared in unbound
+
+    def wanted(self, backends):
+        """All zones the records of the backends are published in."""
+        if self.zone_type is None:
+            return set()
+        zones = set()
+        reverse = set()
+        ranged = False
+        for backend in backends:
+            zones |= backend.domains()
+            for first, last, _ in backend.domain_map.ranges():
+                ranged = True
+                reverse.update(reverse_zones(key_address(first), key_address(last)))
+        if not ranged and self.private_fallback:
+            reverse = set(PRIVATE_REVERSE_ZONES)
+        return zones | reverse
+
+    def declared(self):
+        """Declared (zone, zone type) pairs, e.g. for render_local_data()."""
+        return sorted(self._declared.items())
+
+    def changes(self, backends, replace=False):
+        """Compare the declared zones with the wanted ones and consider the result declared.
+
+        :param replace: unbound's state is unknown, declare every wanted zone again
+        :return: (added, removed) zones, a changed zone type is an addition only
+        """
+        wanted = self.wanted(backends)
+        added = sorted(zone for zone in wanted if replace or self._declared.get(zone) != self.zone_type)
+        removed = sorted(zone for zone in self._declared if zone not in wanted)
+        self._declared = {zone: self.zone_type for zone in wanted}
+        return added, removed
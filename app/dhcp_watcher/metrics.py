@@ -0,0 +1,276 @@
+import os
+import time
+import socket
+import logging
+import selectors
+from bisect import bisect_left
+
+# seconds, parse / diff / control calls take milliseconds on small networks and seconds on huge ones
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# seconds from a lease change being picked up to unbound answering with it, includes the batch delay
+PROPAGATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+REQUEST_TIMEOUT = 1.0  # seconds a scraper may take to send its request and read the reply
+MAX_REQUEST = 8192
+SOCKET_MODE = 0o660
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A metric family, samples are kept per tuple of label values."""
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def samples(self):
+        """Yield (name, label suffix, value) lines of the exposition format."""
+        for labels, value in sorted(self._values.items()):
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}\n", f"# TYPE {self.name} {self.type}\n"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{labels} {_format_value(value)}\n")
+        return ''.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, *labels):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """Gauge set by the caller, or read from collect() ({label values: value}) at scrape time."""
+    type = 'gauge'
+
+    def __init__(self, name, help, labelnames=(), collect=None):
+        super().__init__(name, help, labelnames)
+        self.collect = collect
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+    def samples(self):
+        if self.collect is not None:
+            self._values = dict(self.collect())
+        return super().samples()
+
+
+class Histogram(Metric):
+    """Histogram with fixed buckets, an observation costs one bisect and two additions."""
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        state = self._values.get(labels)
+        if state is None:
+            # per bucket counts (the last one is +Inf), sum
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield (f"{self.name}_bucket",
+                       _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"'), cumulative)
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), cumulative
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return ''.join(metric.render() for metric in self.metrics)
+
+
+class WatcherMetrics:
+    """Instrumentation of the watcher daemon, always collected and exposed when a listener is configured."""
+
+    def __init__(self, store=None):
+        self.registry = Registry()
+        register = self.registry.register
+        self.parse_seconds = register(Histogram(
+            'dhcp_watcher_parse_seconds', 'Time spent reading changes of a lease source.', ('backend',)))
+        self.diff_seconds = register(Histogram(
+            'dhcp_watcher_diff_seconds', 'Time spent computing the record changes of a batch.'))
+        self.control_seconds = register(Histogram(
+            'dhcp_watcher_control_seconds', 'Latency of unbound control commands.', ('command',)))
+        self.propagation_seconds = register(Histogram(
+            'dhcp_watcher_propagation_seconds', 'Delay from a lease change being picked up to unbound serving it.',
+            buckets=PROPAGATION_BUCKETS))
+        self.records_added = register(Counter(
+            'dhcp_watcher_records_added_total', 'Resource records sent to unbound.'))
+        self.records_removed = register(Counter(
+            'dhcp_watcher_records_removed_total', 'Owner names removed from unbound.'))
+        self.control_failures = register(Counter(
+            'dhcp_watcher_control_failures_total', 'Unbound control commands that failed or reported errors.',
+            ('command',)))
+        if store is not None:
+            self.leases = register(Gauge(
+                'dhcp_watcher_leases', 'Current leases per backend.', ('backend',),
+                collect=lambda: {(source,): count for source, count in store.count_by_source().items()}))
+
+    def render(self):
+        return self.registry.render()
+
+
+def parse_listen(value):
+    """A unix socket path, or [host]:port (host defaults to localhost)."""
+    if value.startswith('/'):
+        return socket.AF_UNIX, value
+    host, sep, port = value.rpartition(':')
+    if not sep or not port.isdigit():
+        raise ValueError(f"expected /path/to/socket or [host]:port, got {value}")
+    host = host.strip('[]') or '127.0.0.1'
+    return (socket.AF_INET6 if ':' in host else socket.AF_INET), (host, int(port))
+
+
+class MetricsServer:
+    """Minimal HTTP endpoint serving the metrics, multiplexed in the watcher loop.
+
+    Connections are non blocking: every handle() call reads what a scraper has sent and writes
+    what its socket accepts, so a slow scraper never stalls the loop. With a selector, the
+    listening socket and the connections are registered on it with the server as data, else
+    the caller multiplexes on fileno(). Every connection is closed after the reply.
+    """
+
+    def __init__(self, listen, metrics, selector=None):
+        self.metrics = metrics
+        self._selector = selector
+        self._scrapes = {}  # connection => [request, reply (None while reading), deadline]
+        family, self.address = parse_listen(listen)
+        if family == socket.AF_UNIX and os.path.exists(self.address):
+            os.unlink(self.address)
+        self._sock = socket.socket(family, socket.SOCK_STREAM)
+        if family != socket.AF_UNIX:
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(self.address)
+        if family == socket.AF_UNIX:
+            os.chmod(self.address, SOCKET_MODE)
+        self._sock.listen(16)
+        self._sock.setblocking(False)
+        if family != socket.AF_UNIX:
+            self.address = self._sock.getsockname()[:2]
+        if selector is not None:
+            selector.register(self._sock, selectors.EVENT_READ, self)
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    @property
+    def pending(self):
+        """True while scrapes are in progress."""
+        return bool(self._scrapes)
+
+    def timeout(self, limit=None):
+        """Seconds until the oldest scrape times out, capped at limit (None when idle and no limit)."""
+        if not self._scrapes:
+            return limit
+        remaining = max(0, min(deadline for _, _, deadline in self._scrapes.values()) - time.monotonic())
+        return remaining if limit is None else min(remaining, limit)
+
+    def _reply(self, request):
+        request = request.split(b'\n', 1)[0].decode(errors='replace').split()
+        if len(request) >= 2 and request[0] == 'GET' and request[1].split('?')[0] in ('/', '/metrics'):
+            status, body = '200 OK', self.metrics.render().encode()
+        else:
+            status, body = '404 Not Found', b'not found\n'
+        return (f"HTTP/1.0 {status}\r\nContent-Type: {CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+
+    def _advance(self, conn, scrape):
+        """Read or write what the connection allows, return True when the scrape is done."""
+        request, reply, _ = scrape
+        if reply is None:
+            while b'\r\n\r\n' not in request and b'\n\n' not in request and len(request) < MAX_REQUEST:
+                try:
+                    data = conn.recv(MAX_REQUEST)
+                except BlockingIOError:
+                    scrape[0] = request
+                    return False
+                if not data:
+                    break
+                request += data
+            scrape[1] = reply = self._reply(request)
+            if self._selector is not None:
+                self._selector.modify(conn, selectors.EVENT_WRITE, self)
+        try:
+            sent = conn.send(reply)
+        except BlockingIOError:
+            return False
+        scrape[1] = reply[sent:]
+        return not scrape[1]
+
+    def _finish(self, conn):
+        del self._scrapes[conn]
+        if self._selector is not None:
+            self._selector.unregister(conn)
+        conn.close()
+
+    def handle(self):
+        """Accept new scrapes and advance the pending ones, without blocking."""
+        now = time.monotonic()
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except BlockingIOError:
+                break
+            conn.setblocking(False)
+            self._scrapes[conn] = [b'', None, now + REQUEST_TIMEOUT]
+            if self._selector is not None:
+                self._selector.register(conn, selectors.EVENT_READ, self)
+        for conn, scrape in list(self._scrapes.items()):
+            try:
+                done = self._advance(conn, scrape)
+            except OSError as e:
+                logger.debug(f"Metrics scrape failed: {e}")
+                done = True
+            if not done and now >= scrape[2]:
+                logger.debug("Metrics scrape timed out")
+                done = True
+            if done:
+                self._finish(conn)
+
+    def close(self):
+        for conn in self._scrapes:
+            conn.close()
+        self._scrapes.clear()
+        self._sock.close()
+        if isinstance(self.address, str):
+            try:
+                os.unlink(self.address)
+            except FileNotFoundError:
+                pass
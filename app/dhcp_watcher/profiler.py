@@ -0,0 +1,201 @@
+import os
+import io
+import time
+import pstats
+import signal
+import cProfile
+import logging
+import tracemalloc
+
+DEFAULT_PROFILE_DIR = '/var/tmp/dhcp_watcher'
+DEFAULT_PROFILE_CYCLES = 100
+TRACEMALLOC_FRAMES = 5
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+# phases of a cycle, in the order they run
+PHASES = ('parse', 'diff', 'render', 'control')
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class CycleProfiler:
+    """Opt-in cProfile and tracemalloc capture of the watcher loop.
+
+    Once started it profiles the next `cycles` cycles, then writes a report directory with
+    the cProfile stats, the time spent per phase and the allocations that grew since the
+    start. While idle, record() and cycle_done() cost an attribute check or two.
+    With autostart the watcher starts it before its first (startup) reconciliation.
+
+    The signal handler only records a toggle request and wakes the loop through fileno(),
+    the loop starts or stops (and writes the report) in cycle_done().
+    """
+
+    def __init__(self, output_dir=DEFAULT_PROFILE_DIR, cycles=DEFAULT_PROFILE_CYCLES, memory=True, autostart=False):
+        self.output_dir = output_dir
+        self.cycles = cycles
+        self.memory = memory
+        self.autostart = autostart
+        self.active = False
+        self._profile = None
+        self._snapshot = None
+        self._phases = {}
+        self._cycle_count = 0
+        self._started = None
+        self.toggle_requested = False
+        self._wakeup = None  # (read, write) ends of the self-pipe of the signal handler
+
+    def start(self):
+        if self.active:
+            return
+        logger.info(f"Profiling the next {self.cycles} cycles")
+        self._phases = {phase: [0, 0.0] for phase in PHASES}
+        self._cycle_count = 0
+        self._started = time.time()
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._snapshot = tracemalloc.take_snapshot()
+        self._profile = cProfile.Profile()
+        self.active = True
+        self._profile.enable()
+
+    def stop(self):
+        """Stop profiling and write the report, return its directory (None when not profiling)."""
+        if not self.active:
+            return None
+        self._profile.disable()
+        self.active = False
+        snapshot = peak = None
+        if self.memory:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        try:
+            return self._write(snapshot, peak)
+        except OSError as e:
+            logger.error(f"Unable to write the profile to {self.output_dir}: {e}")
+            return None
+        finally:
+            self._profile = self._snapshot = None
+
+    def toggle(self):
+        """Start or stop profiling."""
+        if self.active:
+            self.stop()
+        else:
+            self.start()
+
+    def request_toggle(self, *_):
+        """Signal handler: ask the loop to toggle profiling at the end of its cycle."""
+        self.toggle_requested = True
+        if self._wakeup is not None:
+            try:
+                os.write(self._wakeup[1], b'\0')
+            except BlockingIOError:
+                pass  # a wakeup is already pending
+
+    def install_signal(self, signum=signal.SIGUSR1):
+        if self._wakeup is None:
+            self._wakeup = os.pipe()
+            for fd in self._wakeup:
+                os.set_blocking(fd, False)
+        signal.signal(signum, self.request_toggle)
+
+    def fileno(self):
+        """Readable after a toggle request, select on it and call handle()."""
+        return self._wakeup[0]
+
+    def handle(self):
+        """Drain the wakeups of toggle requests, without blocking."""
+        try:
+            while os.read(self._wakeup[0], 512):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        if self._wakeup is not None:
+            for fd in self._wakeup:
+                os.close(fd)
+            self._wakeup = None
+
+    def record(self, phase, seconds):
+        if self.active:
+            stats = self._phases[phase]
+            stats[0] += 1
+            stats[1] += seconds
+
+    def cycle_done(self):
+        if self.toggle_requested:
+            self.toggle_requested = False
+            self.toggle()
+        elif self.active:
+            self._cycle_count += 1
+            if self._cycle_count >= self.cycles:
+                self.stop()
+
+    def _write(self, snapshot, peak):
+        # the pid keeps the reports of several watchers apart, a counter those of quick toggles
+        name = f"{time.strftime('profile-%Y%m%d-%H%M%S', time.localtime(self._started))}-{os.getpid()}"
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, name)
+        attempt = 1
+        while True:
+            try:
+                os.mkdir(path)
+                break
+            except FileExistsError:
+                attempt += 1
+                path = os.path.join(self.output_dir, f"{name}-{attempt}")
+        self._profile.dump_stats(os.path.join(path, 'profile.pstats'))
+        with open(os.path.join(path, 'profile.txt'), 'w') as f:
+            f.write(self._render_stats())
+        with open(os.path.join(path, 'phases.txt'), 'w') as f:
+            f.write(self.render_phases())
+        if snapshot is not None:
+            with open(os.path.join(path, 'memory.txt'), 'w') as f:
+                f.write(self._render_memory(snapshot, peak))
+        logger.info(f"Profile of {self._cycle_count} cycles written to {path}")
+        return path
+
+    def _render_stats(self):
+        out = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=out)
+        stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        stats.sort_stats('tottime').print_stats(TOP_FUNCTIONS)
+        return out.getvalue()
+
+    def render_phases(self):
+        elapsed = time.time() - self._started
+        total = sum(seconds for _, seconds in self._phases.values())
+        lines = [f"{self._cycle_count} cycles in {elapsed:.3f}s\n",
+                 f"{'phase':<10}{'calls':>8}{'total s':>12}{'mean ms':>10}{'share':>8}\n"]
+        for phase in PHASES:
+            calls, seconds = self._phases[phase]
+            mean = seconds / calls * 1000 if calls else 0
+            share = seconds / total * 100 if total else 0
+            lines.append(f"{phase:<10}{calls:>8}{seconds:>12.4f}{mean:>10.3f}{share:>7.1f}%\n")
+        return ''.join(lines)
+
+    def _render_memory(self, snapshot, peak):
+        by_file = snapshot.statistics('filename')
+        lines = [f"Traced memory at the end: {sum(stat.size for stat in by_file) / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n",
+                 f"\nTop {TOP_ALLOCATIONS} allocation growths since the start:\n"]
+        for stat in snapshot.compare_to(self._snapshot, 'lineno')[:TOP_ALLOCATIONS]:
+            lines.append(f"{stat}\n")
+        lines.append(f"\nTop {TOP_ALLOCATIONS} allocations by file:\n")
+        for stat in by_file[:TOP_ALLOCATIONS]:
+            lines.append(f"{stat}\n")
+        return ''.join(lines)
+
+
+def add_profile_arguments(parser):
+    parser.add_argument('--profile', help='profile the first cycles, SIGUSR1 toggles profiling at runtime',
+                        default=False, action='store_true')
+    parser.add_argument('--profile-dir', help='directory profiles are written to', default=DEFAULT_PROFILE_DIR)
+    parser.add_argument('--profile-cycles', help='cycles captured per profile', type=int, default=DEFAULT_PROFILE_CYCLES)
+
+
+def profiler_from_args(inputargs):
+    return CycleProfiler(inputargs.profile_dir, inputargs.profile_cycles, autostart=inputargs.profile)
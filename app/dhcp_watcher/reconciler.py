@@ -0,0 +1,98 @@
+import re
+import logging
+from record_store import render_rr
+
+REVERSE_ZONES = ('.in-addr.arpa.', '.ip6.arpa.')
+
+_SNAPSHOT_OWNER_RE = re.compile(r'^\s*local-data:\s*"(\S+)\s+(?:\d+\s+)?IN\s')
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def iter_local_data(lines, domains):
+    """Parse list_local_data output, yield (owner, rrtype, rdata, ttl) of the lease domains only.
+
+    The output also carries every static and ad-block record, lines are skipped on their
+    owner suffix before they are split into fields.
+    """
+    domain_suffixes = tuple(f'.{domain}.' for domain in domains)
+    suffixes = domain_suffixes + REVERSE_ZONES
+    for line in lines:
+        owner, sep, rest = line.partition('\t')
+        if not sep or not owner.endswith(suffixes):
+            continue
+        parts = rest.split()
+        if len(parts) < 4 or parts[1] != 'IN':
+            continue
+        ttl = int(parts[0]) if parts[0].isdigit() else None
+        rrtype, rdata = parts[2], parts[3]
+        if rrtype == 'PTR':
+            if owner.endswith(REVERSE_ZONES) and rdata.endswith(domain_suffixes):
+                yield owner[:-1], rrtype, rdata[:-1], ttl
+        elif rrtype in ('A', 'AAAA') and owner.endswith(domain_suffixes):
+            yield owner[:-1], rrtype, rdata, ttl
+
+
+def read_snapshot_owners(path):
+    """Owner names of a previously written target snapshot, i.e. the names published by the watcher."""
+    owners = set()
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                match = _SNAPSHOT_OWNER_RE.match(line)
+                if match:
+                    owners.add(match.group(1))
+    except FileNotFoundError:
+        pass
+    return owners
+
+
+def reconcile(store, lines, domains, owned=None):
+    """Compute the updates bringing unbound's live local-data in line with the record store.
+
+    :param store: RecordStore with the current leases, all of them are marked as published
+    :param lines: list_local_data output lines
+    :param domains: lease domains, other names are never touched
+    :param owned: names the watcher published before (None for all names in the domains),
+                  live records not in the store are only removed when they are owned
+    :return: (remove_rr, add_rr) input for local_datas_remove and local_datas
+
+    Live TTLs are only compared when the store renders records with a TTL, otherwise they
+    are unbound's default.
+    """
+    ttls = store.ttl_policy is not None
+    live_rrs = {}  # owner => {rr line}
+    live_ptrs = {}  # ptr owner => (ptr rr line, fqdn)
+    for owner, rrtype, rdata, ttl in iter_local_data(lines, domains):
+        rr = render_rr(owner, rrtype, rdata, ttl if ttls else None)
+        if rrtype == 'PTR':
+            live_ptrs[owner] = rr, rdata
+        else:
+            live_rrs.setdefault(owner, set()).add(rr)
+
+    remove_rr = []
+    add_rr = []
+    for fqdn, records in store.owners():
+        for record in records:
+            live_ptr_rr, _ = live_ptrs.pop(record.ptr_owner, (None, None))
+            if live_ptr_rr != record.ptr_rr:
+                if live_ptr_rr is not None:
+                    remove_rr.append(record.ptr_owner)
+                add_rr.append(record.ptr_rr)
+        wanted = {record.rr for record in records}
+        live = live_rrs.pop(fqdn, None)
+        if live != wanted:
+            if live is not None:
+                remove_rr.append(fqdn)
+            add_rr.extend(wanted)
+
+    for owner in live_rrs:
+        if owned is None or owner in owned:
+            logger.debug(f"Removing stale {owner}")
+            remove_rr.append(owner)
+    for ptr_owner, (_, fqdn) in live_ptrs.items():
+        if owned is None or fqdn in owned:
+            remove_rr.append(ptr_owner)
+    store.mark_published()
+    return remove_rr, add_rr
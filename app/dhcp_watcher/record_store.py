@@ -0,0 +1,327 @@
+import re
+import sys
+import time
+import ipaddress
+import logging
+from expiry_scheduler import ExpiryScheduler
+
+# IPv6 keys get this bit set so they never collide with IPv4 keys
+IPV6_KEY_FLAG = 1 << 128
+# letters, digits and hyphens, the host name rules of RFC 952 / RFC 1123
+HOSTNAME_LABEL = re.compile(r'[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?')
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def address_key(address):
+    """Packed integer key of an address, equal for every spelling of the same address."""
+    ip = ipaddress.ip_address(address)
+    return int(ip) | IPV6_KEY_FLAG if ip.version == 6 else int(ip)
+
+
+def is_address(address):
+    """True when address is an IPv4 or IPv6 address, as address_key() needs it."""
+    try:
+        ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return True
+
+
+def is_hostname(hostname):
+    """True when hostname is a single LDH label, safe to publish and to quote in local-data."""
+    return isinstance(hostname, str) and HOSTNAME_LABEL.fullmatch(hostname) is not None
+
+
+def key_address(key):
+    """Address of a packed integer key, the inverse of address_key()."""
+    if key & IPV6_KEY_FLAG:
+        return ipaddress.IPv6Address(key ^ IPV6_KEY_FLAG)
+    return ipaddress.IPv4Address(key)
+
+
+def render_rr(owner, rrtype, rdata, ttl=None):
+    """RR line for local_datas, without a TTL unbound applies its default."""
+    if rrtype == 'PTR':
+        return f"{owner} PTR {rdata}" if ttl is None else f"{owner} {ttl} PTR {rdata}"
+    return f"{owner} IN {rrtype} {rdata}" if ttl is None else f"{owner} {ttl} IN {rrtype} {rdata}"
+
+
+class LeaseRecord:
+    """A published lease with its resource records rendered once, when the lease or its TTL bucket changes."""
+    __slots__ = ('key', 'address', 'source', 'hostname', 'fqdn', 'rrtype', 'expire', 'first_seen',
+                 'ttl', 'ptr_owner', 'ptr_rr', 'rr')
+
+    def __init__(self, address, source, hostname, domain, expire=None, first_seen=None, ttl=None):
+        ip = ipaddress.ip_address(address)
+        self.key = int(ip) | IPV6_KEY_FLAG if ip.version == 6 else int(ip)
+        self.address = str(ip)
+        self.source = source
+        self.hostname = sys.intern(hostname)
+        self.fqdn = sys.intern(f"{hostname}.{domain}")
+        self.rrtype = 'AAAA' if ip.version == 6 else 'A'
+        self.expire = expire
+        self.first_seen = time.time() if first_seen is None else first_seen
+        self.ttl = ttl
+        self.ptr_owner = ip.reverse_pointer
+        self.ptr_rr = render_rr(self.ptr_owner, 'PTR', self.fqdn, ttl)
+        self.rr = render_rr(self.fqdn, self.rrtype, self.address, ttl)
+
+    @property
+    def domain(self):
+        return self.fqdn[len(self.hostname) + 1:]
+
+    def __repr__(self):
+        return f"LeaseRecord({self.address!r}, {self.source!r}, {self.fqdn!r}, expire={self.expire}, ttl={self.ttl})"
+
+
+class RecordStore:
+    """Lease records of all backends and the unbound updates still to be sent for them.
+
+    Published state is kept per (owner, type) RRset. local_data appends to an existing RRset,
+    so RRsets that only grew are sent as additions. local_datas_remove can only drop all
+    records of an owner name, so when the A or the AAAA set of an owner shrinks, the owner is
+    removed and the surviving records of both types are re-added in the same batch.
+
+    An AddressPolicy decides which AAAA records of an owner are published, records it holds
+    back are reconsidered once their release time passed.
+
+    A TtlPolicy renders every record with a TTL derived from the remaining lifetime of its
+    lease. A record whose TTL bucket changed is replaced by a new one, which makes its owner
+    shrink and be re-sent like any other change.
+    """
+
+    def __init__(self, policy=None, ttl_policy=None):
+        self.policy = policy
+        self.ttl_policy = ttl_policy
+        self._leases = {}  # address key => LeaseRecord
+        self._by_fqdn = {}  # fqdn => {address key: LeaseRecord}
+        self._published = {}  # address key => LeaseRecord currently published in unbound
+        self._published_rrsets = {}  # (fqdn, rrtype) => {rr line} currently published in unbound
+        self._dirty = set()
+        self._source_counts = {}  # source => number of leases
+        self._expiry = ExpiryScheduler()
+        self._releases = ExpiryScheduler()  # fqdn => time the policy selection may change
+        self._ttl_refreshes = ExpiryScheduler()  # address key => time the TTL bucket drops
+
+    def __len__(self):
+        return len(self._leases)
+
+    def __contains__(self, address):
+        return address_key(address) in self._leases
+
+    def count_by_source(self):
+        """Number of leases per source."""
+        return {source: count for source, count in self._source_counts.items() if count}
+
+    def _count(self, source, delta):
+        self._source_counts[source] = self._source_counts.get(source, 0) + delta
+
+    def get(self, address):
+        return self._leases.get(address_key(address))
+
+    def leases(self, source=None):
+        """All lease records in the store, of one source only when given."""
+        return [record for record in self._leases.values() if source is None or record.source == source]
+
+    def by_fqdn(self, fqdn):
+        """Records of all addresses an owner name resolves to."""
+        return list(self._by_fqdn.get(fqdn, {}).values())
+
+    def set(self, source, address, hostname, domain, expire=None, now=None):
+        """Add or update the lease of an address, return True when its record changed."""
+        key = address_key(address)
+        current = self._leases.get(key)
+        ttl = None
+        if self.ttl_policy is not None:
+            ttl = self.ttl_policy.ttl(expire, time.time() if now is None else now)
+        first_seen = None
+        if current is not None and current.fqdn == f"{hostname}.{domain}":
+            if current.ttl == ttl:
+                current.expire = expire
+                if current.source != source:
+                    self._count(current.source, -1)
+                    self._count(source, 1)
+                    current.source = source
+                self._expiry.schedule(key, expire)
+                self._schedule_refresh(current)
+                return False
+            first_seen = current.first_seen
+        if current is not None:
+            self._unindex(current)
+            self._count(current.source, -1)
+        self._count(source, 1)
+        record = LeaseRecord(address, source, hostname, domain, expire, first_seen, ttl)
+        self._leases[key] = record
+        self._by_fqdn.setdefault(record.fqdn, {})[key] = record
+        self._expiry.schedule(key, expire)
+        self._schedule_refresh(record)
+        self._dirty.add(key)
+        return True
+
+    def _schedule_refresh(self, record):
+        if self.ttl_policy is not None:
+            self._ttl_refreshes.schedule(record.key, self.ttl_policy.refresh_time(record.expire, record.ttl))
+
+    def discard(self, address, source=None):
+        """Remove the lease of an address (only when owned by source, if given), return True when removed."""
+        key = address_key(address)
+        current = self._leases.get(key)
+        if current is None or (source is not None and current.source != source):
+            return False
+        del self._leases[key]
+        self._unindex(current)
+        self._count(current.source, -1)
+        self._expiry.cancel(key)
+        self._ttl_refreshes.cancel(key)
+        self._dirty.add(key)
+        return True
+
+    def _unindex(self, record):
+        records = self._by_fqdn.get(record.fqdn)
+        if records is not None:
+            records.pop(record.key, None)
+            if not records:
+                del self._by_fqdn[record.fqdn]
+
+    def expired(self, now):
+        """Addresses of all leases expired at now, each one is reported once."""
+        return [self._leases[key].address for key in self._expiry.pop_expired(now)]
+
+    def next_expiry(self):
+        """Expire time of the first lease to expire, None when no lease expires."""
+        return self._expiry.next_expiry()
+
+    def refresh_ttls(self, now):
+        """Re-render the records whose TTL bucket dropped at now, return True when records changed."""
+        changed = False
+        for key in self._ttl_refreshes.pop_expired(now):
+            record = self._leases[key]
+            changed |= self.set(record.source, record.address, record.hostname, record.domain, record.expire, now)
+        return changed
+
+    def next_ttl_refresh(self):
+        """Time the TTL bucket of the first record drops, None when no TTL changes."""
+        return self._ttl_refreshes.next_expiry()
+
+    def next_release(self):
+        """Time held back records of an owner may be published, None when nothing is held."""
+        return self._releases.next_expiry()
+
+    def records(self):
+        """All published (address, fqdn, rrtype, ttl) records, e.g. for render_local_data()."""
+        for record in self._published.values():
+            yield record.address, record.fqdn, record.rrtype, record.ttl
+
+    def _select(self, fqdn, now):
+        """Records of an owner to publish, according to the address policy."""
+        records = list(self._by_fqdn.get(fqdn, {}).values())
+        if self.policy is None:
+            return records
+        selected, release = self.policy.select(records, self.published_rrset(fqdn, 'AAAA'), now)
+        self._releases.schedule(fqdn, release)
+        return selected
+
+    def published_rrset(self, fqdn, rrtype):
+        """RR lines of the (owner, type) RRset published in unbound."""
+        return self._published_rrsets.get((fqdn, rrtype), frozenset())
+
+    def owners(self, now=None):
+        """All (fqdn, [LeaseRecord]) owner names in the store, with the records to publish."""
+        now = time.time() if now is None else now
+        for fqdn in list(self._by_fqdn):
+            yield fqdn, self._select(fqdn, now)
+
+    def unpublish(self, zones):
+        """Forget the published records inside removed local zones, unbound dropped them with the zone.
+
+        They are re-sent by the next changes(), return True when records were affected.
+        """
+        suffixes = tuple(f".{zone}" for zone in zones)
+        affected = False
+        for key, record in list(self._published.items()):
+            if f".{record.fqdn}".endswith(suffixes):
+                self._published_rrsets.pop((record.fqdn, 'A'), None)
+                self._published_rrsets.pop((record.fqdn, 'AAAA'), None)
+            elif not f".{record.ptr_owner}".endswith(suffixes):
+                continue
+            del self._published[key]
+            self._dirty.add(key)
+            affected = True
+        return affected
+
+    def mark_published(self, now=None):
+        """Consider all selected records as published, e.g. after reconciling with unbound."""
+        self._published = {}
+        self._published_rrsets = {}
+        for fqdn, records in self.owners(now):
+            for record in records:
+                self._published[record.key] = record
+                self._published_rrsets.setdefault((fqdn, record.rrtype), set()).add(record.rr)
+        self._dirty.clear()
+
+    def changes(self, now=None, replace=False):
+        """Collect the updates for all owners changed since the previous call.
+
+        :param replace: unbound's state is unknown (not reconciled), remove every touched
+                        owner and PTR owner before adding its records
+        :return: (remove_rr, add_rr) input for local_datas_remove and local_datas
+        """
+        now = time.time() if now is None else now
+        remove_rr = []
+        add_rr = []
+        owners = set(self._releases.pop_expired(now))
+        for key in self._dirty:
+            record = self._leases.get(key)
+            published = self._published.get(key)
+            if published is not None:
+                owners.add(published.fqdn)
+                if record is None or record.ptr_rr != published.ptr_rr:
+                    logger.debug(f"Withdrawing {published.fqdn} @ {published.address}")
+                    remove_rr.append(published.ptr_owner)
+                    del self._published[key]
+            if record is not None:
+                owners.add(record.fqdn)
+        self._dirty.clear()
+
+        for owner in owners:
+            selected = self._select(owner, now)
+            selected_keys = {record.key for record in selected}
+            for key, record in self._by_fqdn.get(owner, {}).items():
+                published = self._published.get(key)
+                if key in selected_keys:
+                    if published is None:
+                        logger.debug(f"Publishing {record.fqdn} @ {record.address}")
+                        if replace:
+                            remove_rr.append(record.ptr_owner)
+                        add_rr.append(record.ptr_rr)
+                    self._published[key] = record
+                elif published is not None:
+                    logger.debug(f"Holding back {record.fqdn} @ {record.address}")
+                    remove_rr.append(published.ptr_owner)
+                    del self._published[key]
+            self._update_rrsets(owner, selected, remove_rr, add_rr, replace)
+        return remove_rr, add_rr
+
+    def _update_rrsets(self, owner, selected, remove_rr, add_rr, replace):
+        """Send the changes of the A and AAAA RRsets of an owner, leaving unchanged types alone."""
+        wanted = {'A': set(), 'AAAA': set()}
+        for record in selected:
+            wanted[record.rrtype].add(record.rr)
+        shrunk = replace
+        added = []
+        for rrtype, rrs in wanted.items():
+            published = self.published_rrset(owner, rrtype)
+            shrunk |= bool(published - rrs)
+            added.extend(rrs - published)
+            if rrs:
+                self._published_rrsets[(owner, rrtype)] = rrs
+            else:
+                self._published_rrsets.pop((owner, rrtype), None)
+        if shrunk:
+            # re-inject the survivors of both types after removing the owner
+            remove_rr.append(owner)
+            add_rr.extend(record.rr for record in selected)
+        else:
+            add_rr.extend(sorted(added))
@@ -0,0 +1,124 @@
+import os
+import time
+import hashlib
+import tempfile
+import logging
+import ipaddress
+from record_store import render_rr
+
+DEBOUNCE_INTERVAL = 2  # seconds without changes before a snapshot is written
+MAX_DELAY = 15  # seconds, upper bound for a pending snapshot under constant churn
+FILE_MODE = 0o644
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def render_local_data(records, zones=()):
+    """Render (address, fqdn, rrtype, ttl) records as an unbound include file, sorted so equal state gives equal content.
+
+    Records without a TTL get unbound's default, local-data-ptr takes none so PTRs with a TTL
+    are written as local-data. (zone, zone type) pairs are declared before the records.
+    """
+    lines = ['server:\n']
+    for zone, zone_type in sorted(zones):
+        lines.append(f'\tlocal-zone: "{zone}." {zone_type}\n')
+    for address, fqdn, rrtype, ttl in sorted(records, key=lambda record: record[:3]):
+        if ttl is None:
+            lines.append(f'\tlocal-data-ptr: "{address} {fqdn}"\n')
+        else:
+            lines.append(f'\tlocal-data: "{render_rr(ipaddress.ip_address(address).reverse_pointer, "PTR", fqdn, ttl)}"\n')
+        lines.append(f'\tlocal-data: "{render_rr(fqdn, rrtype, address, ttl)}"\n')
+    return ''.join(lines)
+
+
+def _digest(content):
+    return hashlib.sha256(content.encode()).digest()
+
+
+class SnapshotWriter:
+    """Keep the target include file (loaded when unbound restarts) in sync with the lease state.
+
+    Content is hashed so an unchanged state never touches the disk, a changed state is written
+    once no further update() arrived for debounce seconds (or max_delay passed) and replaces the
+    target atomically (temp file, fsync, rename) so unbound never reads a partial file.
+    """
+
+    def __init__(self, target_filename, debounce=DEBOUNCE_INTERVAL, max_delay=MAX_DELAY):
+        self.target_filename = target_filename
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._written_digest = self._read_digest()
+        self._pending = None
+        self._first_change = None
+        self._last_change = None
+
+    def _read_digest(self):
+        try:
+            with open(self.target_filename, 'r') as f:
+                return _digest(f.read())
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    @property
+    def has_pending(self):
+        return self._pending is not None
+
+    def update(self, content):
+        """Register the desired file content, nothing is written until flush()."""
+        if _digest(content) == self._written_digest:
+            self._pending = None
+            self._first_change = self._last_change = None
+            return
+        now = time.monotonic()
+        self._pending = content
+        self._last_change = now
+        if self._first_change is None:
+            self._first_change = now
+
+    def _due(self):
+        return min(self._last_change + self.debounce, self._first_change + self.max_delay)
+
+    def timeout(self, limit=None):
+        """Seconds until a pending snapshot is due, capped at limit (None when idle and no limit)."""
+        if self._pending is None:
+            return limit
+        remaining = max(0, self._due() - time.monotonic())
+        return remaining if limit is None else min(remaining, limit)
+
+    def flush(self, force=False):
+        """Write the pending snapshot when the debounce window passed (or force).
+
+        :return: True when the target was written
+        """
+        if self._pending is None or (not force and time.monotonic() < self._due()):
+            return False
+        try:
+            self._write(self._pending)
+        except OSError as e:
+            logger.error(f"Unable to write {self.target_filename}: {e}")
+            return False
+        self._written_digest = _digest(self._pending)
+        self._pending = None
+        self._first_change = self._last_change = None
+        return True
+
+    def _write(self, content):
+        directory = os.path.dirname(os.path.abspath(self.target_filename))
+        fd, tmp_filename = tempfile.mkstemp(prefix='.' + os.path.basename(self.target_filename), dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_filename, FILE_MODE)
+            os.replace(tmp_filename, self.target_filename)
+        except BaseException:
+            os.unlink(tmp_filename)
+            raise
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        logger.debug(f"Wrote snapshot {self.target_filename}")
@@ -0,0 +1,41 @@
+DEFAULT_MIN_TTL = 60  # seconds, floor for leases about to end
+DEFAULT_MAX_TTL = 3600  # seconds, unbound's default TTL for local-data
+
+
+class TtlPolicy:
+    """Derive the TTL of a published record from the remaining lifetime of its lease.
+
+    TTLs are rounded down to buckets (min_ttl doubled until max_ttl) so a record is only
+    re-sent a few times during a lease, when its remaining lifetime falls below the current
+    bucket. A TTL never outlives the lease, except for min_ttl close to its end.
+    Leases without an end get max_ttl.
+    """
+
+    def __init__(self, min_ttl=DEFAULT_MIN_TTL, max_ttl=DEFAULT_MAX_TTL):
+        if min_ttl < 1:
+            raise ValueError(f"min_ttl must be at least 1 second, got {min_ttl}")
+        self.min_ttl = min_ttl
+        self.max_ttl = max(min_ttl, max_ttl)
+        buckets = []
+        ttl = min_ttl
+        while ttl < self.max_ttl:
+            buckets.append(ttl)
+            ttl *= 2
+        buckets.append(self.max_ttl)
+        self._buckets = buckets[::-1]
+
+    def ttl(self, expire, now):
+        """TTL of a record whose lease ends at expire (None for never)."""
+        if expire is None:
+            return self.max_ttl
+        remaining = expire - now
+        for bucket in self._buckets:
+            if bucket < remaining:
+                return bucket
+        return self.min_ttl
+
+    def refresh_time(self, expire, ttl):
+        """Time the TTL of a record drops to the next lower bucket, None when it stays."""
+        if expire is None or ttl <= self.min_ttl:
+            return None
+        return expire - ttl
@@ -1,106 +1,40 @@
 import os
-import sys
-import time
-import ipaddress
-import subprocess
 import syslog
 import argparse
-sys.path.insert(0, "/usr/local/opnsense/site-python")
-from daemonize import Daemonize
+from lease_backends import LeaseBackend
+from incremental_leases import DnsmasqLeaseFile
+from profiler import add_profile_arguments, profiler_from_args
+from watcher_daemon import WatcherDaemon
 
 DNSMASQ_LEASES_FILE = '/var/lib/dnsmasq/dnsmasq.leases'
 DEFAULT_DOMAIN = 'lan'
-CLEANUP_INTERVAL = 60  # seconds
-
-class UnboundLocalData:
-    def __init__(self):
-        self.data = {}
-
-    def is_equal(self, address, fqdn):
-        return self.data.get(address) == fqdn
-
-    def add_address(self, address, fqdn):
-        self.data[address] = fqdn
-
-    def cleanup(self, address, fqdn):
-        if address in self.data:
-            del self.data[address]
-
-def unbound_control(commands, input=None):
-    """ Execute unbound-control command """
-    input_string = None
-    if input:
-        input_string = '\n'.join(input) + '\n'
-    subprocess.run(['/usr/sbin/unbound-control'] + commands, input=input_string, text=True)
 
 def parse_dnsmasq_leases(leases_file):
     leases = []
     if os.path.isfile(leases_file):
-        with open(leases_file, 'r') as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) >= 4:
-                    lease = {
-                        'expires': int(parts[0]),
-                        'mac': parts[1],
-                        'address': parts[2],
-                        'hostname': parts[3],
-                        'client-id': parts[4] if len(parts) > 4 else None
-                    }
-                    leases.append(lease)
+        leases, _ = DnsmasqLeaseFile(leases_file).update()
     return leases
 
-def run_watcher(target_filename, default_domain, watch_file):
-    unbound_local_data = UnboundLocalData()
-    cached_leases = {}
-    last_cleanup = time.time()
-
-    while True:
-        leases = parse_dnsmasq_leases(watch_file)
-        dhcpd_changed = False
-        remove_rr = []
-        add_rr = []
-
-        # Process leases
-        for lease in leases:
-            if lease['expires'] > time.time() and lease['hostname'] and lease['address']:
-                address = ipaddress.ip_address(lease['address'])
-                fqdn = f"{lease['hostname']}.{default_domain}"
-
-                # Cache the lease
-                cached_leases[lease['address']] = lease
-                dhcpd_changed = True
+class DnsmasqBackend(LeaseBackend):
+    """dnsmasq lease file source, the file is only read when it changed.
 
-                # Update Unbound if necessary
-                if not unbound_local_data.is_equal(lease['address'], fqdn):
-                    remove_rr.append(f"{address.reverse_pointer}")
-                    remove_rr.append(f"{fqdn}")
-                    unbound_local_data.cleanup(lease['address'], fqdn)
-                    add_rr.append(f"{address.reverse_pointer} PTR {fqdn}")
-                    add_rr.append(f"{fqdn} IN A {lease['address']}")
-                    unbound_local_data.add_address(lease['address'], fqdn)
+    With --dhcp-script forwarding events (lease_events.py) the file is only a consistency check.
+    """
+    name = 'dnsmasq'
+    event_driven = True
 
-        # Cleanup expired leases
-        if time.time() - last_cleanup > CLEANUP_INTERVAL:
-            last_cleanup = time.time()
-            for address in list(cached_leases):
-                if cached_leases[address]['expires'] < time.time():
-                    fqdn = f"{cached_leases[address]['hostname']}.{default_domain}"
-                    remove_rr.append(f"{ipaddress.ip_address(address).reverse_pointer}")
-                    remove_rr.append(f"{fqdn}")
-                    unbound_local_data.cleanup(address, fqdn)
-                    del cached_leases[address]
-                    dhcpd_changed = True
+    def __init__(self, path, domain, config=None):
+        super().__init__(path, domain, config)
+        self.lease_file = DnsmasqLeaseFile(path)
 
-        # Apply changes to Unbound
-        if dhcpd_changed:
-            if remove_rr:
-                unbound_control(['local_datas_remove'], input=remove_rr)
-            if add_rr:
-                unbound_control(['local_datas'], input=add_rr)
+    def update(self):
+        changed, removed = self.lease_file.update()
+        # an expiry time of 0 is an infinite lease
+        return [{'address': lease['address'], 'hostname': lease['hostname'], 'expire': lease['expires'] or None}
+                for lease in changed], removed
 
-        # Sleep before next check
-        time.sleep(1)
+def run_watcher(target_filename, default_domain, watch_file, profiler=None):
+    WatcherDaemon([DnsmasqBackend(watch_file, default_domain)], target_filename, profiler=profiler).run()
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -110,14 +44,16 @@ if __name__ == '__main__':
     parser.add_argument('--domain', help='default domain to use', default=DEFAULT_DOMAIN)
     parser.add_argument('--foreground', help='run in foreground', default=False, action='store_true')
     parser.add_argument('--log-level', help='set the logging level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'])
+    add_profile_arguments(parser)
     inputargs = parser.parse_args()
 
     syslog.openlog('unbound_dnsmasq_watcher', facility=syslog.LOG_LOCAL4)
 
     if inputargs.foreground:
-        run_watcher(target_filename=inputargs.target, default_domain=inputargs.domain, watch_file=inputargs.source)
+        run_watcher(target_filename=inputargs.target, default_domain=inputargs.domain, watch_file=inputargs.source, profiler=profiler_from_args(inputargs))
     else:
+        from daemonize import Daemonize
         syslog.syslog(syslog.LOG_NOTICE, 'daemonize unbound dnsmasq watcher.')
-        cmd = lambda: run_watcher(target_filename=inputargs.target, default_domain=inputargs.domain, watch_file=inputargs.source)
+        cmd = lambda: run_watcher(target_filename=inputargs.target, default_domain=inputargs.domain, watch_file=inputargs.source, profiler=profiler_from_args(inputargs))
         daemon = Daemonize(app="unbound_dnsmasq_watcher", pid=inputargs.pid, action=cmd)
         daemon.start()
\ No newline at end of file
@@ -0,0 +1,63 @@
+"""Unbound python module answering A, AAAA and PTR queries of the lease domains from the lease map.
+
+Load it with a python-script and put it in front of the other modules:
+
+    server:
+        module-config: "python validator iterator"
+    python:
+        python-script: "/dhcp_watcher/unbound_lease_map.py"
+
+The watcher writes the map with --lease-map, DHCP_LEASE_MAP points the module at the same
+file. Names outside the zones of the map, or any query while the map is missing, are passed
+on to the next module. The lookup code lives in lease_map.LeaseMapReader so it can be run
+without unbound. MODULE_*, DNSMessage and the other names used below are provided by unbound.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.environ.get('DHCP_WATCHER_PATH', '/dhcp_watcher'))
+from lease_map import DEFAULT_LEASE_MAP, RCODE_NXDOMAIN, LeaseMapReader
+
+reader = None
+
+
+def init_standard(id, env):
+    global reader
+    reader = LeaseMapReader(os.environ.get('DHCP_LEASE_MAP', DEFAULT_LEASE_MAP))
+    log_info(f"unbound_lease_map: serving lease records from {reader.path}")
+    return True
+
+
+def deinit(id):
+    if reader is not None:
+        reader.close()
+    return True
+
+
+def inform_super(id, qstate, superqstate, qdata):
+    return True
+
+
+def operate(id, event, qstate, qdata):
+    if event in (MODULE_EVENT_NEW, MODULE_EVENT_PASS):
+        answer = reader.answer(qstate.qinfo.qname_str, qstate.qinfo.qtype) if qstate.qinfo.qclass == RR_CLASS_IN else None
+        if answer is None:
+            qstate.ext_state[id] = MODULE_WAIT_MODULE
+            return True
+        rcode, rrs = answer
+        msg = DNSMessage(qstate.qinfo.qname_str, qstate.qinfo.qtype, RR_CLASS_IN, PKT_QR | PKT_RA | PKT_AA)
+        msg.answer.extend(rrs)
+        if not msg.set_return_msg(qstate):
+            qstate.ext_state[id] = MODULE_ERROR
+            return True
+        if rcode == RCODE_NXDOMAIN:
+            qstate.return_rcode = RCODE_NXDOMAIN
+        # local data, not subject to validation
+        qstate.return_msg.rep.security = 2
+        qstate.ext_state[id] = MODULE_FINISHED
+        return True
+    if event == MODULE_EVENT_MODDONE:
+        qstate.ext_state[id] = MODULE_FINISHED
+        return True
+    qstate.ext_state[id] = MODULE_ERROR
+    return True
@@ -0,0 +1,206 @@
+import os
+import re
+import socket
+import selectors
+import subprocess
+import logging
+
+DEFAULT_CONTROL_INTERFACE = '/run/unbound.control.sock'
+UNBOUND_CONTROL = '/usr/sbin/unbound-control'
+CONTROL_VERSION = 1
+CONNECT_RETRIES = 3
+SEND_CHUNK_SIZE = 64 * 1024
+
+# Commands that read lines from the client until an EOF marker (see unbound-control.c go_cmd())
+STREAMING_COMMANDS = frozenset([
+    'local_zones', 'local_zones_remove', 'local_datas', 'local_datas_remove',
+    'view_local_datas', 'view_local_datas_remove',
+])
+END_OF_TRANSMISSION = b'\x04\n'
+
+_COUNT_RE = re.compile(r'^(added|removed) (\d+) (datas|zones)$')
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class UnboundControlError(Exception):
+    pass
+
+
+class ControlResult:
+    """Parsed reply of a single remote-control command."""
+    __slots__ = ('command', 'output', 'errors', 'count')
+
+    def __init__(self, command, output):
+        self.command = command
+        self.output = output
+        self.errors = [line for line in output if line.startswith('error')]
+        self.count = None
+        for line in output:
+            match = _COUNT_RE.match(line)
+            if match:
+                self.count = int(match.group(2))
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def __repr__(self):
+        return f"ControlResult(command={self.command!r}, ok={self.ok}, count={self.count}, errors={len(self.errors)})"
+
+
+class UnboundControl:
+    """Client for Unbound's remote-control protocol on a local control socket.
+
+    Unbound answers one command per connection and closes it afterwards, so instead of
+    keeping a socket open we reconnect for every command; over a unix socket this costs a
+    connect() instead of a fork+exec of unbound-control and a TLS handshake.
+    Interfaces that are not a socket path (ip@port) are handed to the unbound-control binary.
+    """
+
+    def __init__(self, control_interface=DEFAULT_CONTROL_INTERFACE, timeout=10.0, chunk_size=SEND_CHUNK_SIZE):
+        self.control_interface = control_interface
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+
+    @property
+    def is_local(self):
+        return self.control_interface.startswith('/')
+
+    def _connect(self):
+        last_error = None
+        for _ in range(CONNECT_RETRIES):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.control_interface)
+                return sock
+            except OSError as e:
+                sock.close()
+                last_error = e
+        raise UnboundControlError(f"unable to connect to {self.control_interface}: {last_error}")
+
+    def _payload(self, commands, input):
+        """Yield the request as bounded chunks, never joining the whole input in memory."""
+        yield f"UBCT{CONTROL_VERSION} {' '.join(commands)}\n".encode()
+        if commands[0] not in STREAMING_COMMANDS:
+            return
+        buffer = bytearray()
+        for line in input or ():
+            buffer += line.encode()
+            buffer += b'\n'
+            if len(buffer) >= self.chunk_size:
+                yield bytes(buffer)
+                buffer.clear()
+        buffer += END_OF_TRANSMISSION
+        yield bytes(buffer)
+
+    def _exchange(self, commands, input):
+        """Send the request while draining the reply, yield reply data as it arrives.
+
+        Unbound may write an error line per rejected input line, reading while we write keeps
+        both socket buffers from filling up on large batches.
+        """
+        sock = self._connect()
+        try:
+            sock.setblocking(False)
+            chunks = self._payload(commands, input)
+            pending = memoryview(next(chunks))
+            with selectors.DefaultSelector() as selector:
+                selector.register(sock, selectors.EVENT_READ | selectors.EVENT_WRITE)
+                while True:
+                    events = selector.select(self.timeout)
+                    if not events:
+                        raise UnboundControlError(f"timeout waiting for {self.control_interface}")
+                    mask = events[0][1]
+                    if mask & selectors.EVENT_READ:
+                        data = sock.recv(self.chunk_size)
+                        if not data:
+                            return
+                        yield data
+                    if pending is not None and mask & selectors.EVENT_WRITE:
+                        pending = pending[sock.send(pending):]
+                        if not pending:
+                            chunk = next(chunks, None)
+                            if chunk is not None:
+                                pending = memoryview(chunk)
+                            else:
+                                pending = None
+                                selector.modify(sock, selectors.EVENT_READ)
+        except OSError as e:
+            raise UnboundControlError(f"{commands[0]} failed on {self.control_interface}: {e}") from e
+        finally:
+            sock.close()
+
+    def iter_output(self, commands, input=None):
+        """Stream the output lines of a command (e.g. list_local_data) without buffering it all."""
+        if not self.is_local:
+            yield from self._run_binary(commands, input).output
+            return
+        remainder = b''
+        for data in self._exchange(commands, input):
+            lines = (remainder + data).split(b'\n')
+            remainder = lines.pop()
+            for line in lines:
+                yield line.decode(errors='replace')
+        if remainder:
+            yield remainder.decode(errors='replace')
+
+    def run(self, commands, input=None):
+        """Execute a command, input is an (optional) iterable of lines. Returns a ControlResult."""
+        if not self.is_local:
+            return self._run_binary(commands, input)
+        logger.debug(f"Executing unbound control command: {commands}")
+        result = ControlResult(commands[0], list(self.iter_output(commands, input)))
+        logger.debug(f"unbound control result: {result}")
+        return result
+
+    def _run_binary(self, commands, input):
+        input_string = None
+        if input:
+            input_string = '\n'.join(input) + '\n'
+        result = subprocess.run([UNBOUND_CONTROL, '-s', self.control_interface] + list(commands), input=input_string, text=True, capture_output=True)
+        output = result.stdout.splitlines()
+        if result.stderr:
+            output += [f"error: {line}" for line in result.stderr.splitlines()]
+        return ControlResult(commands[0], output)
+
+    def local_datas(self, rrs):
+        return self.run(['local_datas'], input=rrs)
+
+    def local_datas_remove(self, names):
+        return self.run(['local_datas_remove'], input=names)
+
+    def local_zones(self, zones):
+        return self.run(['local_zones'], input=zones)
+
+    def local_zones_remove(self, zones):
+        return self.run(['local_zones_remove'], input=zones)
+
+
+_default_control = None
+
+
+def default_control():
+    """Shared client instance, the control interface can be overridden by UNBOUND_CONTROL_INTERFACE."""
+    global _default_control
+    if _default_control is None:
+        _default_control = UnboundControl(os.environ.get('UNBOUND_CONTROL_INTERFACE', DEFAULT_CONTROL_INTERFACE))
+    return _default_control
+
+
+def unbound_control(commands, input=None):
+    """ Execute unbound control command over the shared client
+        :param commands: command list (parameters)
+        :param input: (optional) iterable of lines to be sent to input stream
+        :return: ControlResult or None when unbound could not be reached
+    """
+    try:
+        result = default_control().run(commands, input=input)
+    except UnboundControlError as e:
+        logger.error(f"unbound-control error: {e}")
+        return None
+    for error in result.errors:
+        logger.error(f"unbound-control error: {error}")
+    return result
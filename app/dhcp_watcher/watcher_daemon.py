@@ -0,0 +1,460 @@
+import time
+import syslog
+import argparse
+import logging
+import importlib
+import selectors
+from address_policy import AddressPolicy, DEFAULT_MAX_ADDRESSES, DEFAULT_HOLD_TIME
+from batch_flusher import BatchFlusher, DEFAULT_DEBOUNCE, DEFAULT_MAX_DELAY, DEFAULT_CHUNK_SIZE, MAX_DELAY_FACTOR
+from lease_backends import lease_problem
+from lease_events import LeaseEventListener
+from lease_map import LeaseMapWriter, rrsets_of_records
+from local_zones import LocalZones, ZONE_TYPES, read_declared_zones
+from metrics import MetricsServer, WatcherMetrics
+from profiler import CycleProfiler, add_profile_arguments, profiler_from_args
+from reconciler import reconcile, read_snapshot_owners
+from record_store import RecordStore, is_address, is_hostname
+from ttl_policy import TtlPolicy, DEFAULT_MIN_TTL, DEFAULT_MAX_TTL
+from snapshot_writer import SnapshotWriter, render_local_data
+from unbound_remote_control import UnboundControlError, default_control, unbound_control
+
+DEFAULT_DOMAIN = 'lan'
+CONSISTENCY_INTERVAL = 300  # seconds, polling of sources with pushed lease events
+
+# lease source type => (module, backend class), imported on demand
+BACKENDS = {
+    'dhcpd': ('unbound_dhcpd_watcher', 'DhcpdBackend'),
+    'kea': ('unbound_kea_watcher', 'KeaBackend'),
+    'kea-control': ('kea_control', 'KeaControlBackend'),
+    'kea6-control': ('kea_control', 'Kea6ControlBackend'),
+    'dnsmasq': ('unbound_dnsmasq_watcher', 'DnsmasqBackend'),
+    'systemd-networkd': ('unbound_systemd_networkd_watcher', 'SystemdNetworkdBackend'),
+    'slaac-resolver': ('unbound_slaac_resolver_watcher', 'SlaacResolverBackend'),
+}
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def create_backend(kind, path, domain, config=None):
+    module_name, class_name = BACKENDS[kind]
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    return backend_class(path, domain, config)
+
+
+class WatcherDaemon:
+    """Run several lease backends in one event loop, sharing one record store.
+
+    Changes of all backends are coalesced for batch_delay seconds (at most batch_max_delay,
+    MAX_DELAY_FACTOR times batch_delay by default) and sent to unbound as local_datas_remove /
+    local_datas batches of at most batch_size lines per command.
+    With a zone_type the lease domains and reverse zones are declared as local zones, without
+    one the zones a previous run declared are removed.
+
+    With a lease_map the records are not sent as local-data, they are written to the lease
+    map served by the unbound_lease_map module. Local zones are then transparent so queries
+    reach the module.
+    """
+
+    def __init__(self, backends, target_filename=None, event_socket=None, policy=None,
+                 batch_delay=0, batch_size=DEFAULT_CHUNK_SIZE, metrics_listen=None, profiler=None, ttl_policy=None,
+                 zone_type=None, lease_map=None, batch_max_delay=None):
+        self.backends = backends
+        self.store = RecordStore(policy, ttl_policy)
+        self.metrics = WatcherMetrics(self.store)
+        self.profiler = profiler or CycleProfiler()
+        if batch_max_delay is None:
+            batch_max_delay = batch_delay * MAX_DELAY_FACTOR
+        self.flusher = BatchFlusher(debounce=batch_delay, max_delay=batch_max_delay, chunk_size=batch_size)
+        self.snapshot = SnapshotWriter(target_filename) if target_filename else None
+        self.lease_map = None
+        if lease_map:
+            self.lease_map = LeaseMapWriter(lease_map)
+            if zone_type != 'transparent':
+                logger.info(f"Declaring transparent local zones instead of {zone_type or 'no local zones'}, "
+                            f"the lease map answers misses")
+                zone_type = 'transparent'
+        self.zones = None
+        declared = read_declared_zones(target_filename) if target_filename else {}
+        if zone_type or declared:
+            # without a zone_type the zones of a previous run are removed
+            self.zones = LocalZones(zone_type, declared, private_fallback=self.lease_map is not None)
+        self.selector = selectors.DefaultSelector()
+        self.events = None
+        if event_socket:
+            self.events = LeaseEventListener(event_socket)
+            self.selector.register(self.events.fileno(), selectors.EVENT_READ, self.events)
+            for backend in backends:
+                if backend.event_driven:
+                    backend.use_events(CONSISTENCY_INTERVAL)
+        self.metrics_server = None
+        if metrics_listen:
+            self.metrics_server = MetricsServer(metrics_listen, self.metrics, self.selector)
+        for backend in backends:
+            if backend.watcher.fileno() is not None:
+                self.selector.register(backend.watcher.fileno(), selectors.EVENT_READ, backend)
+
+    def load(self, backend):
+        """Apply the changes of a backend to the record store, return True when records changed."""
+        start = time.perf_counter()
+        changed, removed = backend.update()
+        parsed = time.perf_counter()
+        self.metrics.parse_seconds.observe(parsed - start, backend.name)
+        self.profiler.record('parse', parsed - start)
+        records_changed = self._apply(backend, changed, removed)
+        self.profiler.record('diff', time.perf_counter() - parsed)
+        return records_changed
+
+    def receive_events(self):
+        """Apply pushed lease events to the record store, return True when records changed."""
+        events_by_backend = {}
+        for event in self.events.receive():
+            events_by_backend.setdefault(event.get('source'), []).append(event)
+        records_changed = False
+        for backend in self.backends:
+            events = events_by_backend.pop(backend.name, None)
+            if events:
+                logger.debug(f"{len(events)} {backend.name} lease events")
+                records_changed |= self._apply(backend, *backend.apply_events(events))
+        for source in events_by_backend:
+            logger.warning(f"Ignoring lease events of unconfigured source {source}")
+        return records_changed
+
+    def _apply(self, backend, changed, removed):
+        now = time.time()
+        records_changed = False
+        for lease in changed:
+            problem = lease_problem(lease)
+            if problem:
+                logger.warning(f"Ignoring {backend.name} lease with {problem}")
+                continue
+            if lease['hostname'] and not is_hostname(lease['hostname']):
+                logger.warning(f"Not publishing {backend.name} lease {lease['address']}, invalid hostname {lease['hostname']!r}")
+                records_changed |= self.store.discard(lease['address'], backend.name)
+            elif lease['hostname'] and (lease['expire'] is None or lease['expire'] > now):
+                records_changed |= self.store.set(backend.name, lease['address'], lease['hostname'],
+                                                  backend.domain_for(lease['address']), lease['expire'])
+            else:
+                records_changed |= self.store.discard(lease['address'], backend.name)
+        for address in removed:
+            if is_address(address) and self.store.discard(address, backend.name):
+                logger.debug(f"{backend.name} lease no longer exists: {address}")
+                records_changed = True
+        return records_changed
+
+    def remap(self, backend):
+        """Move the leases of a backend to the domains of its reloaded domain ranges, return True when records changed."""
+        records_changed = False
+        for record in self.store.leases(backend.name):
+            domain = backend.domain_for(record.address)
+            if record.fqdn != f"{record.hostname}.{domain}":
+                records_changed |= self.store.set(backend.name, record.address, record.hostname, domain, record.expire)
+        return records_changed
+
+    def cleanup(self):
+        """Remove expired leases from the record store and re-render records whose TTL bucket dropped."""
+        now = time.time()
+        expired = self.store.expired(now)
+        for address in expired:
+            logger.debug(f"Lease expired: {address}")
+            self.store.discard(address)
+        return self.store.refresh_ttls(now) or bool(expired)
+
+    def reconcile(self):
+        """Load all backends and send unbound only what differs from its live local-data.
+
+        Live records in the lease domains without a lease are removed when the previous
+        target snapshot lists them, records of other sources are left alone.
+        """
+        for backend in self.backends:
+            self.load(backend)
+        self.cleanup()
+        self.update_zones(replace=True)
+        domains = set().union(*(backend.domains() for backend in self.backends))
+        owned = read_snapshot_owners(self.snapshot.target_filename) if self.snapshot is not None else None
+        if self.lease_map is not None:
+            self._reconcile_lease_map(domains, owned)
+            return
+        start = time.perf_counter()
+        try:
+            remove_rr, add_rr = reconcile(self.store, default_control().iter_output(['list_local_data']), domains, owned)
+        except UnboundControlError as e:
+            self.metrics.control_failures.inc(1, 'list_local_data')
+            logger.warning(f"Unable to list unbound local data, replacing all records: {e}")
+            self._send(*self.store.changes(replace=True))
+            return
+        self.metrics.diff_seconds.observe(time.perf_counter() - start)
+        self.profiler.record('diff', time.perf_counter() - start)
+        logger.info(f"Reconciled {len(self.store)} leases with unbound")
+        if self.snapshot is not None:
+            self._render()
+        self._send(remove_rr, add_rr)
+
+    def _reconcile_lease_map(self, domains, owned):
+        """Serve all records from the lease map, remove live local-data of earlier runs that would shadow it."""
+        self.store.mark_published()
+        self._write_lease_map()
+        logger.info(f"Serving {len(self.store)} leases from {self.lease_map.path}")
+        if self.snapshot is not None:
+            self._render()
+            self.snapshot.flush()
+        try:
+            remove_rr, _ = reconcile(RecordStore(), default_control().iter_output(['list_local_data']), domains, owned)
+        except UnboundControlError as e:
+            self.metrics.control_failures.inc(1, 'list_local_data')
+            logger.warning(f"Unable to list unbound local data: {e}")
+            return
+        for chunk in self.flusher.chunks(remove_rr):
+            self._control('local_datas_remove', chunk)
+
+    def _write_lease_map(self):
+        start = time.perf_counter()
+        zones = [zone for zone, _ in self.zones.declared()]
+        self.lease_map.publish(rrsets_of_records(self.store.records()), zones)
+        self.profiler.record('render', time.perf_counter() - start)
+
+    def update_zones(self, replace=False):
+        """Declare the local zones of the lease domains and ranges, return True when records have to be re-sent.
+
+        :param replace: unbound's state is unknown, declare every zone again
+        """
+        if self.zones is None:
+            return False
+        added, removed = self.zones.changes(self.backends, replace)
+        if removed:
+            logger.info(f"Removing local zones {', '.join(removed)}")
+            self._control('local_zones_remove', removed)
+        if added:
+            logger.info(f"Declaring {self.zones.zone_type} local zones {', '.join(added)}")
+            self._control('local_zones', [f"{zone} {self.zones.zone_type}" for zone in added])
+        if (added or removed) and self.lease_map is not None:
+            self._write_lease_map()
+        if (added or removed) and self.snapshot is not None:
+            self._render()
+        return bool(removed) and self.store.unpublish(removed)
+
+    def publish(self):
+        """Send pending record changes to unbound and keep the target snapshot in sync.
+
+        :return: True when records were sent
+        """
+        start = time.perf_counter()
+        remove_rr, add_rr = self.store.changes()
+        self.metrics.diff_seconds.observe(time.perf_counter() - start)
+        self.profiler.record('diff', time.perf_counter() - start)
+        return self._send(remove_rr, add_rr)
+
+    def _control(self, command, lines):
+        start = time.perf_counter()
+        result = unbound_control([command], input=lines)
+        elapsed = time.perf_counter() - start
+        self.metrics.control_seconds.observe(elapsed, command)
+        self.profiler.record('control', elapsed)
+        if result is None or not result.ok:
+            self.metrics.control_failures.inc(1, command)
+
+    def _render(self):
+        start = time.perf_counter()
+        zones = self.zones.declared() if self.zones is not None else ()
+        # records served from the lease map must not come back as local-data when unbound restarts
+        records = self.store.records() if self.lease_map is None else ()
+        self.snapshot.update(render_local_data(records, zones))
+        self.profiler.record('render', time.perf_counter() - start)
+
+    def _send(self, remove_rr, add_rr):
+        if self.lease_map is not None:
+            return self._swap_lease_map(remove_rr, add_rr)
+        # all removals go first, an owner removed after its records were re-added would lose them
+        if remove_rr:
+            logger.debug(f"Removing {len(remove_rr)} resource records")
+            for chunk in self.flusher.chunks(remove_rr):
+                self._control('local_datas_remove', chunk)
+            self.metrics.records_removed.inc(len(remove_rr))
+        if add_rr:
+            logger.debug(f"Adding {len(add_rr)} resource records")
+            for chunk in self.flusher.chunks(add_rr):
+                self._control('local_datas', chunk)
+            self.metrics.records_added.inc(len(add_rr))
+        if self.snapshot is not None:
+            if remove_rr or add_rr:
+                self._render()
+            self.snapshot.flush()
+        return bool(remove_rr or add_rr)
+
+    def _swap_lease_map(self, remove_rr, add_rr):
+        if remove_rr or add_rr:
+            logger.debug(f"Publishing the lease map, {len(remove_rr)} removed and {len(add_rr)} added resource records")
+            self._write_lease_map()
+            self.metrics.records_removed.inc(len(remove_rr))
+            self.metrics.records_added.inc(len(add_rr))
+        if self.snapshot is not None:
+            if remove_rr or add_rr:
+                self._render()
+            self.snapshot.flush()
+        return bool(remove_rr or add_rr)
+
+    def cycle(self, backends, events=False):
+        """Process one loop iteration for the backends that reported a change."""
+        records_changed = False
+        if events:
+            records_changed |= self.receive_events()
+        for backend in backends:
+            records_changed |= self.load(backend)
+        ranges_changed = False
+        for backend in self.backends:
+            if backend.domain_map.refresh():
+                records_changed |= self.remap(backend)
+                ranges_changed = True
+        if ranges_changed:
+            records_changed |= self.update_zones()
+        records_changed |= self.cleanup()
+        release = self.store.next_release()
+        if records_changed or (release is not None and release <= time.time()):
+            self.flusher.touch()
+        pending_since = self.flusher.pending_since
+        if self.flusher.due():
+            if self.publish():
+                self.metrics.propagation_seconds.observe(time.monotonic() - pending_since)
+        elif self.snapshot is not None:
+            self.snapshot.flush()
+        self.profiler.cycle_done()
+
+    def _timeout(self):
+        timeout = min(backend.watcher.next_timeout() for backend in self.backends)
+        # sleep exactly until the next lease ends, held back addresses or TTL refreshes are due
+        for due in (self.store.next_expiry(), self.store.next_release(), self.store.next_ttl_refresh()):
+            if due is not None:
+                timeout = min(timeout, max(0, due - time.time()))
+        timeout = self.flusher.timeout(timeout)
+        if self.snapshot is not None:
+            timeout = self.snapshot.timeout(timeout)
+        if self.metrics_server is not None:
+            timeout = self.metrics_server.timeout(timeout)
+        return timeout
+
+    def wait(self):
+        """Block until a backend changes or a timer is due.
+
+        :return: (backends that changed, lease events pending)
+        """
+        readable = {key.data for key, _ in self.selector.select(self._timeout())}
+        if self.profiler in readable:
+            self.profiler.handle()  # the toggle is applied at the end of the cycle
+        if self.metrics_server is not None and (self.metrics_server in readable or self.metrics_server.pending):
+            self.metrics_server.handle()
+        changed = [backend for backend in self.backends if backend.watcher.check(backend in readable)]
+        return changed, self.events is not None and self.events in readable
+
+    def run(self):
+        logger.info(f"Watching {', '.join(f'{b.name}:{b.path}' for b in self.backends)}")
+        self.profiler.install_signal()
+        self.selector.register(self.profiler.fileno(), selectors.EVENT_READ, self.profiler)
+        if self.profiler.autostart:
+            self.profiler.start()
+        self.reconcile()
+        while True:
+            self.cycle(*self.wait())
+
+    def close(self):
+        self.selector.close()
+        self.profiler.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        if self.events is not None:
+            self.events.close()
+        for backend in self.backends:
+            backend.close()
+        if self.lease_map is not None:
+            self.lease_map.close()
+
+
+def parse_backend(value):
+    kind, sep, path = value.partition(':')
+    if not sep or kind not in BACKENDS or not path:
+        raise argparse.ArgumentTypeError(f"expected type:path with type one of {', '.join(BACKENDS)}")
+    return kind, path
+
+
+def positive_int(value):
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an integer, got {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {number}")
+    return number
+
+
+def non_negative_float(value):
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a number, got {value!r}")
+    if not number >= 0:
+        raise argparse.ArgumentTypeError(f"expected a number of seconds of at least 0, got {number}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='dhcp_watcher')
+    parser.add_argument('--pid', help='pid file location', default='/var/run/unbound_dhcp_watcher.pid')
+    parser.add_argument('--backend', help='lease source as type:path, can be repeated', type=parse_backend,
+                        action='append', required=True)
+    parser.add_argument('--target', help='target config file, used when unbound restarts', default='/var/unbound/dhcpleases.conf')
+    parser.add_argument('--domain', help='default domain to use', default=DEFAULT_DOMAIN)
+    parser.add_argument('--config', help='configuration file with per range (IPv4 or IPv6) domains', default=None)
+    parser.add_argument('--ipv6-max-addresses', help='AAAA records published per host, 0 for no limit', type=int,
+                        default=DEFAULT_MAX_ADDRESSES)
+    parser.add_argument('--ipv6-hold-time', help='seconds further IPv6 addresses of a host are held back', type=float,
+                        default=DEFAULT_HOLD_TIME)
+    parser.add_argument('--min-ttl', help='TTL of records whose lease is about to end', type=positive_int, default=DEFAULT_MIN_TTL)
+    parser.add_argument('--max-ttl', help='TTL of records with a long remaining lease, 0 for unbound\'s default TTL',
+                        type=int, default=DEFAULT_MAX_TTL)
+    parser.add_argument('--local-zone-type', help='local-zone type of the lease domains and the private reverse zones '
+                        'of their ranges, none are declared by default', choices=ZONE_TYPES + ('off',), default=None)
+    parser.add_argument('--batch-delay', help='seconds changes are coalesced before they are sent to unbound',
+                        type=non_negative_float, default=DEFAULT_DEBOUNCE)
+    parser.add_argument('--batch-max-delay', help='seconds a batch may be held back while changes keep arriving',
+                        type=non_negative_float, default=DEFAULT_MAX_DELAY)
+    parser.add_argument('--batch-size', help='maximum lines per unbound control command', type=positive_int,
+                        default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--metrics-listen', help='serve Prometheus metrics on [host]:port or a unix socket path',
+                        default=None)
+    parser.add_argument('--lease-map', help='serve records from this lease map file through the unbound python module '
+                        'instead of local-data', default=None)
+    parser.add_argument('--event-socket', help='unix datagram socket receiving pushed lease events', default=None)
+    parser.add_argument('--foreground', help='run in foreground', default=False, action='store_true')
+    parser.add_argument('--log-level', help='set the logging level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'])
+    add_profile_arguments(parser)
+    inputargs = parser.parse_args()
+    if inputargs.lease_map and inputargs.local_zone_type == 'off':
+        parser.error('--lease-map needs local zones, --local-zone-type off cannot be used with it')
+
+    # Set the logging level based on the argument
+    logging.basicConfig(level=getattr(logging, inputargs.log_level), format='%(asctime)s - %(levelname)s - %(message)s')
+    syslog.openlog('unbound_dhcp_watcher', facility=syslog.LOG_LOCAL4)
+
+    logger.info(f"Starting dhcp_watcher with arguments: {vars(inputargs)}")
+    run = lambda: WatcherDaemon(
+        [create_backend(kind, path, inputargs.domain, inputargs.config) for kind, path in inputargs.backend],
+        inputargs.target,
+        inputargs.event_socket,
+        AddressPolicy(inputargs.ipv6_max_addresses, inputargs.ipv6_hold_time),
+        inputargs.batch_delay,
+        inputargs.batch_size,
+        inputargs.metrics_listen,
+        profiler_from_args(inputargs),
+        TtlPolicy(inputargs.min_ttl, inputargs.max_ttl) if inputargs.max_ttl else None,
+        None if inputargs.local_zone_type == 'off' else inputargs.local_zone_type,
+        inputargs.lease_map,
+        inputargs.batch_max_delay
+    ).run()
+    if inputargs.foreground:
+        logger.info("Running in foreground mode")
+        run()
+    else:
+        from daemonize import Daemonize
+        logger.info("Running in daemon mode")
+        syslog.syslog(syslog.LOG_NOTICE, 'daemonize unbound dhcp watcher.')
+        daemon = Daemonize(app="unbound_dhcp_watcher", pid=inputargs.pid, action=run)
+        daemon.start()
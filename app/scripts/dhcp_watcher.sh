@@ -0,0 +1,76 @@
+#!/bin/ash
+if [ -z "$DOMAIN" ]; then
+	DOMAIN=home;
+fi
+
+BACKENDS=""
+
+if [ -n "$DHCPSERVER" ]; then
+	case "${DHCPSERVER}" in
+		dhcpd|kea|kea-control|kea6-control|dnsmasq|systemd-networkd) ;;
+		*)
+			echo "Unknown DHCP server type: ${DHCPSERVER}. Exiting..."
+			exit 1
+			;;
+	esac
+	if [ ! -e '/dhcp.leases' ]; then
+		echo "Leases file or folder /dhcp.leases not found. Exiting..."
+		exit 1
+	fi
+	BACKENDS="${BACKENDS} --backend ${DHCPSERVER}:/dhcp.leases"
+fi
+
+if [ -n "$IPV6_WATCHER" ]; then
+	if [ "${IPV6_WATCHER}" != "slaac-resolver" ]; then
+		echo "Unknown SLAAC Watcher type: ${IPV6_WATCHER}. Exiting..."
+		exit 1
+	fi
+	if [ ! -e '/ipv6-watcher' ]; then
+		echo "ipv6-watcher directory not found. Exiting..."
+		exit 1
+	fi
+	BACKENDS="${BACKENDS} --backend ${IPV6_WATCHER}:/ipv6-watcher"
+fi
+
+if [ -z "$BACKENDS" ]; then
+	echo "No DHCP server or SLAAC Watcher defined. Keeping the process running but doing nothing..."
+    while true; do
+        sleep 3600  # Sleep for 1 hour to keep the process alive
+	done
+fi
+
+if [ -n "$DHCP_EVENT_SOCKET" ]; then
+	mkdir -p "$(dirname "$DHCP_EVENT_SOCKET")"
+	BACKENDS="${BACKENDS} --event-socket ${DHCP_EVENT_SOCKET}"
+fi
+
+if [ -n "$DHCP_DOMAIN_CONFIG" ]; then
+	BACKENDS="${BACKENDS} --config ${DHCP_DOMAIN_CONFIG}"
+fi
+
+if [ -n "$DHCP_METRICS_LISTEN" ]; then
+	BACKENDS="${BACKENDS} --metrics-listen ${DHCP_METRICS_LISTEN}"
+fi
+
+if [ -n "$DHCP_MIN_TTL" ]; then
+	BACKENDS="${BACKENDS} --min-ttl ${DHCP_MIN_TTL}"
+fi
+
+if [ -n "$DHCP_MAX_TTL" ]; then
+	BACKENDS="${BACKENDS} --max-ttl ${DHCP_MAX_TTL}"
+fi
+
+if [ -n "$DHCP_LOCAL_ZONE_TYPE" ]; then
+	BACKENDS="${BACKENDS} --local-zone-type ${DHCP_LOCAL_ZONE_TYPE}"
+fi
+
+if [ -n "$DHCP_LEASE_MAP" ]; then
+	mkdir -p "$(dirname "$DHCP_LEASE_MAP")"
+	BACKENDS="${BACKENDS} --lease-map ${DHCP_LEASE_MAP}"
+fi
+
+cd / && exec python3 -m dhcp_watcher ${BACKENDS} \
+	--foreground \
+	--target /etc/unbound/unbound.conf.d/dhcpleases.conf \
+	--domain $DOMAIN \
+	--log-level ${DHCP_LOG_LEVEL}
@@ -23,5 +23,6 @@ fi
 
 python3 ${WATCHER} \
 	--foreground --source /slaac-resolver \
+	--target /etc/unbound/unbound.conf.d/slaacleases.conf \
 	--domain $DOMAIN \
 	--log-level ${DHCP_LOG_LEVEL}
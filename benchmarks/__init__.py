@@ -0,0 +1,4 @@
+import os
+import sys
+# the watcher modules import each other as top level modules, like the watcher scripts do
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'dhcp_watcher'))
@@ -0,0 +1,72 @@
+import threading
+import socketserver
+from unbound_remote_control import END_OF_TRANSMISSION, STREAMING_COMMANDS
+
+
+def _owner_rr(line):
+    """Split an rr line ("name [ttl] [IN] type rdata") into (owner, type, rdata)."""
+    parts = line.split()
+    index = 1
+    while index < len(parts) - 1 and (parts[index].isdigit() or parts[index] == 'IN'):
+        index += 1
+    return parts[0].rstrip('.'), parts[index], ' '.join(parts[index + 1:])
+
+
+class RecordingControlHandler(socketserver.StreamRequestHandler):
+    """Speaks unbound's remote-control protocol for the commands the watchers use."""
+
+    def handle(self):
+        header = self.rfile.readline().decode()
+        command = header.split()[1]
+        lines = []
+        if command in STREAMING_COMMANDS:
+            for raw in self.rfile:
+                if raw == END_OF_TRANSMISSION:
+                    break
+                lines.append(raw.decode().rstrip('\n'))
+        reply = self.server.apply(command, lines)
+        self.wfile.write(''.join(f"{line}\n" for line in reply).encode())
+
+
+class RecordingControlServer(socketserver.ThreadingUnixStreamServer):
+    """Fake unbound control socket counting the commands and lines it receives.
+
+    Local data is kept per owner like unbound's local zones do, so list_local_data answers
+    with what the watcher published before.
+    """
+    daemon_threads = True
+
+    def __init__(self, path):
+        super().__init__(path, RecordingControlHandler)
+        self.lock = threading.Lock()
+        self.local_data = {}  # owner => {rr line}
+        self.calls = {}  # command => [calls, lines]
+
+    def apply(self, command, lines):
+        with self.lock:
+            stats = self.calls.setdefault(command, [0, 0])
+            stats[0] += 1
+            stats[1] += len(lines)
+            if command == 'local_datas':
+                for line in lines:
+                    self.local_data.setdefault(_owner_rr(line)[0], set()).add(line)
+                return [f"added {len(lines)} datas"]
+            if command == 'local_datas_remove':
+                for line in lines:
+                    self.local_data.pop(line.rstrip('.'), None)
+                return [f"removed {len(lines)} datas"]
+            if command in ('local_zones', 'local_zones_remove'):
+                return [f"{'added' if command == 'local_zones' else 'removed'} {len(lines)} zones"]
+            if command == 'list_local_data':
+                reply = []
+                for rrs in self.local_data.values():
+                    for line in rrs:
+                        name, rrtype, rdata = _owner_rr(line)
+                        reply.append(f"{name}.\t3600\tIN\t{rrtype}\t{rdata}")
+                return reply
+            return ["ok"]
+
+    def stats(self):
+        """{command: (calls, lines)} received so far."""
+        with self.lock:
+            return {command: tuple(stats) for command, stats in self.calls.items()}
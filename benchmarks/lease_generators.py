@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import random
+import ipaddress
+from array import array
+from collections import deque
+
+DEFAULT_LEASE_TIME = 3600  # seconds
+LEASES_PER_FILE = 10000  # directory sources, leases per interface file
+IPV4_BASE = int(ipaddress.IPv4Address('10.0.0.0'))
+IPV6_BASE = int(ipaddress.IPv6Address('2001:db8::'))
+KEA_HEADER = "address,hwaddr,client_id,valid_lifetime,expire,subnet_id,fqdn_fwd,fqdn_rev,hostname,state,user_context,pool_id\n"
+FREE = -1
+
+
+class LeasePool:
+    """Deterministic synthetic lease population that can be churned in place.
+
+    Slot i is the lease of the i-th address of the pool, it holds the id of the host owning it
+    or FREE. Hosts and expiry times are kept in arrays so a million leases stay small next to
+    the watcher that is measured.
+    """
+
+    def __init__(self, count, family=4, lease_time=DEFAULT_LEASE_TIME, now=None, seed=0):
+        self.family = family
+        self.lease_time = lease_time
+        now = int(now or time.time())
+        self.hosts = array('q', range(count))
+        self.expires = array('q', [now + lease_time]) * count
+        self.next_host = count
+        self.active = count
+        self.free = deque()  # released slots, oldest first
+        self.random = random.Random(seed)
+
+    def __len__(self):
+        return self.active
+
+    def address(self, slot):
+        if self.family == 6:
+            return str(ipaddress.IPv6Address(IPV6_BASE + slot + 1))
+        return str(ipaddress.IPv4Address(IPV4_BASE + slot + 1))
+
+    @staticmethod
+    def hostname(host):
+        return f"host{host}"
+
+    @staticmethod
+    def mac(slot):
+        return f"02:00:{slot >> 24 & 0xff:02x}:{slot >> 16 & 0xff:02x}:{slot >> 8 & 0xff:02x}:{slot & 0xff:02x}"
+
+    def leases(self, slots=None):
+        """Yield (slot, host, expire) of the active leases, of the given slots only when passed."""
+        for slot in range(len(self.hosts)) if slots is None else slots:
+            host = self.hosts[slot]
+            if host != FREE:
+                yield slot, host, self.expires[slot]
+
+    def _pick_active(self, count, exclude):
+        picked = []
+        while len(picked) < count:
+            slot = self.random.randrange(len(self.hosts))
+            if self.hosts[slot] != FREE and slot not in exclude:
+                exclude.add(slot)
+                picked.append(slot)
+        return picked
+
+    def churn(self, rate, now=None):
+        """Change rate * active leases: a third is released, a third handed out to new hosts and the rest renewed.
+
+        :return: sorted list of the slots that changed
+        """
+        now = int(now or time.time())
+        count = min(round(rate * self.active), self.active)
+        released = added = count // 3
+        changed = set()
+        for slot in self._pick_active(count - released - added, changed):
+            self.expires[slot] = now + self.lease_time
+        for slot in self._pick_active(released, changed):
+            self.hosts[slot] = FREE
+            self.expires[slot] = now
+            self.free.append(slot)
+            self.active -= 1
+        for _ in range(added):
+            if self.free and self.free[0] not in changed:
+                slot = self.free.popleft()
+                self.hosts[slot] = self.next_host
+                self.expires[slot] = now + self.lease_time
+            else:
+                slot = len(self.hosts)
+                self.hosts.append(self.next_host)
+                self.expires.append(now + self.lease_time)
+            self.next_host += 1
+            self.active += 1
+            changed.add(slot)
+        return sorted(changed)
+
+
+def _replace(path, content):
+    """Write a file the way DHCP servers rewrite theirs: temp file renamed over the old one."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class LeaseWriter:
+    """Writes a LeasePool in the lease format of one backend.
+
+    write() creates the source, update() applies churned slots the way the DHCP server does
+    (appending to its lease log or rewriting the file).
+    """
+    backend = None
+    family = 4
+    filename = None
+
+    def __init__(self, root):
+        self.path = os.path.join(root, self.filename)
+
+    def write(self, pool):
+        raise NotImplementedError
+
+    def update(self, pool, slots):
+        raise NotImplementedError
+
+
+class DhcpdWriter(LeaseWriter):
+    backend = 'dhcpd'
+    filename = 'dhcpd.leases'
+
+    @staticmethod
+    def _date(timestamp):
+        return time.strftime('%w %Y/%m/%d %H:%M:%S', time.gmtime(timestamp))
+
+    def _blocks(self, pool, slots):
+        for slot in slots:
+            host = pool.hosts[slot]
+            expire = pool.expires[slot]
+            block = [f"lease {pool.address(slot)} {{\n",
+                     f"  starts {self._date(expire - pool.lease_time)};\n",
+                     f"  ends {self._date(expire)};\n"]
+            if host == FREE:
+                block.append("  binding state free;\n")
+            else:
+                block.append("  binding state active;\n  next binding state free;\n")
+            block.append(f"  hardware ethernet {pool.mac(slot)};\n")
+            if host != FREE:
+                block.append(f"  client-hostname \"{pool.hostname(host)}\";\n")
+            block.append("}\n")
+            yield ''.join(block)
+
+    def write(self, pool):
+        active = (slot for slot, _, _ in pool.leases())
+        _replace(self.path, "# The format of this file is documented in the dhcpd.leases(5) manual page.\n"
+                 + ''.join(self._blocks(pool, active)))
+
+    def update(self, pool, slots):
+        with open(self.path, 'a') as f:
+            f.writelines(self._blocks(pool, slots))
+
+
+class KeaWriter(LeaseWriter):
+    backend = 'kea'
+    filename = 'dhcp4.leases'
+
+    @staticmethod
+    def _row(pool, slot):
+        host = pool.hosts[slot]
+        if host == FREE:
+            # a released lease is logged with a zero lifetime
+            return f"{pool.address(slot)},{pool.mac(slot)},,0,{pool.expires[slot]},1,0,0,,0,,0\n"
+        return (f"{pool.address(slot)},{pool.mac(slot)},,{pool.lease_time},{pool.expires[slot]},1,0,0,"
+                f"{pool.hostname(host)},0,,0\n")
+
+    def write(self, pool):
+        _replace(self.path, KEA_HEADER + ''.join(self._row(pool, slot) for slot, _, _ in pool.leases()))
+
+    def update(self, pool, slots):
+        with open(self.path, 'a') as f:
+            f.writelines(self._row(pool, slot) for slot in slots)
+
+
+class DnsmasqWriter(LeaseWriter):
+    backend = 'dnsmasq'
+    filename = 'dnsmasq.leases'
+
+    def write(self, pool):
+        _replace(self.path, ''.join(f"{expire} {pool.mac(slot)} {pool.address(slot)} {pool.hostname(host)} 01:{pool.mac(slot)}\n"
+                                    for slot, host, expire in pool.leases()))
+
+    def update(self, pool, slots):
+        # dnsmasq rewrites the whole file on every change
+        self.write(pool)
+
+
+class DirectoryWriter(LeaseWriter):
+    """Lease directory with one file per interface, every interface holds leases_per_file slots."""
+    suffix = ''
+
+    def __init__(self, root, leases_per_file=LEASES_PER_FILE):
+        super().__init__(root)
+        self.leases_per_file = leases_per_file
+        os.makedirs(self.path, exist_ok=True)
+
+    def render(self, pool, slots):
+        raise NotImplementedError
+
+    def _write_file(self, pool, index):
+        first = index * self.leases_per_file
+        slots = range(first, min(first + self.leases_per_file, len(pool.hosts)))
+        _replace(os.path.join(self.path, f"eth{index}{self.suffix}"), self.render(pool, slots))
+
+    def write(self, pool):
+        for index in range((len(pool.hosts) + self.leases_per_file - 1) // self.leases_per_file):
+            self._write_file(pool, index)
+
+    def update(self, pool, slots):
+        for index in sorted({slot // self.leases_per_file for slot in slots}):
+            self._write_file(pool, index)
+
+
+class SystemdNetworkdWriter(DirectoryWriter):
+    backend = 'systemd-networkd'
+    filename = 'dhcp-server-lease'
+
+    def render(self, pool, slots):
+        return json.dumps({'Leases': [{
+            'Address': [int(part) for part in pool.address(slot).split('.')],
+            'Hostname': pool.hostname(host),
+            'ExpirationRealtimeUSec': expire * 1_000_000,
+        } for slot, host, expire in pool.leases(slots)]})
+
+
+class SlaacResolverWriter(DirectoryWriter):
+    backend = 'slaac-resolver'
+    family = 6
+    filename = 'slaac-resolver'
+    suffix = '.json'
+
+    def render(self, pool, slots):
+        return json.dumps([{'Address': pool.address(slot).split(':'), 'Hostname': pool.hostname(host)}
+                           for slot, host, _ in pool.leases(slots)])
+
+
+WRITERS = {writer.backend: writer for writer in (DhcpdWriter, KeaWriter, DnsmasqWriter, SystemdNetworkdWriter, SlaacResolverWriter)}
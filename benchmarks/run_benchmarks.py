@@ -0,0 +1,206 @@
+"""Synthetic-load benchmarks of the lease watchers.
+
+Every scenario generates a lease source of one format, starts a watcher daemon for it in a
+fresh worker process against a recording fake unbound control socket, and measures the
+startup reconciliation and a number of churn cycles (parse, diff, rr generation, control
+commands). Run from the repository root:
+
+    python3 -m benchmarks.run_benchmarks --formats kea dnsmasq --sizes 1000 100000 --churn 0.01
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import resource
+import tempfile
+import threading
+import multiprocessing
+from statistics import mean
+from benchmarks.fake_unbound import RecordingControlServer
+from benchmarks.lease_generators import LeasePool, WRITERS
+from batch_flusher import DEFAULT_CHUNK_SIZE
+
+SIZES = (1000, 10000, 100000, 1000000)
+CHURN_RATES = (0.01,)
+CYCLES = 5
+DOMAIN = 'bench'
+DEFAULT_TOLERANCE = 0.25  # relative slowdown reported as a regression
+NOISE_FLOOR = 0.005  # seconds, differences below are never a regression
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def peak_rss():
+    """Peak resident set size of this process in KiB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _worker(conn, kind, path, control_interface, target, batch_size):
+    """Watcher side of a scenario, runs the steps the parent asks for and reports their cost."""
+    os.environ['UNBOUND_CONTROL_INTERFACE'] = control_interface
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        from watcher_daemon import WatcherDaemon, create_backend
+        daemon = WatcherDaemon([create_backend(kind, path, DOMAIN)], target, batch_size=batch_size)
+    except Exception as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+        return
+    conn.send(('ready', peak_rss()))
+    while True:
+        step = conn.recv()
+        if step == 'stop':
+            break
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            if step == 'reconcile':
+                daemon.reconcile()
+            else:
+                daemon.cycle(daemon.backends)
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+            break
+        conn.send(('done', time.perf_counter() - wall, time.process_time() - cpu, peak_rss(), len(daemon.store)))
+    daemon.close()
+
+
+def _calls_between(before, after):
+    calls = sum(stats[0] for stats in after.values()) - sum(stats[0] for stats in before.values())
+    lines = sum(stats[1] for stats in after.values()) - sum(stats[1] for stats in before.values())
+    return calls, lines
+
+
+def _step(conn, server, step):
+    before = server.stats()
+    conn.send(step)
+    reply = conn.recv()
+    if reply[0] == 'error':
+        raise RuntimeError(reply[1])
+    _, wall, cpu, rss, records = reply
+    calls, lines = _calls_between(before, server.stats())
+    return {'wall': wall, 'cpu': cpu, 'peak_rss': rss, 'records': records, 'calls': calls, 'lines': lines}
+
+
+def run_scenario(kind, size, churn, cycles=CYCLES, batch_size=DEFAULT_CHUNK_SIZE):
+    """Benchmark one lease format at one size and churn rate, return the result dict."""
+    writer_class = WRITERS[kind]
+    result = {'format': kind, 'leases': size, 'churn': churn}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pool = LeasePool(size, writer_class.family)
+        writer = writer_class(tmpdir)
+        writer.write(pool)
+        server = RecordingControlServer(os.path.join(tmpdir, 'unbound.control.sock'))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        # a fresh interpreter, so neither the generator nor earlier scenarios count in its RSS
+        context = multiprocessing.get_context('spawn')
+        conn, child_conn = context.Pipe()
+        worker = context.Process(target=_worker, daemon=True,
+                                 args=(child_conn, kind, writer.path, server.server_address,
+                                       os.path.join(tmpdir, 'dhcpleases.conf'), batch_size))
+        worker.start()
+        try:
+            status, value = conn.recv()
+            if status == 'error':
+                result['error'] = value
+                return result
+            result['base_rss'] = value
+            startup = _step(conn, server, 'reconcile')
+            steps = []
+            for _ in range(cycles):
+                writer.update(pool, pool.churn(churn))
+                steps.append(_step(conn, server, 'cycle'))
+            conn.send('stop')
+        except (RuntimeError, EOFError) as e:
+            result['error'] = str(e) or 'worker died'
+            return result
+        finally:
+            worker.join(10)
+            if worker.is_alive():
+                worker.terminate()
+            server.shutdown()
+            server.server_close()
+    result.update({
+        'startup': startup['wall'],
+        'startup_cpu': startup['cpu'],
+        'startup_calls': startup['calls'],
+        'startup_lines': startup['lines'],
+        'records': startup['records'],
+        'cycle_mean': mean(step['wall'] for step in steps) if steps else 0,
+        'cycle_max': max((step['wall'] for step in steps), default=0),
+        'cycle_cpu': mean(step['cpu'] for step in steps) if steps else 0,
+        'cycle_calls': mean(step['calls'] for step in steps) if steps else 0,
+        'cycle_lines': mean(step['lines'] for step in steps) if steps else 0,
+        'peak_rss': max([startup['peak_rss']] + [step['peak_rss'] for step in steps]),
+    })
+    return result
+
+
+def format_results(results):
+    lines = [f"{'format':<18}{'leases':>9}{'churn':>7}{'startup s':>11}{'cycle ms':>10}{'max ms':>9}"
+             f"{'calls':>7}{'lines':>9}{'RSS MiB':>9}"]
+    for result in results:
+        prefix = f"{result['format']:<18}{result['leases']:>9}{result['churn']:>7.3g}"
+        if 'error' in result:
+            lines.append(f"{prefix}  skipped: {result['error']}")
+            continue
+        lines.append(f"{prefix}{result['startup']:>11.3f}{result['cycle_mean'] * 1000:>10.1f}"
+                     f"{result['cycle_max'] * 1000:>9.1f}{result['cycle_calls']:>7.1f}{result['cycle_lines']:>9.0f}"
+                     f"{result['peak_rss'] / 1024:>9.1f}")
+    return '\n'.join(lines)
+
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Compare startup and cycle times with a previous --json output, return the regressions found."""
+    previous = {(result['format'], result['leases'], result['churn']): result
+                for result in baseline if 'error' not in result}
+    regressions = []
+    for result in results:
+        old = previous.get((result['format'], result['leases'], result['churn']))
+        if old is None or 'error' in result:
+            continue
+        for metric in ('startup', 'cycle_mean'):
+            if result[metric] > old[metric] * (1 + tolerance) and result[metric] - old[metric] > NOISE_FLOOR:
+                regressions.append(f"{result['format']} {result['leases']} leases churn {result['churn']}: "
+                                   f"{metric} {old[metric]:.4f}s -> {result[metric]:.4f}s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Synthetic-load benchmarks of the lease watchers')
+    parser.add_argument('--formats', nargs='+', choices=sorted(WRITERS), default=sorted(WRITERS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(SIZES), help='number of leases')
+    parser.add_argument('--churn', nargs='+', type=float, default=list(CHURN_RATES),
+                        help='fraction of the leases changed per cycle')
+    parser.add_argument('--cycles', type=int, default=CYCLES, help='churn cycles measured per scenario')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_CHUNK_SIZE, help='maximum lines per unbound control command')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results of a previous --json run to compare with')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='relative slowdown reported as a regression')
+    parser.add_argument('--log-level', help='set the logging level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'])
+    inputargs = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, inputargs.log_level), format='%(asctime)s - %(levelname)s - %(message)s')
+    results = []
+    for kind in inputargs.formats:
+        for size in inputargs.sizes:
+            for churn in inputargs.churn:
+                logger.info(f"Running {kind} with {size} leases, churn {churn}")
+                results.append(run_scenario(kind, size, churn, inputargs.cycles, inputargs.batch_size))
+    print(format_results(results))
+    if inputargs.json:
+        with open(inputargs.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if inputargs.baseline:
+        with open(inputargs.baseline) as f:
+            regressions = find_regressions(results, json.load(f), inputargs.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,19 @@
+"""Kea memfile (CSV) lease files shared by the tests."""
+import time
+
+KEA_HEADER = "address,hwaddr,client_id,valid_lifetime,expire,subnet_id,fqdn_fwd,fqdn_rev,hostname,state,user_context,pool_id\n"
+
+
+def kea_row(address, hostname, valid_lifetime=3600, state=0, expire=None, hwaddr='aa:bb:cc:dd:ee:ff'):
+    """One lease row, ending valid_lifetime seconds from now unless expire is given."""
+    if expire is None:
+        expire = int(time.time()) + valid_lifetime
+    return f"{address},{hwaddr},,{valid_lifetime},{expire},1,0,0,{hostname},{state},,0\n"
+
+
+def write_kea_leases(path, rows=(), mode='w'):
+    """Write kea_row() lines to a lease file, a new file starts with the header."""
+    with open(path, mode) as f:
+        if mode == 'w':
+            f.write(KEA_HEADER)
+        f.writelines(rows)
@@ -0,0 +1,192 @@
+import unittest, os, tempfile, threading, http.server
+from ad_blocklist import normalize_domain, iter_source_domains, collapse_domains, render_blocklist, compile_blocklist, \
+    read_applied_blocklist, diff_blocklist, push_blocklist_diff, SourceCache
+from unbound_remote_control import ControlResult, UnboundControlError
+
+HOSTS_FILE = """# StevenBlack style hosts file
+127.0.0.1 localhost
+127.0.0.1 localhost.localdomain
+255.255.255.255 broadcasthost
+::1 localhost
+0.0.0.0 0.0.0.0
+0.0.0.0 ads.example.com
+0.0.0.0 Tracker.Example.NET.  # trailing dot and case
+0.0.0.0 sub.ads.example.com
+0.0.0.0 ads.example.com
+0.0.0.0 bad_-.
+192.168.1.1 router.lan
+"""
+
+
+class RecordingControl:
+    """Stands in for UnboundControl, records the streamed input per command."""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def run(self, commands, input=None):
+        if self.fail:
+            raise UnboundControlError("unable to connect to /run/unbound.control.sock")
+        lines = list(input)
+        self.calls.append((commands[0], lines))
+        return ControlResult(commands[0], [f"ok {len(lines)}"])
+
+    def local_datas(self, rrs):
+        return self.run(['local_datas'], input=rrs)
+
+    def local_zones(self, zones):
+        return self.run(['local_zones'], input=zones)
+
+    def local_zones_remove(self, zones):
+        return self.run(['local_zones_remove'], input=zones)
+
+
+class HostsHandler(http.server.BaseHTTPRequestHandler):
+    """Serves HOSTS_FILE with an ETag, answering 304 or 500 as configured on the server."""
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.server.fail:
+            self.send_error(500)
+        elif self.headers.get('If-None-Match') == self.server.etag:
+            self.send_response(304)
+            self.end_headers()
+        else:
+            body = self.server.body.encode()
+            self.send_response(200)
+            self.send_header('ETag', self.server.etag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestAdBlocklist(unittest.TestCase):
+
+    def test_normalize_domain(self):
+        self.assertEqual(normalize_domain("Ads.Example.COM."), "ads.example.com")
+        self.assertEqual(normalize_domain("bücher.example"), "xn--bcher-kva.example")
+        self.assertIsNone(normalize_domain("localhost"))
+        self.assertIsNone(normalize_domain("-bad.example.com"))
+        self.assertIsNone(normalize_domain("nodot"))
+
+    def test_iter_source_domains_hosts_format(self):
+        domains = list(iter_source_domains(HOSTS_FILE.splitlines()))
+        self.assertEqual(domains, ["ads.example.com", "tracker.example.net", "sub.ads.example.com", "ads.example.com"])
+
+    def test_iter_source_domains_domain_list(self):
+        domains = list(iter_source_domains([b"doubleclick.net\n", b"# comment\n", b"\n", b"ads.example.org\n"]))
+        self.assertEqual(domains, ["doubleclick.net", "ads.example.org"])
+
+    def test_collapse_domains(self):
+        domains = ["sub.ads.example.com", "ads.example.com", "ads.example.com", "ads-example.com",
+                   "x.y.ads.example.com", "example.org", "cdn.example.org", "notexample.org"]
+        self.assertEqual(collapse_domains(domains), ["ads-example.com", "ads.example.com", "example.org", "notexample.org"])
+
+    def test_compile_and_render(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.hosts', delete=False) as f:
+            f.write(HOSTS_FILE)
+        self.addCleanup(os.unlink, f.name)
+        domains = compile_blocklist([f.name])
+        self.assertEqual(domains, ["ads.example.com", "tracker.example.net"])
+        self.assertEqual(render_blocklist(domains[:1]),
+                         'server:\n'
+                         'local-zone: "ads.example.com" inform_redirect\n'
+                         'local-data: "ads.example.com A 0.0.0.0"\n')
+
+    def test_read_applied_blocklist(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.conf', delete=False) as f:
+            f.write(render_blocklist(["ads.example.com", "tracker.example.net"], 'always_nxdomain'))
+        self.addCleanup(os.unlink, f.name)
+        self.assertEqual(read_applied_blocklist(f.name),
+                         {"ads.example.com": "always_nxdomain", "tracker.example.net": "always_nxdomain"})
+        self.assertEqual(read_applied_blocklist(f.name + '.missing'), {})
+
+    def test_diff_blocklist(self):
+        applied = {"ads.example.com": "inform_redirect", "old.example.org": "inform_redirect"}
+        added, removed = diff_blocklist(applied, ["ads.example.com", "new.example.org"])
+        self.assertEqual((added, removed), (["new.example.org"], ["old.example.org"]))
+        # a changed zone type replaces every zone
+        added, removed = diff_blocklist(applied, ["ads.example.com"], 'always_nxdomain')
+        self.assertEqual((added, removed), (["ads.example.com"], ["ads.example.com", "old.example.org"]))
+
+    def test_push_blocklist_diff(self):
+        control = RecordingControl()
+        self.assertTrue(push_blocklist_diff(["new.example.org"], ["old.example.org"], control=control))
+        self.assertEqual(control.calls, [
+            ('local_zones_remove', ["old.example.org"]),
+            ('local_zones', ["new.example.org inform_redirect"]),
+            ('local_datas', ["new.example.org A 0.0.0.0"]),
+        ])
+
+    def test_push_blocklist_diff_unreachable(self):
+        self.assertFalse(push_blocklist_diff(["new.example.org"], [], control=RecordingControl(fail=True)))
+
+
+class TestSourceCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.server = http.server.HTTPServer(('127.0.0.1', 0), HostsHandler)
+        self.server.requests = []
+        self.server.fail = False
+        self.server.etag = '"v1"'
+        self.server.body = HOSTS_FILE
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hosts"
+        self.cache = SourceCache(os.path.join(self.tmpdir.name, 'cache'))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_conditional_request(self):
+        path, changed = self.cache.fetch(self.url)
+        self.assertTrue(changed)
+        self.assertEqual(compile_blocklist([path]), ["ads.example.com", "tracker.example.net"])
+        self.cache.commit()
+
+        path, changed = self.cache.fetch(self.url)
+        self.assertFalse(changed)
+        self.assertEqual(self.server.requests[-1]['If-None-Match'], '"v1"')
+
+        self.server.etag = '"v2"'
+        self.server.body = "0.0.0.0 other.example.com\n"
+        path, changed = self.cache.fetch(self.url)
+        self.assertTrue(changed)
+        self.assertEqual(compile_blocklist([path]), ["other.example.com"])
+
+    def test_uncommitted_fetch_is_repeated(self):
+        self.cache.fetch(self.url)
+        _, changed = self.cache.fetch(self.url)
+        self.assertTrue(changed)
+        self.assertNotIn('If-None-Match', self.server.requests[-1])
+
+    def test_failed_fetch_uses_cached_copy(self):
+        self.cache.fetch(self.url)
+        self.cache.commit()
+        self.server.fail = True
+        path, changed = self.cache.fetch(self.url)
+        self.assertFalse(changed)
+        self.assertEqual(compile_blocklist([path]), ["ads.example.com", "tracker.example.net"])
+
+    def test_failed_fetch_without_copy(self):
+        self.server.fail = True
+        with self.assertRaises(OSError):
+            self.cache.fetch(self.url)
+
+    def test_local_source_signature(self):
+        local = os.path.join(self.tmpdir.name, 'hosts')
+        with open(local, 'w') as f:
+            f.write(HOSTS_FILE)
+        self.assertEqual(self.cache.fetch(local), (local, True))
+        self.cache.commit()
+        self.assertEqual(self.cache.fetch(local), (local, False))
+
+
+if __name__ == "__main__":
+    unittest.main()
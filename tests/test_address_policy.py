@@ -0,0 +1,56 @@
+import unittest, time
+from address_policy import AddressPolicy, is_eui64
+from record_store import LeaseRecord, RecordStore
+
+
+class TestAddressPolicy(unittest.TestCase):
+
+    def test_is_eui64(self):
+        self.assertTrue(is_eui64(LeaseRecord('2001:db8::21b:21ff:fe3a:5c12', 'slaac-resolver', 'laptop', 'home')))
+        self.assertFalse(is_eui64(LeaseRecord('2001:db8::8c4a:19e2:7b01:3f5d', 'slaac-resolver', 'laptop', 'home')))
+
+    def test_first_address_is_published_right_away(self):
+        store = RecordStore(AddressPolicy(hold_time=60))
+        now = time.time()
+        store.set('kea', '192.168.1.100', 'laptop', 'home')
+        store.set('slaac-resolver', '2001:db8::1', 'laptop', 'home')
+        remove_rr, add_rr = store.changes(now)
+        self.assertIn('laptop.home IN AAAA 2001:db8::1', add_rr)
+        self.assertIsNone(store.next_release())
+
+    def test_new_addresses_are_held_and_batched(self):
+        store = RecordStore(AddressPolicy(hold_time=60))
+        now = time.time()
+        store.set('slaac-resolver', '2001:db8::1', 'laptop', 'home')
+        store.changes(now)
+        store.set('slaac-resolver', '2001:db8::2', 'laptop', 'home')
+        store.set('slaac-resolver', '2001:db8::3', 'laptop', 'home')
+        self.assertEqual(store.changes(now), ([], []))
+        self.assertAlmostEqual(store.next_release(), now + 60, delta=1)
+
+        # a temporary address gone before its hold time passed is never published
+        store.discard('2001:db8::3')
+        self.assertEqual(store.changes(now + 1), ([], []))
+
+        remove_rr, add_rr = store.changes(now + 61)
+        self.assertEqual(remove_rr, [])
+        self.assertEqual(sorted(rr for rr in add_rr if ' IN ' in rr), ['laptop.home IN AAAA 2001:db8::2'])
+        self.assertIsNone(store.next_release())
+
+    def test_cap_prefers_stable_addresses(self):
+        policy = AddressPolicy(max_addresses=2, hold_time=0)
+        now = time.time()
+        records = [
+            LeaseRecord('2001:db8::a', 'slaac-resolver', 'laptop', 'home', first_seen=now - 100),
+            LeaseRecord('2001:db8::b', 'slaac-resolver', 'laptop', 'home', first_seen=now - 10),
+            LeaseRecord('2001:db8::21b:21ff:fe3a:5c12', 'slaac-resolver', 'laptop', 'home', first_seen=now),
+            LeaseRecord('192.168.1.100', 'kea', 'laptop', 'home'),
+        ]
+        selected, release = policy.select(records, set(), now)
+        self.assertEqual([record.address for record in selected],
+                         ['192.168.1.100', '2001:db8::21b:21ff:fe3a:5c12', '2001:db8::a'])
+        self.assertIsNone(release)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest, os, argparse, tempfile, time
+from unittest.mock import patch
+from batch_flusher import BatchFlusher, MAX_DELAY_FACTOR, chunked
+from watcher_daemon import WatcherDaemon, non_negative_float, positive_int
+from unbound_kea_watcher import KeaBackend
+from kea_leases import kea_row, write_kea_leases
+
+class TestBatchFlusher(unittest.TestCase):
+
+    def test_chunked(self):
+        self.assertEqual(chunked([], 2), [])
+        self.assertEqual(chunked(['a', 'b'], 0), [['a', 'b']])
+        self.assertEqual(chunked(['a', 'b', 'c'], 2), [['a', 'b'], ['c']])
+        with self.assertRaises(ValueError):
+            chunked(['a', 'b'], -1)
+
+    def test_batch_arguments_are_validated(self):
+        self.assertEqual(non_negative_float('0'), 0)
+        for value in ('-0.25', 'nan', 'soon'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                non_negative_float(value)
+        with self.assertRaises(argparse.ArgumentTypeError):
+            positive_int('-5')
+
+    def test_idle(self):
+        flusher = BatchFlusher(debounce=1)
+        self.assertFalse(flusher.has_pending)
+        self.assertFalse(flusher.due())
+        self.assertIsNone(flusher.timeout())
+        self.assertEqual(flusher.timeout(5), 5)
+
+    def test_debounce(self):
+        flusher = BatchFlusher(debounce=0.05, max_delay=10)
+        flusher.touch()
+        self.assertFalse(flusher.due())
+        self.assertLessEqual(flusher.timeout(5), 0.05)
+        time.sleep(0.06)
+        self.assertTrue(flusher.due())
+        # the batch was taken
+        self.assertFalse(flusher.has_pending)
+        self.assertFalse(flusher.due())
+
+    def test_max_delay_bounds_churn(self):
+        flusher = BatchFlusher(debounce=0.05, max_delay=0.1)
+        deadline = time.monotonic() + 1
+        while not flusher.due():
+            self.assertLess(time.monotonic(), deadline)
+            flusher.touch()
+            time.sleep(0.01)
+
+
+class TestBatchedDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.kea_file = os.path.join(self.tmpdir.name, 'dhcp4.leases')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @patch("watcher_daemon.unbound_control")
+    def test_updates_are_chunked(self, mock_unbound_control):
+        write_kea_leases(self.kea_file, [kea_row(f"192.168.1.{host}", f"host{host}") for host in range(1, 6)])
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')], batch_size=4)
+        self.addCleanup(daemon.close)
+        daemon.cycle(daemon.backends)
+        batches = [c.kwargs['input'] for c in mock_unbound_control.call_args_list]
+        self.assertTrue(all(len(batch) <= 4 for batch in batches))
+        self.assertEqual(sum(len(batch) for batch in batches), 10)
+
+    def test_max_delay(self):
+        write_kea_leases(self.kea_file)
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')], batch_delay=0.05)
+        self.addCleanup(daemon.close)
+        self.assertAlmostEqual(daemon.flusher.max_delay, 0.05 * MAX_DELAY_FACTOR)
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')], batch_delay=0.05, batch_max_delay=1)
+        self.addCleanup(daemon.close)
+        self.assertEqual(daemon.flusher.max_delay, 1)
+
+    @patch("watcher_daemon.unbound_control")
+    def test_transient_lease_nets_to_nothing(self, mock_unbound_control):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.1", "host1")])
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')], batch_delay=0.05)
+        self.addCleanup(daemon.close)
+        daemon.cycle(daemon.backends)
+        # held back by the debounce window
+        mock_unbound_control.assert_not_called()
+        self.assertGreater(daemon._timeout(), 0)
+        time.sleep(0.06)
+        daemon.cycle([])
+        self.assertEqual(mock_unbound_control.call_count, 1)
+        mock_unbound_control.reset_mock()
+
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.6", "phone")], mode='a')
+        daemon.cycle(daemon.backends)
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.6", "phone", valid_lifetime=0)], mode='a')
+        daemon.cycle(daemon.backends)
+        time.sleep(0.06)
+        daemon.cycle([])
+        mock_unbound_control.assert_not_called()
+        self.assertIsNone(daemon.store.get('192.168.1.6'))
+
+
+if __name__ == '__main__':
+    unittest.main()
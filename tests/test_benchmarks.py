@@ -0,0 +1,114 @@
+import unittest, os, time, tempfile, threading
+from benchmarks.lease_generators import LeasePool, WRITERS, FREE
+from benchmarks.fake_unbound import RecordingControlServer
+from benchmarks.run_benchmarks import run_scenario, find_regressions
+from unbound_remote_control import UnboundControl
+from watcher_daemon import create_backend
+
+
+class TestLeaseGenerators(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_churn(self):
+        pool = LeasePool(300)
+        slots = pool.churn(0.1)
+        # renewed, released and new leases in equal parts
+        self.assertEqual(len(slots), 30)
+        self.assertEqual(len(pool), 300)
+        self.assertEqual(sum(1 for host in pool.hosts if host == FREE), 10)
+        self.assertEqual(len(pool.hosts), 310)
+        # released slots are handed out again in later rounds
+        pool.churn(0.1)
+        self.assertEqual(len(pool.hosts), 310)
+
+    def _assert_backend_follows_pool(self, kind):
+        writer = WRITERS[kind](self.tmpdir.name)
+        pool = LeasePool(50, writer.family)
+        writer.write(pool)
+        backend = create_backend(kind, writer.path, 'bench')
+        self.addCleanup(backend.close)
+        leases = {}
+
+        def apply():
+            changed, removed = backend.update()
+            for address in removed:
+                leases.pop(address, None)
+            for lease in changed:
+                # dhcpd logs a released lease with its end time
+                if lease.get('expire') is not None and lease['expire'] <= time.time():
+                    leases.pop(lease['address'], None)
+                else:
+                    leases[lease['address']] = lease['hostname']
+
+        apply()
+        expected = {pool.address(slot): pool.hostname(host) for slot, host, _ in pool.leases()}
+        self.assertEqual(leases, expected)
+        writer.update(pool, pool.churn(0.3))
+        apply()
+        expected = {pool.address(slot): pool.hostname(host) for slot, host, _ in pool.leases()}
+        self.assertEqual(leases, expected)
+
+    def test_kea(self):
+        self._assert_backend_follows_pool('kea')
+
+    def test_dnsmasq(self):
+        self._assert_backend_follows_pool('dnsmasq')
+
+    def test_systemd_networkd(self):
+        self._assert_backend_follows_pool('systemd-networkd')
+
+    def test_slaac_resolver(self):
+        self._assert_backend_follows_pool('slaac-resolver')
+
+    def test_dhcpd(self):
+        self._assert_backend_follows_pool('dhcpd')
+
+
+class TestRecordingControlServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.server = RecordingControlServer(os.path.join(self.tmpdir.name, 'unbound.control.sock'))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.control = UnboundControl(self.server.server_address, timeout=5)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_records_and_lists_local_data(self):
+        self.control.local_datas(['laptop.home IN A 192.168.1.100', '100.1.168.192.in-addr.arpa PTR laptop.home'])
+        self.control.local_datas_remove(['100.1.168.192.in-addr.arpa'])
+        lines = list(self.control.iter_output(['list_local_data']))
+        self.assertEqual(lines, ['laptop.home.\t3600\tIN\tA\t192.168.1.100'])
+        self.assertEqual(self.server.stats(), {'local_datas': (1, 2), 'local_datas_remove': (1, 1), 'list_local_data': (1, 0)})
+
+
+class TestRunBenchmarks(unittest.TestCase):
+
+    def test_run_scenario(self):
+        result = run_scenario('kea', 100, 0.1, cycles=2)
+        self.assertNotIn('error', result)
+        self.assertEqual(result['records'], 100)
+        # list_local_data and one local_datas batch
+        self.assertEqual(result['startup_calls'], 2)
+        self.assertEqual(result['startup_lines'], 200)
+        self.assertGreater(result['cycle_lines'], 0)
+        self.assertGreater(result['peak_rss'], 0)
+
+    def test_find_regressions(self):
+        baseline = [{'format': 'kea', 'leases': 1000, 'churn': 0.01, 'startup': 1.0, 'cycle_mean': 0.1}]
+        results = [{'format': 'kea', 'leases': 1000, 'churn': 0.01, 'startup': 1.1, 'cycle_mean': 0.2}]
+        regressions = find_regressions(results, baseline, tolerance=0.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn('cycle_mean', regressions[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest, os, json, tempfile
+from unittest.mock import patch
+from directory_scanner import DirectoryScanner
+from unbound_slaac_resolver_watcher import extract_leases
+
+
+class TestDirectoryScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.scanner = DirectoryScanner(self.tmpdir.name, lambda f: extract_leases(json.load(f)), suffix='.json')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, name, neighbours):
+        with open(os.path.join(self.tmpdir.name, name), 'w') as f:
+            json.dump([{"Address": address.split(':'), "Hostname": hostname} for address, hostname in neighbours], f)
+
+    def test_only_changed_files_are_parsed(self):
+        self._write('eth0.json', [('2001:db8::1', 'laptop')])
+        self._write('eth1.json', [('2001:db8:1::1', 'phone')])
+        changed, removed = self.scanner.update()
+        self.assertEqual(sorted(lease['address'] for lease in changed), ['2001:db8:1::1', '2001:db8::1'])
+        self.assertEqual(removed, set())
+
+        with patch("builtins.open") as mock_open_file:
+            self.assertEqual(self.scanner.update(), ([], set()))
+            mock_open_file.assert_not_called()
+
+        self._write('eth1.json', [('2001:db8:1::1', 'phone'), ('2001:db8:1::2', 'tablet')])
+        changed, removed = self.scanner.update()
+        self.assertEqual([lease['hostname'] for lease in changed], ['tablet'])
+
+    def test_vanished_file_retracts_its_leases(self):
+        self._write('eth0.json', [('2001:db8::1', 'laptop')])
+        self._write('eth1.json', [('2001:db8:1::1', 'phone'), ('2001:db8::1', 'laptop')])
+        self.scanner.update()
+        os.unlink(os.path.join(self.tmpdir.name, 'eth1.json'))
+        # the address is still contributed by eth0.json
+        self.assertEqual(self.scanner.update(), ([], {'2001:db8:1::1'}))
+        self.assertEqual(sorted(self.scanner.leases), ['2001:db8::1'])
+
+    def test_partial_file_keeps_previous_leases(self):
+        self._write('eth0.json', [('2001:db8::1', 'laptop')])
+        self.scanner.update()
+        with open(os.path.join(self.tmpdir.name, 'eth0.json'), 'w') as f:
+            f.write('[{"Address": ')
+        with self.assertLogs('directory_scanner', 'ERROR'):
+            self.assertEqual(self.scanner.update(), ([], set()))
+        self._write('eth0.json', [('2001:db8::2', 'laptop')])
+        changed, removed = self.scanner.update()
+        self.assertEqual((changed[0]['address'], removed), ('2001:db8::2', {'2001:db8::1'}))
+
+    def test_single_file(self):
+        self._write('eth0.json', [('2001:db8::1', 'laptop')])
+        scanner = DirectoryScanner(os.path.join(self.tmpdir.name, 'eth0.json'), lambda f: extract_leases(json.load(f)))
+        self.assertEqual(len(scanner.update()[0]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest, os, tempfile
+from unittest.mock import patch
+from domain_map import DomainMap, parse_domain_ranges
+from watcher_daemon import WatcherDaemon
+from unbound_kea_watcher import KeaBackend
+from kea_leases import kea_row, write_kea_leases
+
+RANGES = """
+[lan]
+start = 192.168.1.1
+end = 192.168.1.254
+domain = home
+
+[iot]
+start = 192.168.1.100
+end = 192.168.1.149
+domain = iot.home
+
+[guest]
+prefix = 192.168.20.0/24
+domain = guest.home
+
+[guest-v6]
+prefix = 2001:db8:20::/64
+domain = guest.home
+
+[broken]
+start = 192.168.30.10
+end = 2001:db8:30::1
+domain = broken.home
+"""
+
+
+class TestDomainMap(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.config = os.path.join(self.tmpdir.name, 'domains.conf')
+        with open(self.config, 'w') as f:
+            f.write(RANGES)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_parse_skips_invalid_ranges(self):
+        with self.assertLogs('domain_map', 'WARNING'):
+            ranges = parse_domain_ranges(self.config)
+        self.assertEqual([domain for _, _, domain in ranges], ['home', 'iot.home', 'guest.home', 'guest.home'])
+
+    def test_lookup(self):
+        with self.assertLogs('domain_map', 'WARNING'):
+            domains = DomainMap(self.config)
+        # the iot range splits the lan range, the section further down wins
+        self.assertEqual(domains.lookup('192.168.1.99', 'lan'), 'home')
+        self.assertEqual(domains.lookup('192.168.1.100', 'lan'), 'iot.home')
+        self.assertEqual(domains.lookup('192.168.1.149', 'lan'), 'iot.home')
+        self.assertEqual(domains.lookup('192.168.1.150', 'lan'), 'home')
+        self.assertEqual(domains.lookup('192.168.20.7', 'lan'), 'guest.home')
+        self.assertEqual(domains.lookup('2001:db8:20::7', 'lan'), 'guest.home')
+        self.assertEqual(domains.lookup('2001:db8:21::7', 'lan'), 'lan')
+        self.assertEqual(domains.lookup('10.0.0.1', 'lan'), 'lan')
+        self.assertEqual(len(domains), 5)
+        self.assertEqual(domains.domains(), {'home', 'iot.home', 'guest.home'})
+
+    def test_no_config(self):
+        domains = DomainMap()
+        self.assertEqual(domains.lookup('192.168.1.100', 'lan'), 'lan')
+        self.assertFalse(domains.refresh())
+
+    def test_refresh_on_change(self):
+        with self.assertLogs('domain_map', 'WARNING'):
+            domains = DomainMap(self.config)
+        self.assertFalse(domains.refresh())
+        with open(self.config, 'w') as f:
+            f.write("[lan]\nprefix = 192.168.1.0/24\ndomain = lan.home\n")
+        self.assertTrue(domains.refresh())
+        self.assertEqual(domains.lookup('192.168.1.100', 'lan'), 'lan.home')
+        os.unlink(self.config)
+        self.assertTrue(domains.refresh())
+        self.assertEqual(domains.lookup('192.168.1.100', 'lan'), 'lan')
+
+
+class TestWatcherDaemonDomains(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.kea_file = os.path.join(self.tmpdir.name, 'dhcp4.leases')
+        self.config = os.path.join(self.tmpdir.name, 'domains.conf')
+        with open(self.config, 'w') as f:
+            f.write("[iot]\nprefix = 192.168.1.0/24\ndomain = iot.home\n")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @patch("watcher_daemon.unbound_control")
+    def test_ranges_are_hot_reloaded(self, mock_unbound_control):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "sensor"), kea_row("192.168.2.100", "laptop")])
+        backend = KeaBackend(self.kea_file, 'home', self.config)
+        self.assertEqual(backend.domains(), {'home', 'iot.home'})
+        daemon = WatcherDaemon([backend])
+        self.addCleanup(daemon.close)
+        daemon.cycle(daemon.backends)
+        self.assertEqual(daemon.store.get('192.168.1.100').fqdn, 'sensor.iot.home')
+        self.assertEqual(daemon.store.get('192.168.2.100').fqdn, 'laptop.home')
+        mock_unbound_control.reset_mock()
+
+        with open(self.config, 'w') as f:
+            f.write("[iot]\nprefix = 192.168.1.0/24\ndomain = sensors.home\n")
+        daemon.cycle([])
+        self.assertEqual(daemon.store.get('192.168.1.100').fqdn, 'sensor.sensors.home')
+        add_rr = mock_unbound_control.call_args_list[-1].kwargs['input']
+        self.assertIn('sensor.sensors.home IN A 192.168.1.100', add_rr)
+        self.assertNotIn('laptop.home IN A 192.168.2.100', add_rr)
+
+
+if __name__ == '__main__':
+    unittest.main()
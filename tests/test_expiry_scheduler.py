@@ -0,0 +1,42 @@
+import unittest
+from expiry_scheduler import ExpiryScheduler
+
+
+class TestExpiryScheduler(unittest.TestCase):
+
+    def test_pop_in_expire_order(self):
+        scheduler = ExpiryScheduler()
+        scheduler.schedule('b', 20)
+        scheduler.schedule('a', 10)
+        scheduler.schedule('c', 30)
+        self.assertEqual(scheduler.next_expiry(), 10)
+        self.assertEqual(scheduler.pop_expired(25), ['a', 'b'])
+        self.assertEqual(scheduler.pop_expired(25), [])
+        self.assertEqual(len(scheduler), 1)
+
+    def test_renewal_invalidates_old_entry(self):
+        scheduler = ExpiryScheduler()
+        scheduler.schedule('a', 10)
+        scheduler.schedule('a', 100)
+        self.assertEqual(scheduler.next_expiry(), 100)
+        self.assertEqual(scheduler.pop_expired(50), [])
+        self.assertEqual(scheduler.pop_expired(100), ['a'])
+
+    def test_cancel(self):
+        scheduler = ExpiryScheduler()
+        scheduler.schedule('a', 10)
+        scheduler.schedule('b', None)
+        scheduler.cancel('a')
+        self.assertIsNone(scheduler.next_expiry())
+        self.assertEqual(len(scheduler), 0)
+
+    def test_heap_is_compacted(self):
+        scheduler = ExpiryScheduler()
+        for expire in range(5000):
+            scheduler.schedule('a', expire)
+        self.assertLess(len(scheduler._heap), 2000)
+        self.assertEqual(scheduler.pop_expired(10000), ['a'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import unittest, os, tempfile, time
+from incremental_leases import AppendOnlyReader, KeaLeaseFile, DnsmasqLeaseFile, DhcpdLeaseFile
+from kea_leases import kea_row, write_kea_leases
+
+def dhcpd_block(address, hostname=None, state='active', ends="4 2026/10/22 11:00:00"):
+    block = f"lease {address} {{\n  starts 4 2026/10/22 10:00:00;\n  ends {ends};\n  cltt 4 2026/10/22 10:00:00;\n" \
+            f"  binding state {state};\n  next binding state free;\n  hardware ethernet aa:bb:cc:dd:ee:ff;\n"
+    if hostname is not None:
+        block += f'  client-hostname "{hostname}";\n'
+    return block + "}\n"
+
+
+class TestIncrementalLeases(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.kea_file = os.path.join(self.tmpdir.name, 'dhcp4.leases')
+        self.dnsmasq_file = os.path.join(self.tmpdir.name, 'dnsmasq.leases')
+        self.dhcpd_file = os.path.join(self.tmpdir.name, 'dhcpd.leases')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, path, data, mode='a'):
+        with open(path, mode) as f:
+            f.write(data)
+
+    def test_append_only_reader_keeps_partial_line(self):
+        self._write(self.kea_file, "line1\nline2\npart")
+        reader = AppendOnlyReader(self.kea_file)
+        self.assertEqual(reader.check(), AppendOnlyReader.RESYNC)
+        self.assertEqual(list(reader.iter_lines()), ["line1", "line2"])
+        self.assertEqual(reader.check(), AppendOnlyReader.APPENDED)
+        self._write(self.kea_file, "ial\n")
+        self.assertEqual(list(reader.iter_lines()), ["partial"])
+        self.assertEqual(reader.check(), AppendOnlyReader.UNCHANGED)
+
+    def test_kea_only_consumes_appended_rows(self):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "device1"), kea_row("192.168.1.101", "device2")])
+        kea = KeaLeaseFile(self.kea_file)
+        changed, removed = kea.update()
+        self.assertEqual(len(changed), 2)
+        self.assertEqual(kea.update(), ([], set()))
+
+        # renewal with a new hostname, last record wins
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "laptop")], mode='a')
+        changed, removed = kea.update()
+        self.assertEqual([lease['hostname'] for lease in changed], ["laptop"])
+        self.assertEqual(kea.leases["192.168.1.100"]["hostname"], "laptop")
+
+    def test_kea_state_and_lifetime_retract_lease(self):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "device1"), kea_row("192.168.1.101", "device2")])
+        kea = KeaLeaseFile(self.kea_file)
+        kea.update()
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "device1", state=2),
+                                         kea_row("192.168.1.101", "device2", valid_lifetime=0)], mode='a')
+        changed, removed = kea.update()
+        self.assertEqual(changed, [])
+        self.assertEqual(removed, {"192.168.1.100", "192.168.1.101"})
+        self.assertEqual(kea.leases, {})
+
+    def test_kea_lfc_rotation_resyncs(self):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "device1"), kea_row("192.168.1.101", "device2")])
+        kea = KeaLeaseFile(self.kea_file)
+        kea.update()
+        # LFC: move the lease file to .2 and start a fresh one
+        os.rename(self.kea_file, self.kea_file + '.2')
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.102", "device3")])
+        changed, removed = kea.update()
+        self.assertEqual([lease['address'] for lease in changed], ["192.168.1.102"])
+        self.assertEqual(removed, set())
+        self.assertEqual(len(kea.leases), 3)
+        # LFC done: compacted file without device2
+        write_kea_leases(self.kea_file + '.completed', [kea_row("192.168.1.100", "device1")])
+        os.remove(self.kea_file + '.2')
+        changed, removed = kea.update()
+        self.assertEqual(removed, {"192.168.1.101"})
+
+    def test_kea_truncation_resyncs(self):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "device1"), kea_row("192.168.1.101", "device2")])
+        kea = KeaLeaseFile(self.kea_file)
+        kea.update()
+        write_kea_leases(self.kea_file)
+        changed, removed = kea.update()
+        self.assertEqual(removed, {"192.168.1.100", "192.168.1.101"})
+
+    def test_dnsmasq_reports_changes_only(self):
+        expires = int(time.time()) + 3600
+        self._write(self.dnsmasq_file, f"{expires} aa:bb:cc:dd:ee:01 192.168.1.100 device1 01:aa\n"
+                                       f"{expires} aa:bb:cc:dd:ee:02 192.168.1.101 * 01:bb\n")
+        dnsmasq = DnsmasqLeaseFile(self.dnsmasq_file)
+        changed, removed = dnsmasq.update()
+        self.assertEqual(len(changed), 2)
+        self.assertEqual(dnsmasq.leases["192.168.1.101"]["hostname"], "")
+        self.assertEqual(dnsmasq.update(), ([], set()))
+
+        self._write(self.dnsmasq_file, f"{expires} aa:bb:cc:dd:ee:01 192.168.1.100 device1 01:aa\n"
+                                       f"{expires} aa:bb:cc:dd:ee:03 192.168.1.102 device3 01:cc\n", mode='w')
+        changed, removed = dnsmasq.update()
+        self.assertEqual([lease['address'] for lease in changed], ["192.168.1.102"])
+        self.assertEqual(removed, {"192.168.1.101"})
+
+    def test_dhcpd_parses_lease_blocks(self):
+        self._write(self.dhcpd_file, "# The format of this file is documented in the dhcpd.leases(5) manual page.\n"
+                                     "authoring-byte-order little-endian;\n"
+                                     'server-duid "\\000\\001\\000\\001";\n'
+                                     + dhcpd_block("192.168.1.100", "laptop")
+                                     + dhcpd_block("192.168.1.101", "my\\040phone", ends="never")
+                                     + "host static1 {\n  dynamic;\n  hardware ethernet 00:11:22:33:44:55;\n  fixed-address 192.168.1.5;\n}\n"
+                                     + dhcpd_block("192.168.1.102", "epoch", ends="epoch 1792666800; # Thu Oct 22 11:00:00 2026"))
+        dhcpd = DhcpdLeaseFile(self.dhcpd_file)
+        changed, removed = dhcpd.update()
+        self.assertEqual(removed, set())
+        self.assertEqual(sorted(lease.address for lease in changed), ["192.168.1.100", "192.168.1.101", "192.168.1.102"])
+        laptop = dhcpd.leases["192.168.1.100"]
+        self.assertEqual(laptop.ends, 1792666800)
+        self.assertEqual(laptop.binding_state, "active")
+        self.assertEqual(laptop.hwaddr, "aa:bb:cc:dd:ee:ff")
+        self.assertEqual(dhcpd.leases["192.168.1.101"].hostname, "my phone")
+        self.assertIsNone(dhcpd.leases["192.168.1.101"].ends)
+        self.assertEqual(dhcpd.leases["192.168.1.102"].ends, 1792666800)
+        self.assertEqual(dhcpd.update(), ([], set()))
+
+    def test_dhcpd_only_consumes_complete_appended_blocks(self):
+        self._write(self.dhcpd_file, dhcpd_block("192.168.1.100", "laptop"))
+        dhcpd = DhcpdLeaseFile(self.dhcpd_file)
+        dhcpd.update()
+        offset = dhcpd._reader.offset
+
+        # a block being written is left for the next update
+        block = dhcpd_block("192.168.1.101", "phone")
+        self._write(self.dhcpd_file, block[:60])
+        self.assertEqual(dhcpd.update(), ([], set()))
+        self.assertEqual(dhcpd._reader.offset, offset)
+        self._write(self.dhcpd_file, block[60:] + dhcpd_block("192.168.1.100", "laptop", state="free"))
+        changed, removed = dhcpd.update()
+        self.assertEqual([lease.hostname for lease in changed], ["phone"])
+        self.assertEqual(removed, {"192.168.1.100"})
+        self.assertEqual(set(dhcpd.leases), {"192.168.1.101"})
+
+    def test_dhcpd_rewrite_resyncs(self):
+        self._write(self.dhcpd_file, dhcpd_block("192.168.1.100", "laptop") + dhcpd_block("192.168.1.101", "phone"))
+        dhcpd = DhcpdLeaseFile(self.dhcpd_file)
+        dhcpd.update()
+
+        # dhcpd writes a new file and moves the old one to dhcpd.leases~
+        new_file = self.dhcpd_file + ".new"
+        self._write(new_file, dhcpd_block("192.168.1.101", "phone"), mode='w')
+        os.link(self.dhcpd_file, self.dhcpd_file + "~")
+        os.rename(new_file, self.dhcpd_file)
+        self.assertEqual(dhcpd.update(), ([], {"192.168.1.100"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest, os, json, tempfile, threading, socketserver, time
+from kea_control import KeaControl, KeaControlError, KeaControlBackend, Kea6ControlBackend, lease_from_kea
+from lease_events import kea_events
+
+
+class FakeKeaHandler(socketserver.BaseRequestHandler):
+    """Reads one JSON command like Kea does and answers lease4-get-page from the server's leases."""
+
+    def handle(self):
+        buffer = b''
+        decoder = json.JSONDecoder()
+        while True:
+            buffer += self.request.recv(4096)
+            try:
+                request, _ = decoder.raw_decode(buffer.decode())
+                break
+            except ValueError:
+                continue
+        self.server.requests.append(request)
+        if request['command'] != 'lease4-get-page':
+            response = {'result': 2, 'text': f"'{request['command']}' command not supported."}
+        else:
+            arguments = request['arguments']
+            leases = self.server.leases
+            if arguments['from'] != 'start':
+                leases = [lease for lease in leases if lease['ip-address'] > arguments['from']]
+            page = leases[:arguments['limit']]
+            response = {'result': 0 if page else 3, 'text': f"{len(page)} IPv4 lease(s) found.",
+                        'arguments': {'leases': page, 'count': len(page)}}
+        self.request.sendall(json.dumps(response).encode())
+
+
+class FakeKeaServer(socketserver.ThreadingUnixStreamServer):
+    def __init__(self, path, leases):
+        super().__init__(path, FakeKeaHandler)
+        self.requests = []
+        self.leases = leases
+
+
+def kea_lease(address, hostname, state=0):
+    return {'ip-address': address, 'hostname': hostname, 'cltt': int(time.time()), 'valid-lft': 3600,
+            'hw-address': 'aa:bb:cc:dd:ee:ff', 'subnet-id': 1, 'state': state}
+
+
+class TestKeaControl(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmpdir.name, 'kea4-ctrl-socket')
+        leases = [kea_lease(f'192.168.1.{i}', f'host{i}') for i in range(100, 125)]
+        leases.append(kea_lease('192.168.1.200', 'declined', state=1))
+        self.server = FakeKeaServer(self.socket_path, leases)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_paged_fetch(self):
+        control = KeaControl(self.socket_path)
+        leases = list(control.iter_leases(page_size=10))
+        self.assertEqual(len(leases), 26)
+        self.assertEqual([request['arguments']['from'] for request in self.server.requests],
+                         ['start', '192.168.1.109', '192.168.1.119'])
+
+    def test_error_result(self):
+        with self.assertRaises(KeaControlError):
+            KeaControl(self.socket_path).command('lease6-get-page', {'from': 'start', 'limit': 10})
+        with self.assertRaises(KeaControlError):
+            KeaControl(self.socket_path + '.missing').command('lease4-get-page')
+
+    def test_backend_diffs_fetches(self):
+        backend = KeaControlBackend(self.socket_path, 'home')
+        self.addCleanup(backend.close)
+        changed, removed = backend.update()
+        self.assertEqual(len(changed), 25)
+        self.assertNotIn('192.168.1.200', [lease['address'] for lease in changed])
+        del self.server.leases[0]
+        self.assertEqual(backend.update(), ([], {'192.168.1.100'}))
+
+    def test_lease_from_kea(self):
+        self.assertIsNone(lease_from_kea({'ip-address': '2001:db8::', 'type': 'IA_PD', 'state': 0}))
+        lease = lease_from_kea({'ip-address': '192.168.1.100', 'hostname': 'laptop', 'cltt': 1000, 'valid-lft': 3600})
+        self.assertEqual(lease, {'address': '192.168.1.100', 'hostname': 'laptop', 'expire': 4600})
+
+    def test_run_script_events(self):
+        environ = {
+            'LEASES4_SIZE': '1', 'LEASES4_AT0_ADDRESS': '192.168.1.100', 'LEASES4_AT0_HOSTNAME': 'laptop',
+            'LEASES4_AT0_CLTT': '1000', 'LEASES4_AT0_VALID_LIFETIME': '3600',
+            'DELETED_LEASES4_SIZE': '1', 'DELETED_LEASES4_AT0_ADDRESS': '192.168.1.101',
+        }
+        events = [json.loads(data) for data in kea_events(['leases4_committed'], environ)]
+        self.assertEqual(events, [
+            {'source': 'kea', 'action': 'add', 'address': '192.168.1.100', 'hostname': 'laptop', 'expire': 4600},
+            {'source': 'kea', 'action': 'del', 'address': '192.168.1.101', 'hostname': None, 'expire': None},
+        ])
+        events = [json.loads(data) for data in kea_events(['lease4_release'], {'LEASE4_ADDRESS': '192.168.1.100'})]
+        self.assertEqual(events[0]['action'], 'del')
+        events = [json.loads(data) for data in kea_events(['lease6_release'], {'LEASE6_ADDRESS': '2001:db8::1'})]
+        self.assertEqual(events[0]['source'], Kea6ControlBackend.name)
+        self.assertNotEqual(Kea6ControlBackend.name, KeaControlBackend.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest, os, tempfile, time
+from unittest.mock import patch
+from lease_events import LeaseEventListener, main, dnsmasq_expire, encode_event, send_event
+from unbound_dnsmasq_watcher import DnsmasqBackend
+from watcher_daemon import WatcherDaemon
+
+
+class TestLeaseEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmpdir.name, 'dhcp_watcher.sock')
+        self.environ = {'DHCP_WATCHER_SOCKET': self.socket_path, 'DNSMASQ_LEASE_EXPIRES': '1900000000'}
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_forwarder_to_listener(self):
+        listener = LeaseEventListener(self.socket_path)
+        self.addCleanup(listener.close)
+        self.assertEqual(main(['add', 'aa:bb:cc:dd:ee:ff', '192.168.1.100', 'laptop'], self.environ), 0)
+        self.assertEqual(main(['del', 'aa:bb:cc:dd:ee:ff', '192.168.1.101'], self.environ), 0)
+        self.assertEqual(main(['init'], self.environ), 0)
+        send_event(b'not json', self.socket_path)
+        self.assertEqual(listener.receive(), [
+            {'source': 'dnsmasq', 'action': 'add', 'address': '192.168.1.100', 'hostname': 'laptop', 'expire': 1900000000},
+            {'source': 'dnsmasq', 'action': 'del', 'address': '192.168.1.101', 'hostname': None, 'expire': 1900000000},
+        ])
+        self.assertEqual(listener.receive(), [])
+
+    def test_forwarder_without_listener(self):
+        self.assertEqual(main(['add', 'aa:bb:cc:dd:ee:ff', '192.168.1.100', 'laptop'], self.environ), 0)
+
+    def test_dnsmasq_expire(self):
+        self.assertIsNone(dnsmasq_expire({'DNSMASQ_LEASE_EXPIRES': '0'}))
+        self.assertAlmostEqual(dnsmasq_expire({'DNSMASQ_LEASE_LENGTH': '3600'}), time.time() + 3600, delta=2)
+        self.assertIsNone(dnsmasq_expire({}))
+
+    @patch("watcher_daemon.unbound_control")
+    def test_daemon_applies_events(self, mock_unbound_control):
+        leases_file = os.path.join(self.tmpdir.name, 'dnsmasq.leases')
+        open(leases_file, 'w').close()
+        daemon = WatcherDaemon([DnsmasqBackend(leases_file, 'home')], event_socket=self.socket_path)
+        self.addCleanup(daemon.close)
+        self.assertFalse(daemon.backends[0].watcher.uses_inotify)
+        daemon.cycle(daemon.backends)
+
+        main(['add', 'aa:bb:cc:dd:ee:ff', '192.168.1.100', 'laptop'], self.environ)
+        changed, events = daemon.wait()
+        self.assertTrue(events)
+        daemon.cycle(changed, events)
+        mock_unbound_control.assert_called_with(['local_datas'], input=[
+            '100.1.168.192.in-addr.arpa PTR laptop.home', 'laptop.home IN A 192.168.1.100'])
+
+        main(['del', 'aa:bb:cc:dd:ee:ff', '192.168.1.100', 'laptop'], self.environ)
+        daemon.cycle(*daemon.wait())
+        self.assertEqual(len(daemon.store), 0)
+
+    @patch("watcher_daemon.unbound_control")
+    def test_invalid_events_are_dropped(self, mock_unbound_control):
+        leases_file = os.path.join(self.tmpdir.name, 'dnsmasq.leases')
+        open(leases_file, 'w').close()
+        daemon = WatcherDaemon([DnsmasqBackend(leases_file, 'home')], event_socket=self.socket_path)
+        self.addCleanup(daemon.close)
+        daemon.cycle(daemon.backends)
+
+        send_event(encode_event('dnsmasq', 'add', 'not-an-ip', 'laptop'), self.socket_path)
+        send_event(encode_event('dnsmasq', 'add', '192.168.1.101', 'phone', 'soon'), self.socket_path)
+        main(['add', 'aa:bb:cc:dd:ee:ff', '192.168.1.100', 'laptop'], self.environ)
+        with self.assertLogs('lease_events', 'WARNING') as logs:
+            daemon.cycle(*daemon.wait())
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual([record.address for record in daemon.store.leases()], ['192.168.1.100'])
+
+
+if __name__ == "__main__":
+    unittest.main()
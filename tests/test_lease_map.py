@@ -0,0 +1,162 @@
+import unittest, os, struct, tempfile
+from unittest.mock import patch
+from lease_map import (HEADER, MAGIC, LeaseMapReader, LeaseMapWriter, RCODE_NOERROR, RCODE_NXDOMAIN,
+                       SEQUENCE_OFFSET, build_table, rrsets_of_records)
+from snapshot_writer import render_local_data
+from watcher_daemon import WatcherDaemon, main
+from unbound_kea_watcher import KeaBackend
+from kea_leases import kea_row, write_kea_leases
+
+A, PTR, MX, AAAA = 1, 12, 15, 28
+
+RECORDS = [
+    ('192.168.1.100', 'laptop.home', 'A', 960),
+    ('2001:db8::1', 'laptop.home', 'AAAA', 3600),
+    ('2001:db8::2', 'laptop.home', 'AAAA', 1920),
+    ('192.168.1.101', 'phone.home', 'A', None),
+]
+ZONES = ['home', '168.192.in-addr.arpa']
+
+
+class TestLeaseMap(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'run', 'leases.map')
+        self.writer = LeaseMapWriter(self.path)
+        self.reader = LeaseMapReader(self.path)
+
+    def tearDown(self):
+        self.reader.close()
+        self.writer.close()
+        self.tmpdir.cleanup()
+
+    def test_rrsets_of_records(self):
+        rrsets = {(name, rrtype): (ttl, rdata) for name, rrtype, ttl, rdata in rrsets_of_records(RECORDS)}
+        self.assertEqual(rrsets[('laptop.home', 'AAAA')], (1920, ['2001:db8::1', '2001:db8::2']))
+        self.assertEqual(rrsets[('phone.home', 'A')], (3600, ['192.168.1.101']))
+        self.assertEqual(rrsets[('100.1.168.192.in-addr.arpa', 'PTR')], (960, ['laptop.home']))
+
+    def test_answers(self):
+        self.writer.publish(rrsets_of_records(RECORDS), ZONES)
+        self.assertEqual(self.reader.answer('Laptop.Home.', A), (RCODE_NOERROR, ['laptop.home. 960 IN A 192.168.1.100']))
+        self.assertEqual(self.reader.answer('laptop.home.', AAAA),
+                         (RCODE_NOERROR, ['laptop.home. 1920 IN AAAA 2001:db8::1', 'laptop.home. 1920 IN AAAA 2001:db8::2']))
+        self.assertEqual(self.reader.answer('101.1.168.192.in-addr.arpa.', PTR),
+                         (RCODE_NOERROR, ['101.1.168.192.in-addr.arpa. 3600 IN PTR phone.home.']))
+        # names without the type, the zone apex and misses inside the zones are answered too
+        self.assertEqual(self.reader.answer('phone.home.', AAAA), (RCODE_NOERROR, []))
+        self.assertEqual(self.reader.answer('phone.home.', MX), (RCODE_NOERROR, []))
+        self.assertEqual(self.reader.answer('home.', A), (RCODE_NOERROR, []))
+        self.assertEqual(self.reader.answer('gone.home.', A), (RCODE_NXDOMAIN, []))
+        self.assertEqual(self.reader.answer('7.1.168.192.in-addr.arpa.', PTR), (RCODE_NXDOMAIN, []))
+        # everything else is passed on
+        self.assertIsNone(self.reader.answer('example.com.', A))
+        self.assertIsNone(self.reader.answer('1.0.0.10.in-addr.arpa.', PTR))
+
+    def test_updates_switch_slots(self):
+        self.writer.publish(rrsets_of_records(RECORDS), ZONES)
+        self.assertEqual(self.reader.lookup('phone.home', 'A'), (3600, ['192.168.1.101']))
+        many = [(f"10.0.{i // 256}.{i % 256}", f"host{i}.home", 'A', 600) for i in range(5000)]
+        self.writer.publish(rrsets_of_records(many), ZONES)
+        self.assertIsNone(self.reader.lookup('phone.home', 'A'))
+        self.assertEqual(self.reader.lookup('host4999.home', 'A'), (600, ['10.0.19.135']))
+        self.writer.publish(rrsets_of_records(RECORDS), ZONES)
+        self.assertEqual(self.reader.lookup('phone.home', 'A'), (3600, ['192.168.1.101']))
+        self.assertIsNone(self.reader.lookup('host4999.home', 'A'))
+
+    def test_existing_map_is_reused(self):
+        self.writer.publish(rrsets_of_records(RECORDS), ZONES)
+        inode = os.stat(self.path).st_ino
+        writer = LeaseMapWriter(self.path)
+        self.addCleanup(writer.close)
+        self.assertEqual(os.stat(self.path).st_ino, inode)
+        writer.publish([], ZONES)
+        self.assertEqual(self.reader.answer('laptop.home.', A), (RCODE_NXDOMAIN, []))
+
+    def test_write_in_progress_is_not_read(self):
+        self.writer.publish(rrsets_of_records(RECORDS), ZONES)
+        sequence = struct.unpack_from('<Q', self.writer._mm, SEQUENCE_OFFSET)[0]
+        self.writer._mm[SEQUENCE_OFFSET:SEQUENCE_OFFSET + 8] = struct.pack('<Q', sequence + 1)
+        with self.assertLogs('lease_map', 'WARNING'):
+            self.assertIsNone(self.reader.answer('laptop.home.', A))
+        self.writer._mm[SEQUENCE_OFFSET:SEQUENCE_OFFSET + 8] = struct.pack('<Q', sequence + 2)
+        self.assertEqual(self.reader.answer('laptop.home.', A)[0], RCODE_NOERROR)
+
+    def test_corrupt_header_falls_through(self):
+        self.writer.publish(rrsets_of_records(RECORDS), ZONES)
+        _, sequence, active, *slots = HEADER.unpack_from(self.writer._mm, 0)
+        base = slots[active * 3]
+        self.writer._mm[base:base + 4] = struct.pack('<I', 0xffffffff)
+        self.assertIsNone(self.reader.answer('laptop.home.', A))
+        # a power of two bucket count larger than the table
+        self.writer._mm[base:base + 4] = struct.pack('<I', 1 << 31)
+        self.assertIsNone(self.reader.lookup('laptop.home', 'A'))
+        # an active slot out of range is retried, then passed on
+        self.writer.publish(rrsets_of_records(RECORDS), ZONES)
+        self.writer._mm[:HEADER.size] = HEADER.pack(MAGIC, sequence + 2, 7, *slots)
+        with self.assertLogs('lease_map', 'WARNING'):
+            self.assertIsNone(self.reader.answer('laptop.home.', A))
+
+    def test_missing_map(self):
+        reader = LeaseMapReader(os.path.join(self.tmpdir.name, 'missing.map'))
+        self.assertIsNone(reader.answer('laptop.home.', A))
+
+    def test_table_load_factor(self):
+        table = build_table([(f"host{i}.home", 'A', 60, ['192.168.1.1']) for i in range(100)], ZONES)
+        self.assertEqual(struct.unpack_from('<II', table), (256, 102))
+
+
+class TestWatcherDaemonLeaseMap(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.kea_file = os.path.join(self.tmpdir.name, 'dhcp4.leases')
+        self.target = os.path.join(self.tmpdir.name, 'dhcpleases.conf')
+        self.lease_map = os.path.join(self.tmpdir.name, 'leases.map')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @patch("watcher_daemon.unbound_control")
+    @patch("watcher_daemon.default_control")
+    def test_records_are_served_from_the_map(self, mock_default_control, mock_unbound_control):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "laptop")])
+        mock_default_control.return_value.iter_output.return_value = iter([
+            "laptop.home.\t3600\tIN\tA\t192.168.1.100",
+            "100.1.168.192.in-addr.arpa.\t3600\tIN\tPTR\tlaptop.home.",
+        ])
+        # a previous run published the lease as local-data
+        with open(self.target, 'w') as f:
+            f.write(render_local_data([('192.168.1.100', 'laptop.home', 'A', None)]))
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')], self.target, zone_type='static',
+                               lease_map=self.lease_map)
+        self.addCleanup(daemon.close)
+        self.assertEqual(daemon.zones.zone_type, 'transparent')
+        daemon.reconcile()
+        commands = [args[0][0][0] for args in mock_unbound_control.call_args_list]
+        self.assertEqual(commands, ['local_zones', 'local_datas_remove'])
+        self.assertEqual(sorted(mock_unbound_control.call_args_list[-1].kwargs['input']),
+                         ['100.1.168.192.in-addr.arpa', 'laptop.home'])
+        reader = LeaseMapReader(self.lease_map)
+        self.addCleanup(reader.close)
+        self.assertEqual(reader.answer('laptop.home.', A), (RCODE_NOERROR, ['laptop.home. 3600 IN A 192.168.1.100']))
+        daemon.snapshot.flush(force=True)
+        with open(self.target) as f:
+            self.assertNotIn('local-data', f.read())
+        mock_unbound_control.reset_mock()
+
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.101", "phone")], mode='a')
+        daemon.cycle(daemon.backends)
+        mock_unbound_control.assert_not_called()
+        self.assertEqual(reader.lookup('phone.home', 'A'), (3600, ['192.168.1.101']))
+
+    def test_lease_map_needs_local_zones(self):
+        argv = ['dhcp_watcher', '--backend', f'kea:{self.kea_file}', '--lease-map', self.lease_map, '--local-zone-type', 'off']
+        with patch('sys.argv', argv), patch('sys.stderr'), self.assertRaises(SystemExit) as cm:
+            main()
+        self.assertEqual(cm.exception.code, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
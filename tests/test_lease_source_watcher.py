@@ -0,0 +1,83 @@
+import unittest, os, tempfile, threading, time
+from lease_source_watcher import LeaseSourceWatcher, SETTLE_TIME
+
+
+class TestLeaseSourceWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.leases_file = os.path.join(self.tmpdir.name, 'dhcpd.leases')
+        with open(self.leases_file, 'w') as f:
+            f.write('lease 192.168.1.100 {}\n')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _later(self, action, delay=0.1):
+        timer = threading.Timer(delay, action)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+    def _append(self, path, data):
+        with open(path, 'a') as f:
+            f.write(data)
+
+    def _rename_over(self):
+        tmp_file = self.leases_file + '~'
+        with open(tmp_file, 'w') as f:
+            f.write('lease 192.168.1.101 {}\n')
+        os.rename(tmp_file, self.leases_file)
+
+    def test_rename_over_wakes_watcher(self):
+        watcher = LeaseSourceWatcher(self.leases_file, min_interval=30, max_interval=30)
+        self.addCleanup(watcher.close)
+        if not watcher.uses_inotify:
+            self.skipTest("inotify not available")
+        self._later(self._rename_over)
+        start = time.monotonic()
+        self.assertTrue(watcher.wait(5))
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_settle_does_not_block(self):
+        watcher = LeaseSourceWatcher(self.leases_file, min_interval=30, max_interval=30)
+        self.addCleanup(watcher.close)
+        if not watcher.uses_inotify:
+            self.skipTest("inotify not available")
+        self._rename_over()
+        start = time.monotonic()
+        self.assertFalse(watcher.check(readable=True))
+        self.assertLess(time.monotonic() - start, SETTLE_TIME)
+        self.assertLessEqual(watcher.next_timeout(), SETTLE_TIME)
+        time.sleep(watcher.next_timeout())
+        self.assertTrue(watcher.check())
+        self.assertGreater(watcher.next_timeout(), 1)
+
+    def test_unrelated_file_is_ignored(self):
+        watcher = LeaseSourceWatcher(self.leases_file, min_interval=30, max_interval=30)
+        self.addCleanup(watcher.close)
+        self._later(lambda: open(os.path.join(self.tmpdir.name, 'other.conf'), 'w').close())
+        self.assertFalse(watcher.wait(0.5))
+
+    def test_poll_fallback_detects_change(self):
+        watcher = LeaseSourceWatcher(self.leases_file, min_interval=0.05, max_interval=0.2, use_inotify=False)
+        self.assertFalse(watcher.uses_inotify)
+        self._later(lambda: self._append(self.leases_file, 'lease 192.168.1.102 {}\n'))
+        self.assertTrue(watcher.wait(5))
+
+    def test_poll_interval_backs_off_when_idle(self):
+        watcher = LeaseSourceWatcher(self.leases_file, min_interval=0.01, max_interval=0.04, use_inotify=False)
+        self.assertFalse(watcher.wait(0.2))
+        self.assertEqual(watcher.interval, 0.04)
+        self._rename_over()
+        self.assertTrue(watcher.wait(1))
+        self.assertEqual(watcher.interval, 0.01)
+
+    def test_directory_source(self):
+        watcher = LeaseSourceWatcher(self.tmpdir.name, min_interval=0.05, max_interval=0.2)
+        self.addCleanup(watcher.close)
+        self._later(lambda: self._append(os.path.join(self.tmpdir.name, 'eth0'), '{}'))
+        self.assertTrue(watcher.wait(5))
+
+
+if __name__ == "__main__":
+    unittest.main()
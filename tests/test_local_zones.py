@@ -0,0 +1,162 @@
+import unittest, os, tempfile, ipaddress
+from unittest.mock import patch, call
+from local_zones import LocalZones, PRIVATE_REVERSE_ZONES, read_declared_zones, reverse_zones
+from record_store import RecordStore
+from snapshot_writer import render_local_data
+from watcher_daemon import WatcherDaemon
+from unbound_kea_watcher import KeaBackend
+from kea_leases import kea_row, write_kea_leases
+
+
+def zones_of(first, last):
+    return reverse_zones(ipaddress.ip_address(first), ipaddress.ip_address(last))
+
+
+class TestReverseZones(unittest.TestCase):
+
+    def test_aligned_ranges(self):
+        self.assertEqual(zones_of('192.168.1.0', '192.168.1.255'), ['1.168.192.in-addr.arpa'])
+        self.assertEqual(zones_of('192.168.1.100', '192.168.1.149'), ['1.168.192.in-addr.arpa'])
+        self.assertEqual(zones_of('10.0.0.0', '10.255.255.255'), ['10.in-addr.arpa'])
+        self.assertEqual(zones_of('fd00:1::', 'fd00:1::ffff:ffff:ffff:ffff'), ['0.0.0.0.0.0.0.0.1.0.0.0.0.0.d.f.ip6.arpa'])
+
+    def test_unaligned_ranges_go_one_level_down(self):
+        self.assertEqual(zones_of('172.16.0.0', '172.31.255.255'), [f"{octet}.172.in-addr.arpa" for octet in range(16, 32)])
+        self.assertEqual(zones_of('192.168.1.200', '192.168.2.10'), ['1.168.192.in-addr.arpa', '2.168.192.in-addr.arpa'])
+
+    def test_public_ranges_are_skipped(self):
+        self.assertEqual(zones_of('2a00:1450::', '2a00:1450::ffff'), [])
+        self.assertEqual(zones_of('8.8.8.0', '8.8.8.255'), [])
+        self.assertEqual(zones_of('100.64.0.0', '100.64.0.255'), [])
+
+
+class TestLocalZones(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.kea_file = os.path.join(self.tmpdir.name, 'dhcp4.leases')
+        self.config = os.path.join(self.tmpdir.name, 'domains.conf')
+        write_kea_leases(self.kea_file)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_no_reverse_zones_without_ranges(self):
+        zones = LocalZones('static')
+        self.assertEqual(zones.changes([KeaBackend(self.kea_file, 'home')]), (['home'], []))
+        self.assertEqual(zones.changes([KeaBackend(self.kea_file, 'home')]), ([], []))
+
+    def test_private_fallback_without_ranges(self):
+        zones = LocalZones('transparent', private_fallback=True)
+        added, removed = zones.changes([KeaBackend(self.kea_file, 'home')])
+        self.assertEqual(set(added), {'home', *PRIVATE_REVERSE_ZONES})
+        self.assertEqual(removed, [])
+
+    def test_public_ranges_declare_no_reverse_zones(self):
+        with open(self.config, 'w') as f:
+            f.write("[lab]\nprefix = 8.8.8.0/24\ndomain = lab.home\n")
+        zones = LocalZones('static', private_fallback=True)
+        added, _ = zones.changes([KeaBackend(self.kea_file, 'home', self.config)])
+        self.assertEqual(added, ['home', 'lab.home'])
+
+    def test_no_zone_type_removes_declared_zones(self):
+        zones = LocalZones(None, {'home': 'static', '168.192.in-addr.arpa': 'static'})
+        added, removed = zones.changes([KeaBackend(self.kea_file, 'home')], replace=True)
+        self.assertEqual(added, [])
+        self.assertEqual(removed, ['168.192.in-addr.arpa', 'home'])
+        self.assertEqual(zones.declared(), [])
+
+    def test_zones_of_ranges(self):
+        with open(self.config, 'w') as f:
+            f.write("[iot]\nprefix = 192.168.10.0/24\ndomain = iot.home\n")
+        zones = LocalZones('transparent', {'home': 'static', 'old.home': 'static'})
+        added, removed = zones.changes([KeaBackend(self.kea_file, 'home', self.config)])
+        self.assertEqual(added, ['10.168.192.in-addr.arpa', 'home', 'iot.home'])
+        self.assertEqual(removed, ['old.home'])
+        self.assertEqual(zones.declared(), [('10.168.192.in-addr.arpa', 'transparent'), ('home', 'transparent'),
+                                            ('iot.home', 'transparent')])
+
+    def test_declared_zones_of_snapshot(self):
+        path = os.path.join(self.tmpdir.name, 'dhcpleases.conf')
+        with open(path, 'w') as f:
+            f.write(render_local_data([('192.168.1.100', 'laptop.home', 'A', None)], [('home', 'static')]))
+        self.assertEqual(read_declared_zones(path), {'home': 'static'})
+
+    def test_unpublish_removed_zones(self):
+        store = RecordStore()
+        store.set('kea', '192.168.1.100', 'laptop', 'iot.home')
+        store.set('kea', '192.168.2.100', 'phone', 'home')
+        store.changes()
+        self.assertFalse(store.unpublish(['lan']))
+        self.assertTrue(store.unpublish(['iot.home', '2.168.192.in-addr.arpa']))
+        remove_rr, add_rr = store.changes()
+        self.assertEqual(remove_rr, [])
+        self.assertEqual(sorted(add_rr), ['100.1.168.192.in-addr.arpa PTR laptop.iot.home',
+                                          '100.2.168.192.in-addr.arpa PTR phone.home',
+                                          'laptop.iot.home IN A 192.168.1.100'])
+
+
+class TestWatcherDaemonZones(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.kea_file = os.path.join(self.tmpdir.name, 'dhcp4.leases')
+        self.config = os.path.join(self.tmpdir.name, 'domains.conf')
+        self.target = os.path.join(self.tmpdir.name, 'dhcpleases.conf')
+        with open(self.config, 'w') as f:
+            f.write("[iot]\nprefix = 192.168.1.0/24\ndomain = iot.home\n")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @patch("watcher_daemon.unbound_control")
+    @patch("watcher_daemon.default_control")
+    def test_zones_are_declared_and_follow_ranges(self, mock_default_control, mock_unbound_control):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "sensor")])
+        mock_default_control.return_value.iter_output.return_value = iter([])
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home', self.config)], self.target, zone_type='static')
+        self.addCleanup(daemon.close)
+        daemon.reconcile()
+        self.assertEqual(mock_unbound_control.call_args_list[0],
+                         call(['local_zones'], input=['1.168.192.in-addr.arpa static', 'home static', 'iot.home static']))
+        daemon.snapshot.flush(force=True)
+        self.assertEqual(read_declared_zones(self.target), {'1.168.192.in-addr.arpa': 'static', 'home': 'static',
+                                                            'iot.home': 'static'})
+        mock_unbound_control.reset_mock()
+
+        with open(self.config, 'w') as f:
+            f.write("[iot]\nprefix = 192.168.1.0/24\ndomain = sensors.home\n")
+        daemon.cycle([])
+        self.assertEqual(mock_unbound_control.call_args_list[0], call(['local_zones_remove'], input=['iot.home']))
+        self.assertEqual(mock_unbound_control.call_args_list[1], call(['local_zones'], input=['sensors.home static']))
+        add_rr = mock_unbound_control.call_args_list[-1].kwargs['input']
+        self.assertIn('sensor.sensors.home IN A 192.168.1.100', add_rr)
+
+    @patch("watcher_daemon.unbound_control")
+    @patch("watcher_daemon.default_control")
+    def test_no_zones_by_default(self, mock_default_control, mock_unbound_control):
+        write_kea_leases(self.kea_file)
+        mock_default_control.return_value.iter_output.return_value = iter([])
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')])
+        self.addCleanup(daemon.close)
+        daemon.reconcile()
+        self.assertNotIn('local_zones', [args[0][0][0] for args in mock_unbound_control.call_args_list])
+
+    @patch("watcher_daemon.unbound_control")
+    @patch("watcher_daemon.default_control")
+    def test_zones_of_previous_run_are_removed(self, mock_default_control, mock_unbound_control):
+        write_kea_leases(self.kea_file)
+        with open(self.target, 'w') as f:
+            f.write(render_local_data([], [('home', 'static')]))
+        mock_default_control.return_value.iter_output.return_value = iter([])
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')], self.target)
+        self.addCleanup(daemon.close)
+        daemon.reconcile()
+        self.assertIn(call(['local_zones_remove'], input=['home']), mock_unbound_control.call_args_list)
+        self.assertNotIn('local_zones', [args[0][0][0] for args in mock_unbound_control.call_args_list])
+        daemon.snapshot.flush(force=True)
+        self.assertEqual(read_declared_zones(self.target), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
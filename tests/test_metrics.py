@@ -0,0 +1,158 @@
+import unittest, os, socket, selectors, tempfile, time
+from unittest.mock import patch
+from metrics import Counter, Gauge, Histogram, Registry, MetricsServer, WatcherMetrics, parse_listen
+from record_store import RecordStore
+from watcher_daemon import WatcherDaemon
+from unbound_kea_watcher import KeaBackend
+from kea_leases import kea_row, write_kea_leases
+
+
+def scrape(family, address, path='/metrics'):
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(5)
+    sock.connect(address)
+    sock.sendall(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    return sock
+
+
+def read_reply(sock):
+    chunks = []
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            return b''.join(chunks).decode()
+        chunks.append(data)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_counter_and_gauge(self):
+        registry = Registry()
+        failures = registry.register(Counter('failures_total', 'Failures.', ('command',)))
+        failures.inc(1, 'local_datas')
+        failures.inc(2, 'local_datas')
+        registry.register(Gauge('leases', 'Leases.', ('backend',), collect=lambda: {('kea',): 3}))
+        self.assertEqual(registry.render(),
+                         '# HELP failures_total Failures.\n# TYPE failures_total counter\n'
+                         'failures_total{command="local_datas"} 3\n'
+                         '# HELP leases Leases.\n# TYPE leases gauge\nleases{backend="kea"} 3\n')
+
+    def test_histogram(self):
+        histogram = Histogram('parse_seconds', 'Parse time.', buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.1)
+        histogram.observe(5)
+        lines = histogram.render().splitlines()
+        self.assertIn('parse_seconds_bucket{le="0.1"} 2', lines)
+        self.assertIn('parse_seconds_bucket{le="1"} 2', lines)
+        self.assertIn('parse_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn('parse_seconds_sum 5.15', lines)
+        self.assertIn('parse_seconds_count 3', lines)
+
+    def test_leases_per_backend(self):
+        store = RecordStore()
+        store.set('kea', '192.168.1.100', 'laptop', 'home')
+        store.set('kea', '192.168.1.101', 'phone', 'home')
+        store.set('slaac-resolver', '2001:db8::1', 'laptop', 'home')
+        store.set('dnsmasq', '192.168.1.101', 'phone', 'home')
+        store.discard('192.168.1.100')
+        self.assertEqual(store.count_by_source(), {'dnsmasq': 1, 'slaac-resolver': 1})
+        rendered = WatcherMetrics(store).render()
+        self.assertIn('dhcp_watcher_leases{backend="dnsmasq"} 1', rendered)
+
+    def test_parse_listen(self):
+        self.assertEqual(parse_listen(':9167'), (socket.AF_INET, ('127.0.0.1', 9167)))
+        self.assertEqual(parse_listen('[::1]:9167'), (socket.AF_INET6, ('::1', 9167)))
+        self.assertEqual(parse_listen('/run/dhcp_watcher.metrics'), (socket.AF_UNIX, '/run/dhcp_watcher.metrics'))
+        with self.assertRaises(ValueError):
+            parse_listen('localhost')
+
+
+class TestMetricsServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.metrics = WatcherMetrics()
+        self.metrics.records_added.inc(2)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_tcp(self):
+        server = MetricsServer('127.0.0.1:0', self.metrics)
+        self.addCleanup(server.close)
+        sock = scrape(socket.AF_INET, server.address)
+        time.sleep(0.05)
+        server.handle()
+        reply = read_reply(sock)
+        sock.close()
+        self.assertTrue(reply.startswith('HTTP/1.0 200 OK'))
+        self.assertIn('dhcp_watcher_records_added_total 2', reply)
+
+    def test_unix_socket_and_not_found(self):
+        path = os.path.join(self.tmpdir.name, 'metrics.sock')
+        server = MetricsServer(path, self.metrics)
+        sock = scrape(socket.AF_UNIX, path, '/other')
+        time.sleep(0.05)
+        server.handle()
+        self.assertTrue(read_reply(sock).startswith('HTTP/1.0 404'))
+        sock.close()
+        server.close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_slow_scraper_does_not_block(self):
+        selector = selectors.DefaultSelector()
+        self.addCleanup(selector.close)
+        server = MetricsServer('127.0.0.1:0', self.metrics, selector)
+        self.addCleanup(server.close)
+        slow = socket.create_connection(server.address, timeout=5)
+        self.addCleanup(slow.close)
+        slow.sendall(b"GET /metrics HTTP/1.1\r\n")
+        self.assertEqual({key.data for key, _ in selector.select(5)}, {server})
+        start = time.monotonic()
+        server.handle()
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertTrue(server.pending)
+        self.assertLessEqual(server.timeout(), 1)
+
+        # other scrapes are answered meanwhile
+        sock = scrape(socket.AF_INET, server.address)
+        time.sleep(0.05)
+        server.handle()
+        self.assertTrue(read_reply(sock).startswith('HTTP/1.0 200 OK'))
+        sock.close()
+        slow.sendall(b"\r\n")
+        selector.select(5)
+        server.handle()
+        self.assertTrue(read_reply(slow).startswith('HTTP/1.0 200 OK'))
+        self.assertFalse(server.pending)
+
+
+class TestWatcherDaemonMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.kea_file = os.path.join(self.tmpdir.name, 'dhcp4.leases')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @patch("watcher_daemon.unbound_control")
+    def test_cycle_is_instrumented(self, mock_unbound_control):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "laptop")])
+        mock_unbound_control.return_value = None
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')])
+        self.addCleanup(daemon.close)
+        daemon.cycle(daemon.backends)
+        rendered = daemon.metrics.render()
+        self.assertIn('dhcp_watcher_parse_seconds_count{backend="kea"} 1', rendered)
+        self.assertIn('dhcp_watcher_diff_seconds_count 1', rendered)
+        self.assertIn('dhcp_watcher_control_seconds_count{command="local_datas"} 1', rendered)
+        self.assertIn('dhcp_watcher_control_failures_total{command="local_datas"} 1', rendered)
+        self.assertIn('dhcp_watcher_propagation_seconds_count 1', rendered)
+        self.assertIn('dhcp_watcher_records_added_total 2', rendered)
+        self.assertIn('dhcp_watcher_leases{backend="kea"} 1', rendered)
+
+
+if __name__ == '__main__':
+    unittest.main()
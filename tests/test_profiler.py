@@ -0,0 +1,105 @@
+import unittest, os, tempfile, signal, selectors, tracemalloc
+from unittest.mock import patch
+from profiler import CycleProfiler
+from watcher_daemon import WatcherDaemon
+from unbound_kea_watcher import KeaBackend
+from kea_leases import kea_row, write_kea_leases
+
+
+class TestCycleProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_idle_records_nothing(self):
+        profiler = CycleProfiler(self.tmpdir.name, cycles=1)
+        profiler.record('parse', 1.0)
+        profiler.cycle_done()
+        self.assertIsNone(profiler.stop())
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_report_after_cycles(self):
+        profiler = CycleProfiler(self.tmpdir.name, cycles=2)
+        profiler.start()
+        self.assertTrue(tracemalloc.is_tracing())
+        profiler.record('parse', 0.5)
+        profiler.record('control', 1.5)
+        profiler.cycle_done()
+        self.assertTrue(profiler.active)
+        profiler.cycle_done()
+        self.assertFalse(profiler.active)
+        self.assertFalse(tracemalloc.is_tracing())
+        [report] = os.listdir(self.tmpdir.name)
+        path = os.path.join(self.tmpdir.name, report)
+        self.assertEqual(sorted(os.listdir(path)), ['memory.txt', 'phases.txt', 'profile.pstats', 'profile.txt'])
+        with open(os.path.join(path, 'phases.txt')) as f:
+            phases = f.read()
+        self.assertIn('2 cycles', phases)
+        self.assertIn('control', phases)
+        self.assertIn('75.0%', phases)
+
+    def test_signal_requests_a_toggle(self):
+        profiler = CycleProfiler(self.tmpdir.name, memory=False)
+        previous = signal.getsignal(signal.SIGUSR1)
+        self.addCleanup(signal.signal, signal.SIGUSR1, previous)
+        self.addCleanup(profiler.close)
+        profiler.install_signal()
+        selector = selectors.DefaultSelector()
+        self.addCleanup(selector.close)
+        selector.register(profiler.fileno(), selectors.EVENT_READ)
+        os.kill(os.getpid(), signal.SIGUSR1)
+        # the handler only wakes the loop, profiling starts with the end of the cycle
+        self.assertFalse(profiler.active)
+        self.assertTrue(selector.select(0))
+        profiler.handle()
+        self.assertFalse(selector.select(0))
+        profiler.cycle_done()
+        self.assertTrue(profiler.active)
+        # requests until the end of the cycle make a single toggle
+        os.kill(os.getpid(), signal.SIGUSR1)
+        os.kill(os.getpid(), signal.SIGUSR1)
+        self.assertTrue(profiler.active)
+        profiler.cycle_done()
+        self.assertFalse(profiler.active)
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 1)
+
+    def test_reports_do_not_collide(self):
+        profiler = CycleProfiler(self.tmpdir.name, cycles=1, memory=False)
+        for _ in range(2):
+            profiler.start()
+            profiler.cycle_done()
+        reports = os.listdir(self.tmpdir.name)
+        self.assertEqual(len(reports), 2)
+        self.assertTrue(all(f"-{os.getpid()}" in report for report in reports))
+
+class TestWatcherDaemonProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.kea_file = os.path.join(self.tmpdir.name, 'dhcp4.leases')
+        self.profile_dir = os.path.join(self.tmpdir.name, 'profiles')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @patch("watcher_daemon.unbound_control")
+    def test_phases_of_a_cycle(self, mock_unbound_control):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "laptop")])
+        profiler = CycleProfiler(self.profile_dir, cycles=1, memory=False)
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')], os.path.join(self.tmpdir.name, 'dhcpleases.conf'),
+                               profiler=profiler)
+        self.addCleanup(daemon.close)
+        profiler.start()
+        daemon.cycle(daemon.backends)
+        self.assertFalse(profiler.active)
+        [report] = os.listdir(self.profile_dir)
+        with open(os.path.join(self.profile_dir, report, 'phases.txt')) as f:
+            rows = {line.split()[0]: line.split()[1] for line in f.readlines()[2:]}
+        self.assertEqual(rows, {'parse': '1', 'diff': '2', 'render': '1', 'control': '1'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest, os, tempfile
+from record_store import RecordStore
+from reconciler import iter_local_data, read_snapshot_owners, reconcile
+from snapshot_writer import render_local_data
+
+LIST_LOCAL_DATA = [
+    "ads.example.com.\t3600\tIN\tA\t0.0.0.0",
+    "router.home.\t3600\tIN\tA\t192.168.1.1",
+    "laptop.home.\t3600\tIN\tA\t192.168.1.100",
+    "100.1.168.192.in-addr.arpa.\t3600\tIN\tPTR\tlaptop.home.",
+    "phone.home.\t3600\tIN\tA\t192.168.1.101",
+    "101.1.168.192.in-addr.arpa.\t3600\tIN\tPTR\tphone.home.",
+    "gone.home.\t3600\tIN\tA\t192.168.1.102",
+    "102.1.168.192.in-addr.arpa.\t3600\tIN\tPTR\tgone.home.",
+    "1.1.168.192.in-addr.arpa.\t3600\tIN\tPTR\trouter.home.",
+    "8.8.8.8.in-addr.arpa.\t3600\tIN\tPTR\tdns.google.",
+]
+
+
+class TestReconciler(unittest.TestCase):
+
+    def setUp(self):
+        self.store = RecordStore()
+        self.store.set('kea', '192.168.1.100', 'laptop', 'home')
+        self.store.set('kea', '192.168.1.101', 'phone2', 'home')
+        self.store.set('kea', '192.168.1.103', 'tablet', 'home')
+
+    def test_iter_local_data_filters_domains(self):
+        records = list(iter_local_data(LIST_LOCAL_DATA, {'home'}))
+        self.assertNotIn(('ads.example.com', 'A', '0.0.0.0', 3600), records)
+        self.assertNotIn(('8.8.8.8.in-addr.arpa', 'PTR', 'dns.google', 3600), records)
+        self.assertIn(('100.1.168.192.in-addr.arpa', 'PTR', 'laptop.home', 3600), records)
+        self.assertEqual(len(records), 8)
+
+    def test_minimal_diff(self):
+        remove_rr, add_rr = reconcile(self.store, LIST_LOCAL_DATA, {'home'}, owned={'laptop.home', 'phone.home', 'gone.home'})
+        self.assertEqual(sorted(remove_rr), sorted([
+            '101.1.168.192.in-addr.arpa', 'phone.home', 'gone.home', '102.1.168.192.in-addr.arpa',
+        ]))
+        self.assertEqual(sorted(add_rr), sorted([
+            '101.1.168.192.in-addr.arpa PTR phone2.home', 'phone2.home IN A 192.168.1.101',
+            '103.1.168.192.in-addr.arpa PTR tablet.home', 'tablet.home IN A 192.168.1.103',
+        ]))
+        self.assertEqual(self.store.changes(), ([], []))
+
+    def test_unowned_records_are_kept(self):
+        remove_rr, _ = reconcile(self.store, LIST_LOCAL_DATA, {'home'})
+        self.assertIn('router.home', remove_rr)
+        remove_rr, _ = reconcile(self.store, LIST_LOCAL_DATA, {'home'}, owned=set())
+        self.assertEqual(remove_rr, ['101.1.168.192.in-addr.arpa'])
+
+    def test_read_snapshot_owners(self):
+        self.store.changes()
+        with tempfile.NamedTemporaryFile('w', suffix='.conf', delete=False) as f:
+            f.write(render_local_data(self.store.records()))
+        self.addCleanup(os.unlink, f.name)
+        self.assertEqual(read_snapshot_owners(f.name), {'laptop.home', 'phone2.home', 'tablet.home'})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest, os, tempfile, time
+from snapshot_writer import SnapshotWriter, render_local_data
+
+
+class TestSnapshotWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.target = os.path.join(self.tmpdir.name, 'dhcpleases.conf')
+        self.content = render_local_data([
+            ("192.168.1.101", "device2.home", "A", None),
+            ("192.168.1.100", "device1.home", "A", None),
+        ])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_render_local_data(self):
+        self.assertEqual(self.content,
+                         'server:\n'
+                         '\tlocal-data-ptr: "192.168.1.100 device1.home"\n'
+                         '\tlocal-data: "device1.home IN A 192.168.1.100"\n'
+                         '\tlocal-data-ptr: "192.168.1.101 device2.home"\n'
+                         '\tlocal-data: "device2.home IN A 192.168.1.101"\n')
+
+    def test_debounced_write(self):
+        writer = SnapshotWriter(self.target, debounce=0.1)
+        writer.update(self.content)
+        self.assertFalse(writer.flush())
+        self.assertFalse(os.path.exists(self.target))
+        time.sleep(writer.timeout())
+        self.assertTrue(writer.flush())
+        with open(self.target) as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(os.listdir(self.tmpdir.name), ['dhcpleases.conf'])
+
+    def test_unchanged_content_is_not_written(self):
+        with open(self.target, 'w') as f:
+            f.write(self.content)
+        mtime = os.stat(self.target).st_mtime_ns
+        writer = SnapshotWriter(self.target, debounce=0)
+        writer.update(self.content)
+        self.assertFalse(writer.has_pending)
+        self.assertFalse(writer.flush(force=True))
+        self.assertEqual(os.stat(self.target).st_mtime_ns, mtime)
+
+    def test_max_delay_under_churn(self):
+        writer = SnapshotWriter(self.target, debounce=10, max_delay=0)
+        writer.update(self.content)
+        self.assertEqual(writer.timeout(5), 0)
+        self.assertTrue(writer.flush())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest, os, argparse, tempfile, time
+from unittest.mock import patch
+from ttl_policy import TtlPolicy
+from record_store import RecordStore
+from reconciler import read_snapshot_owners, reconcile
+from snapshot_writer import render_local_data
+from watcher_daemon import WatcherDaemon, positive_int
+from unbound_kea_watcher import KeaBackend
+from kea_leases import kea_row, write_kea_leases
+
+
+class TestTtlPolicy(unittest.TestCase):
+
+    def test_buckets(self):
+        policy = TtlPolicy(60, 3600)
+        self.assertEqual(policy.ttl(None, 0), 3600)
+        self.assertEqual(policy.ttl(86400, 0), 3600)
+        self.assertEqual(policy.ttl(3600, 0), 1920)
+        self.assertEqual(policy.ttl(1000, 0), 960)
+        self.assertEqual(policy.ttl(960, 0), 480)
+        self.assertEqual(policy.ttl(30, 0), 60)
+
+    def test_min_ttl_must_be_positive(self):
+        for min_ttl in (0, -5):
+            with self.assertRaises(ValueError):
+                TtlPolicy(min_ttl, 3600)
+        with self.assertRaises(argparse.ArgumentTypeError):
+            positive_int('0')
+        self.assertEqual(positive_int('60'), 60)
+
+    def test_refresh_time(self):
+        policy = TtlPolicy(60, 3600)
+        self.assertEqual(policy.refresh_time(1000, 960), 40)
+        self.assertEqual(policy.ttl(1000, policy.refresh_time(1000, 960)), 480)
+        self.assertIsNone(policy.refresh_time(1000, 60))
+        self.assertIsNone(policy.refresh_time(None, 3600))
+
+
+class TestRecordStoreTtl(unittest.TestCase):
+
+    def setUp(self):
+        self.now = time.time()
+        self.store = RecordStore(ttl_policy=TtlPolicy(60, 3600))
+
+    def test_records_carry_ttl(self):
+        self.store.set('kea', '192.168.1.100', 'laptop', 'home', self.now + 1000, self.now)
+        self.store.set('slaac-resolver', '2001:db8::1', 'laptop', 'home', None, self.now)
+        _, add_rr = self.store.changes(self.now)
+        self.assertIn('100.1.168.192.in-addr.arpa 960 PTR laptop.home', add_rr)
+        self.assertIn('laptop.home 960 IN A 192.168.1.100', add_rr)
+        self.assertIn('laptop.home 3600 IN AAAA 2001:db8::1', add_rr)
+        self.assertEqual(self.store.next_ttl_refresh(), self.now + 40)
+
+    def test_dropped_bucket_is_refreshed(self):
+        self.store.set('kea', '192.168.1.100', 'laptop', 'home', self.now + 1000, self.now)
+        self.store.set('slaac-resolver', '2001:db8::1', 'laptop', 'home', None, self.now)
+        self.store.changes(self.now)
+        self.assertFalse(self.store.refresh_ttls(self.now + 39))
+        self.assertTrue(self.store.refresh_ttls(self.now + 40))
+        remove_rr, add_rr = self.store.changes(self.now + 40)
+        self.assertEqual(sorted(remove_rr), ['100.1.168.192.in-addr.arpa', 'laptop.home'])
+        self.assertEqual(sorted(add_rr), ['100.1.168.192.in-addr.arpa 480 PTR laptop.home',
+                                          'laptop.home 3600 IN AAAA 2001:db8::1',
+                                          'laptop.home 480 IN A 192.168.1.100'])
+        self.assertEqual(self.store.next_ttl_refresh(), self.now + 520)
+
+    def test_renewal_in_same_bucket_sends_nothing(self):
+        self.store.set('kea', '192.168.1.100', 'laptop', 'home', self.now + 3000, self.now)
+        self.store.changes(self.now)
+        self.assertFalse(self.store.set('kea', '192.168.1.100', 'laptop', 'home', self.now + 3100, self.now + 60))
+        self.assertEqual(self.store.changes(self.now + 60), ([], []))
+        # a renewal raising the bucket replaces the record but keeps its age
+        first_seen = self.store.get('192.168.1.100').first_seen
+        self.assertTrue(self.store.set('kea', '192.168.1.100', 'laptop', 'home', self.now + 7200, self.now + 60))
+        self.assertEqual(self.store.get('192.168.1.100').ttl, 3600)
+        self.assertEqual(self.store.get('192.168.1.100').first_seen, first_seen)
+
+    def test_discard_cancels_refresh(self):
+        self.store.set('kea', '192.168.1.100', 'laptop', 'home', self.now + 1000, self.now)
+        self.store.discard('192.168.1.100')
+        self.assertIsNone(self.store.next_ttl_refresh())
+
+    def test_reconcile_compares_ttls(self):
+        self.store.set('kea', '192.168.1.100', 'laptop', 'home', self.now + 1000)
+        self.store.set('kea', '192.168.1.101', 'phone', 'home', self.now + 1000)
+        lines = [
+            "laptop.home.\t960\tIN\tA\t192.168.1.100",
+            "100.1.168.192.in-addr.arpa.\t960\tIN\tPTR\tlaptop.home.",
+            "phone.home.\t3600\tIN\tA\t192.168.1.101",
+            "101.1.168.192.in-addr.arpa.\t3600\tIN\tPTR\tphone.home.",
+        ]
+        remove_rr, add_rr = reconcile(self.store, lines, {'home'})
+        self.assertEqual(sorted(remove_rr), ['101.1.168.192.in-addr.arpa', 'phone.home'])
+        self.assertEqual(sorted(add_rr), ['101.1.168.192.in-addr.arpa 960 PTR phone.home',
+                                          'phone.home 960 IN A 192.168.1.101'])
+
+    def test_snapshot_with_ttl(self):
+        self.store.set('kea', '192.168.1.100', 'laptop', 'home', self.now + 1000, self.now)
+        self.store.changes(self.now)
+        content = render_local_data(self.store.records())
+        self.assertEqual(content, 'server:\n'
+                                  '\tlocal-data: "100.1.168.192.in-addr.arpa 960 PTR laptop.home"\n'
+                                  '\tlocal-data: "laptop.home 960 IN A 192.168.1.100"\n')
+        with tempfile.NamedTemporaryFile('w', suffix='.conf', delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.unlink, f.name)
+        self.assertEqual(read_snapshot_owners(f.name), {'laptop.home'})
+
+
+class TestWatcherDaemonTtl(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.kea_file = os.path.join(self.tmpdir.name, 'dhcp4.leases')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @patch("watcher_daemon.unbound_control")
+    def test_loop_wakes_up_for_refresh(self, mock_unbound_control):
+        expire = int(time.time()) + 1000
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "laptop", expire=expire)])
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')], ttl_policy=TtlPolicy(60, 3600))
+        self.addCleanup(daemon.close)
+        daemon.cycle(daemon.backends)
+        add_rr = mock_unbound_control.call_args_list[-1].kwargs['input']
+        self.assertIn('laptop.home 960 IN A 192.168.1.100', add_rr)
+        self.assertLessEqual(daemon._timeout(), expire - 960 - time.time() + 0.001)
+        mock_unbound_control.reset_mock()
+
+        with patch("time.time", return_value=expire - 960):
+            daemon.cycle([])
+        add_rr = mock_unbound_control.call_args_list[-1].kwargs['input']
+        self.assertIn('laptop.home 480 IN A 192.168.1.100', add_rr)
+
+
+if __name__ == '__main__':
+    unittest.main()
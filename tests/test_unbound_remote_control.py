@@ -0,0 +1,88 @@
+import unittest, os, tempfile, threading, socketserver
+from unbound_remote_control import UnboundControl, UnboundControlError, END_OF_TRANSMISSION
+
+
+class FakeControlHandler(socketserver.StreamRequestHandler):
+    """Mimics unbound's remote.c for the handful of commands the watchers use."""
+
+    def handle(self):
+        header = self.rfile.readline().decode()
+        self.server.requests.append(header)
+        command = header.split()[1]
+        if command in ('local_datas', 'local_datas_remove'):
+            count = 0
+            for number, raw in enumerate(self.rfile):
+                if raw == END_OF_TRANSMISSION:
+                    break
+                line = raw.decode().rstrip('\n')
+                self.server.lines.append(line)
+                if 'bogus' in line:
+                    self.wfile.write(f"error for input line {number}: {line}\n".encode())
+                else:
+                    count += 1
+            verb = 'added' if command == 'local_datas' else 'removed'
+            self.wfile.write(f"{verb} {count} datas\n".encode())
+        elif command == 'list_local_data':
+            for name, address in self.server.local_data:
+                self.wfile.write(f"{name}.\t3600\tIN\tA\t{address}\n".encode())
+        else:
+            self.wfile.write(b"error unknown command\n")
+
+
+class FakeControlServer(socketserver.ThreadingUnixStreamServer):
+    def __init__(self, path):
+        super().__init__(path, FakeControlHandler)
+        self.requests = []
+        self.lines = []
+        self.local_data = []
+
+
+class TestUnboundRemoteControl(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmpdir.name, 'unbound.control.sock')
+        self.server = FakeControlServer(self.socket_path)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.control = UnboundControl(self.socket_path, timeout=5, chunk_size=128)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_local_datas_streams_input(self):
+        rrs = (f"host{i}.home IN A 192.168.1.{i}" for i in range(1, 201))
+        result = self.control.local_datas(rrs)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.count, 200)
+        self.assertEqual(len(self.server.lines), 200)
+        self.assertEqual(self.server.requests[0], "UBCT1 local_datas\n")
+
+    def test_errors_are_reported_per_line(self):
+        result = self.control.local_datas(["good.home IN A 192.168.1.1", "bogus"])
+        self.assertFalse(result.ok)
+        self.assertEqual(result.count, 1)
+        self.assertEqual(result.errors, ["error for input line 1: bogus"])
+
+    def test_reconnects_for_every_command(self):
+        self.control.local_datas_remove(["device1.home"])
+        self.control.local_datas_remove(["device2.home"])
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.server.lines, ["device1.home", "device2.home"])
+
+    def test_iter_output(self):
+        self.server.local_data = [("device1.home", "192.168.1.100"), ("device2.home", "192.168.1.101")]
+        lines = list(self.control.iter_output(['list_local_data']))
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[1].split()[4], "192.168.1.101")
+
+    def test_unreachable_socket(self):
+        control = UnboundControl(os.path.join(self.tmpdir.name, 'missing.sock'))
+        with self.assertRaises(UnboundControlError):
+            control.local_datas(["device1.home IN A 192.168.1.100"])
+
+
+if __name__ == "__main__":
+    unittest.main()
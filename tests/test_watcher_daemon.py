@@ -0,0 +1,238 @@
+import unittest, os, json, tempfile, time
+from unittest.mock import patch, call
+from record_store import RecordStore, LeaseRecord
+from watcher_daemon import WatcherDaemon, create_backend
+from unbound_kea_watcher import KeaBackend
+from unbound_slaac_resolver_watcher import SlaacResolverBackend
+from kea_leases import kea_row, write_kea_leases
+
+
+class TestRecordStore(unittest.TestCase):
+
+    def test_lease_record_renders_once(self):
+        record = LeaseRecord('2001:db8:0:0::1', 'slaac-resolver', 'laptop', 'home')
+        self.assertEqual(record.address, '2001:db8::1')
+        self.assertEqual(record.ptr_owner, '1.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.8.b.d.0.1.0.0.2.ip6.arpa')
+        self.assertEqual(record.ptr_rr, f"{record.ptr_owner} PTR laptop.home")
+        self.assertEqual(record.rr, 'laptop.home IN AAAA 2001:db8::1')
+        self.assertNotEqual(LeaseRecord('0.0.0.1', 'kea', 'a', 'home').key, LeaseRecord('::1', 'kea', 'a', 'home').key)
+
+    def test_address_spellings_share_one_record(self):
+        store = RecordStore()
+        store.set('slaac-resolver', '2001:db8::1', 'laptop', 'home')
+        self.assertIn('2001:0db8:0000::0001', store)
+        self.assertFalse(store.set('slaac-resolver', '2001:DB8::1', 'laptop', 'home'))
+        self.assertEqual([record.address for record in store.by_fqdn('laptop.home')], ['2001:db8::1'])
+
+    def test_readded_lease_is_not_republished(self):
+        store = RecordStore()
+        store.set('kea', '192.168.1.100', 'device1', 'home')
+        store.changes()
+        store.discard('192.168.1.100')
+        store.set('kea', '192.168.1.100', 'device1', 'home')
+        self.assertEqual(store.changes(), ([], []))
+
+    def test_changes_are_collected_once(self):
+        store = RecordStore()
+        self.assertTrue(store.set('kea', '192.168.1.100', 'device1', 'home', time.time() + 3600))
+        remove_rr, add_rr = store.changes()
+        self.assertEqual(remove_rr, [])
+        self.assertEqual(add_rr, ['100.1.168.192.in-addr.arpa PTR device1.home', 'device1.home IN A 192.168.1.100'])
+        self.assertFalse(store.set('kea', '192.168.1.100', 'device1', 'home', time.time() + 7200))
+        self.assertEqual(store.changes(), ([], []))
+
+    def test_replace_removes_unknown_state(self):
+        store = RecordStore()
+        store.set('kea', '192.168.1.100', 'device1', 'home')
+        remove_rr, add_rr = store.changes(replace=True)
+        self.assertEqual(remove_rr, ['100.1.168.192.in-addr.arpa', 'device1.home'])
+        self.assertEqual(add_rr, ['100.1.168.192.in-addr.arpa PTR device1.home', 'device1.home IN A 192.168.1.100'])
+
+    def test_other_family_is_added_without_removal(self):
+        store = RecordStore()
+        store.set('kea', '192.168.1.100', 'laptop', 'home')
+        store.changes()
+        store.set('slaac-resolver', '2001:db8::1', 'laptop', 'home')
+        remove_rr, add_rr = store.changes()
+        self.assertEqual(remove_rr, [])
+        self.assertEqual(add_rr[1:], ['laptop.home IN AAAA 2001:db8::1'])
+        self.assertEqual(store.published_rrset('laptop.home', 'A'), {'laptop.home IN A 192.168.1.100'})
+
+    def test_renamed_address_keeps_other_rrsets(self):
+        store = RecordStore()
+        store.set('kea', '192.168.1.100', 'laptop', 'home')
+        store.set('slaac-resolver', '2001:db8::1', 'laptop', 'home')
+        store.changes()
+        store.set('kea', '192.168.1.100', 'desktop', 'home')
+        remove_rr, add_rr = store.changes()
+        self.assertEqual(sorted(remove_rr), ['100.1.168.192.in-addr.arpa', 'laptop.home'])
+        self.assertEqual(sorted(add_rr), ['100.1.168.192.in-addr.arpa PTR desktop.home',
+                                          'desktop.home IN A 192.168.1.100', 'laptop.home IN AAAA 2001:db8::1'])
+
+    def test_removal_reinjects_other_family(self):
+        store = RecordStore()
+        store.set('kea', '192.168.1.100', 'laptop', 'home')
+        store.set('slaac-resolver', '2001:db8::1', 'laptop', 'home')
+        store.changes()
+        store.discard('192.168.1.100')
+        remove_rr, add_rr = store.changes()
+        self.assertIn('laptop.home', remove_rr)
+        self.assertEqual(add_rr, ['laptop.home IN AAAA 2001:db8::1'])
+
+    def test_discard_respects_source(self):
+        store = RecordStore()
+        store.set('kea', '192.168.1.100', 'device1', 'home')
+        self.assertFalse(store.discard('192.168.1.100', 'dnsmasq'))
+        self.assertTrue(store.discard('192.168.1.100', 'kea'))
+        self.assertEqual(len(store), 0)
+
+    def test_expired(self):
+        store = RecordStore()
+        store.set('kea', '192.168.1.100', 'device1', 'home', time.time() - 1)
+        store.set('slaac-resolver', '2001:db8::1', 'device1', 'home')
+        self.assertEqual(store.expired(time.time()), ['192.168.1.100'])
+
+    def test_renewal_reschedules_expiry(self):
+        store = RecordStore()
+        now = time.time()
+        store.set('kea', '192.168.1.100', 'device1', 'home', now + 10)
+        store.set('kea', '192.168.1.100', 'device1', 'home', now + 3600)
+        self.assertEqual(store.next_expiry(), now + 3600)
+        self.assertEqual(store.expired(now + 60), [])
+        store.discard('192.168.1.100')
+        self.assertIsNone(store.next_expiry())
+
+
+class TestWatcherDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.kea_file = os.path.join(self.tmpdir.name, 'dhcp4.leases')
+        self.slaac_dir = os.path.join(self.tmpdir.name, 'slaac-resolver')
+        self.target = os.path.join(self.tmpdir.name, 'dhcpleases.conf')
+        os.mkdir(self.slaac_dir)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_create_backend(self):
+        write_kea_leases(self.kea_file)
+        backend = create_backend('kea', self.kea_file, 'home')
+        self.addCleanup(backend.close)
+        self.assertIsInstance(backend, KeaBackend)
+
+    @patch("watcher_daemon.unbound_control")
+    def test_backends_share_one_batch(self, mock_unbound_control):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "laptop")])
+        with open(os.path.join(self.slaac_dir, 'eth0.json'), 'w') as f:
+            json.dump([{"Address": ["2001", "db8", "", "1"], "Hostname": "laptop"}], f)
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home'), SlaacResolverBackend(self.slaac_dir, 'home')], self.target)
+        self.addCleanup(daemon.close)
+        daemon.cycle(daemon.backends)
+
+        # nothing to remove for new owners, both families go out in one local_datas batch
+        self.assertEqual(mock_unbound_control.call_count, 1)
+        add_rr = mock_unbound_control.call_args_list[0].kwargs['input']
+        self.assertIn('laptop.home IN A 192.168.1.100', add_rr)
+        self.assertIn('laptop.home IN AAAA 2001:db8::1', add_rr)
+
+        daemon.snapshot.flush(force=True)
+        with open(self.target) as f:
+            self.assertIn('"laptop.home IN AAAA 2001:db8::1"', f.read())
+
+    @patch("watcher_daemon.unbound_control")
+    def test_released_lease_is_removed(self, mock_unbound_control):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "laptop")])
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')])
+        self.addCleanup(daemon.close)
+        daemon.cycle(daemon.backends)
+        mock_unbound_control.reset_mock()
+
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "laptop", valid_lifetime=0)], mode='a')
+        daemon.cycle(daemon.backends)
+        mock_unbound_control.assert_has_calls([
+            call(['local_datas_remove'], input=['100.1.168.192.in-addr.arpa', 'laptop.home']),
+        ])
+        self.assertEqual(len(daemon.store), 0)
+
+    @patch("watcher_daemon.unbound_control")
+    def test_invalid_address_is_skipped(self, mock_unbound_control):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "laptop"), kea_row("not-an-ip", "x")])
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')])
+        self.addCleanup(daemon.close)
+        with self.assertLogs('watcher_daemon', 'WARNING'):
+            daemon.cycle(daemon.backends)
+        self.assertEqual([record.address for record in daemon.store.leases()], ['192.168.1.100'])
+
+        # the row disappearing again is a removal of an address the store never held
+        write_kea_leases(self.kea_file)
+        daemon.cycle(daemon.backends)
+        self.assertEqual(len(daemon.store), 0)
+
+    @patch("watcher_daemon.unbound_control")
+    def test_invalid_expire_is_skipped(self, mock_unbound_control):
+        write_kea_leases(self.kea_file)
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')])
+        self.addCleanup(daemon.close)
+        backend = daemon.backends[0]
+        changed, removed = backend.apply_events([
+            {'action': 'add', 'address': '192.168.1.101', 'hostname': 'phone', 'expire': 'soon'},
+            {'action': 'add', 'address': '192.168.1.102', 'hostname': 'tablet', 'expire': None},
+        ])
+        with self.assertLogs('watcher_daemon', 'WARNING') as logs:
+            self.assertTrue(daemon._apply(backend, changed, removed))
+        self.assertIn("invalid expire 'soon'", logs.output[0])
+        self.assertEqual([record.address for record in daemon.store.leases()], ['192.168.1.102'])
+
+    @patch("watcher_daemon.unbound_control")
+    def test_invalid_hostname_is_not_published(self, mock_unbound_control):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "laptop")])
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')], self.target)
+        self.addCleanup(daemon.close)
+        daemon.cycle(daemon.backends)
+        backend = daemon.backends[0]
+        changed, removed = backend.apply_events([
+            {'action': 'add', 'address': '192.168.1.100', 'hostname': 'my laptop', 'expire': None},
+            {'action': 'add', 'address': '192.168.1.101', 'hostname': '"evil""name"', 'expire': None},
+            {'action': 'add', 'address': '192.168.1.102', 'hostname': 'tablet-2', 'expire': None},
+        ])
+        with self.assertLogs('watcher_daemon', 'WARNING') as logs:
+            daemon._apply(backend, changed, removed)
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual([record.fqdn for record in daemon.store.leases()], ['tablet-2.home'])
+        daemon.publish()
+        daemon.snapshot.flush(force=True)
+        with open(self.target) as f:
+            self.assertEqual(f.read(), 'server:\n\tlocal-data-ptr: "192.168.1.102 tablet-2.home"\n'
+                                       '\tlocal-data: "tablet-2.home IN A 192.168.1.102"\n')
+
+    @patch("watcher_daemon.unbound_control")
+    def test_loop_sleeps_until_next_expiry(self, mock_unbound_control):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "laptop")])
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')])
+        self.addCleanup(daemon.close)
+        daemon.cycle(daemon.backends)
+        daemon.store.set('kea', '192.168.1.100', 'laptop', 'home', time.time() + 0.5)
+        self.assertLessEqual(daemon._timeout(), 0.5)
+        time.sleep(0.5)
+        daemon.cycle([])
+        self.assertEqual(len(daemon.store), 0)
+
+    @patch("watcher_daemon.unbound_control")
+    @patch("watcher_daemon.default_control")
+    def test_restart_sends_no_changes(self, mock_default_control, mock_unbound_control):
+        write_kea_leases(self.kea_file, [kea_row("192.168.1.100", "laptop")])
+        mock_default_control.return_value.iter_output.return_value = iter([
+            "laptop.home.\t3600\tIN\tA\t192.168.1.100",
+            "100.1.168.192.in-addr.arpa.\t3600\tIN\tPTR\tlaptop.home.",
+        ])
+        daemon = WatcherDaemon([KeaBackend(self.kea_file, 'home')], self.target)
+        self.addCleanup(daemon.close)
+        daemon.reconcile()
+        mock_default_control.return_value.iter_output.assert_called_once_with(['list_local_data'])
+        mock_unbound_control.assert_not_called()
+        self.assertEqual(len(daemon.store), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()